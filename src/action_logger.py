@@ -0,0 +1,152 @@
+import atexit
+import collections
+import os
+import threading
+import time
+
+
+class ActionLogger:
+    """
+    Buffered logger for the actions performed on the inventory.
+    log() only appends to an in-memory ring buffer; a background thread writes the entries
+    to the log file in batches, once batch_size entries are waiting or flush_interval seconds
+    have passed. The log file is rotated when it grows past max_bytes.
+    """
+
+    def __init__(self, path=None, batch_size=100, flush_interval=1.0, capacity=10000,
+                 max_bytes=5 * 1024 * 1024, backup_count=3):
+        """
+        :param path: Log file path (defaults to $LIBRARY_LOG_FILE, or log.txt in the working directory).
+        :param batch_size: Number of waiting entries that wakes the flusher before flush_interval.
+        :param flush_interval: Maximum number of seconds an entry waits in the buffer.
+        :param capacity: Size of the ring buffer; the oldest entries are dropped when it is full.
+        :param max_bytes: Size at which the log file is rotated (0 disables rotation).
+        :param backup_count: Number of rotated files to keep (log.txt.1, log.txt.2, ...).
+        """
+        self.path = path or os.environ.get("LIBRARY_LOG_FILE", "log.txt")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._buffer = collections.deque(maxlen=capacity)
+        self._dropped = 0
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self._last_second = None
+        self._last_timestamp = ""
+
+    def log(self, action, success=True, details=""):
+        """
+        Queue a log entry. The timestamp is taken now and formatted when the batch is written.
+        :param action: The action performed (e.g., "Add Book", "Lend Book").
+        :param success: Whether the action was successful (True/False).
+        :param details: Additional details about the action.
+        """
+        with self._condition:
+            if self._closed:
+                return
+            if len(self._buffer) == self._buffer.maxlen:
+                self._dropped += 1
+            self._buffer.append((time.time(), action, success, details))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="action-logger", daemon=True)
+                self._thread.start()
+            if len(self._buffer) >= self.batch_size:
+                self._condition.notify()
+
+    def _run(self):
+        """
+        Background flusher loop.
+        """
+        while True:
+            with self._condition:
+                if not self._closed and len(self._buffer) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+                if self._closed:
+                    return
+            self.flush()
+
+    def _format_timestamp(self, created):
+        # Entries logged within the same second share one strftime call
+        second = int(created)
+        if second != self._last_second:
+            self._last_second = second
+            self._last_timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(second))
+        return self._last_timestamp
+
+    def flush(self):
+        """
+        Write every buffered entry to the log file in a single write.
+        """
+        with self._write_lock:
+            with self._condition:
+                entries = list(self._buffer)
+                self._buffer.clear()
+                dropped, self._dropped = self._dropped, 0
+            if not entries:
+                return
+
+            lines = []
+            if dropped:
+                lines.append(f"[{self._format_timestamp(entries[0][0])}] ACTION: Logger | STATUS: FAILURE | "
+                             f"DETAILS: {dropped} entries dropped because the log buffer was full.\n")
+            for created, action, success, details in entries:
+                status = "SUCCESS" if success else "FAILURE"
+                lines.append(f"[{self._format_timestamp(created)}] ACTION: {action} | STATUS: {status} | DETAILS: {details}\n")
+            data = "".join(lines)
+
+            try:
+                self._rotate_if_needed(len(data.encode("utf-8")))
+                with open(self.path, mode="a", encoding="utf-8") as log_file:
+                    log_file.write(data)
+            except Exception as e:
+                print(f"Error writing to log file: {e}")
+
+    def _rotate_if_needed(self, incoming_bytes):
+        """
+        Rotate log.txt -> log.txt.1 -> log.txt.2 ... when the next batch would exceed max_bytes.
+        """
+        if not self.max_bytes or not os.path.isfile(self.path):
+            return
+        if os.path.getsize(self.path) + incoming_bytes <= self.max_bytes:
+            return
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def close(self):
+        """
+        Stop the background flusher and write whatever is still buffered.
+        """
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+
+_default_logger = None
+_default_logger_lock = threading.Lock()
+
+
+def get_logger():
+    """
+    Get the process-wide ActionLogger, creating it on first use.
+    It is closed (and flushed) automatically when the interpreter exits.
+    """
+    global _default_logger
+    with _default_logger_lock:
+        if _default_logger is None:
+            _default_logger = ActionLogger()
+            atexit.register(_default_logger.close)
+        return _default_logger
@@ -0,0 +1,128 @@
+"""
+asyncio facade over Inventory.
+
+Every call runs on a thread pool, so a slow disk never stalls the event loop, and calls on
+different titles run side by side thanks to Inventory's per-title locking. Writes are
+deferred: the operations only update memory and queue their changes, and a single writer
+task persists everything queued with one Inventory.flush_writes call (one transaction, one
+fsync'd journal append or one rewrite of each CSV file). A mutating call returns once a
+flush that started after it has completed, so concurrent requests share their disk writes
+(group commit) while each caller still knows its change is on disk: the CSV files are written
+right away whatever the flush_interval, and a failed flush raises in every call waiting for it
+(its changes stay queued for the next flush). Log entries are already written in batches by
+the ActionLogger thread.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from inventory import Inventory
+
+
+class AsyncInventory:
+    """
+    Async versions of the Inventory operations.
+    """
+
+    def __init__(self, inventory=None, max_workers=8):
+        """
+        :param inventory: The Inventory to wrap (a new one is loaded if omitted).
+        :param max_workers: Number of threads running inventory calls and flushes.
+        """
+        self.inventory = inventory if inventory is not None else Inventory()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inventory")
+        self.inventory.begin_deferred_writes()
+        self._writer = None
+        self._wakeup = None
+        self._next_flush = None  # Future resolved by the next flush to start
+        self._closed = False
+
+    async def _run(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(method, *args, **kwargs))
+
+    async def _mutate(self, method, *args, **kwargs):
+        """
+        Run a mutating call, then wait until its changes are flushed.
+        """
+        if self._closed:
+            raise RuntimeError("AsyncInventory is closed.")
+        result = await self._run(method, *args, **kwargs)
+        await self._wait_flushed()
+        return result
+
+    async def _wait_flushed(self):
+        if self._writer is None:
+            self._wakeup = asyncio.Event()
+            self._writer = asyncio.get_running_loop().create_task(self._write_loop())
+        if self._next_flush is None:
+            self._next_flush = asyncio.get_running_loop().create_future()
+            self._wakeup.set()
+        await asyncio.shield(self._next_flush)
+
+    async def _write_loop(self):
+        """
+        Single writer task: flush everything queued since the previous flush, as often as needed.
+        """
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            flushed, self._next_flush = self._next_flush, None
+            if flushed is not None:
+                flush = asyncio.get_running_loop().run_in_executor(
+                    self._executor, functools.partial(self.inventory.flush_writes, durable=True))
+                # Wait without raising here: the error goes to the callers, whose handlers may clear the
+                # frames of its traceback, and this task's frame must not be one of them
+                await asyncio.wait([flush])
+                if flush.exception() is not None:
+                    flushed.set_exception(flush.exception())
+                else:
+                    flushed.set_result(None)
+            if self._closed and self._next_flush is None:
+                return
+
+    # Mutations
+    async def lend_book(self, title, username, email=None, phone=None):
+        return await self._mutate(self.inventory.lend_book, title, username, email, phone)
+
+    async def return_book(self, title):
+        return await self._mutate(self.inventory.return_book, title)
+
+    async def add_to_waitlist(self, title, username, email, phone):
+        return await self._mutate(self.inventory.add_to_waitlist, title, username, email, phone)
+
+    async def add_book(self, book):
+        return await self._mutate(self.inventory.add_book, book)
+
+    async def remove_book(self, title):
+        return await self._mutate(self.inventory.remove_book, title)
+
+    async def update_book(self, title, /, **kwargs):
+        return await self._mutate(self.inventory.update_book, title, **kwargs)
+
+    # Queries
+    async def find_book(self, title):
+        return await self._run(self.inventory.find_book, title)
+
+    async def search_books(self, **kwargs):
+        return await self._run(self.inventory.search_books, **kwargs)
+
+    async def search_books_with_strategy(self, strategy, value):
+        return await self._run(self.inventory.search_books_with_strategy, strategy, value)
+
+    async def get_popular_books(self, top_n=10, days=None):
+        return await self._run(self.inventory.get_popular_books, top_n, days)
+
+    async def close(self):
+        """
+        Flush the pending changes, stop the writer task and release the inventory.
+        Call it once the in-flight requests have completed.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer is not None:
+            self._wakeup.set()
+            await self._writer  # Finishes the flushes already requested
+        await self._run(self.inventory.end_deferred_writes)  # Writes anything still queued
+        await self._run(self.inventory.close)
+        self._executor.shutdown()
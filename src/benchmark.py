@@ -0,0 +1,419 @@
+"""
+Benchmarks for the library management system.
+
+Run from the src directory:
+    python benchmark.py [--sizes 10000 100000 1000000] [--save-baseline]
+
+The footprint benchmarks (a Book, and a row of the columnar store) print their measurement next
+to the documented value and flag a regression when it exceeds it by more than the tolerance.
+
+The scaling suite generates a synthetic catalog of each size (duplicate acquisitions of the
+same title, Zipf-distributed authors, books on loan and waitlists) in a temporary copy of
+csv_files/, points the application at it through LIBRARY_DATA_DIR, and measures loading,
+lend/return, the search strategies, popular books, sync_to_files, opening and querying the
+memory-mapped catalog and authenticate_user.
+Every operation reports ops/s, latency percentiles and the peak memory it allocates.
+--save-baseline stores the results in benchmark_baseline.json; later runs compare against
+it and flag throughput drops or memory growth beyond the tolerances.
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from book import Book
+from utils import get_csv_path
+
+# Documented memory cost of one Book (see the Book class docstring), excluding its title string
+BOOK_FOOTPRINT_BYTES = 104
+# Documented memory cost of one ColumnarStore row: its BookView, its slot in store.views and its column cells
+VIEW_FOOTPRINT_BYTES = 150
+TOLERANCE = 0.10
+TIMING_TOLERANCE = 0.25  # Timings are noisier than allocations
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+DEFAULT_SIZES = (10000, 100000)
+TIME_BUDGET = 5.0  # Seconds spent at most on the repetitions of one operation
+PASSWORD = "benchmark-password"
+
+WORDS = ("Silent", "River", "Shadow", "Garden", "Empire", "Winter", "Secret", "Island", "Storm", "Memory",
+         "Glass", "Crown", "Forest", "Letters", "Night", "Journey", "Fire", "Ocean", "Stone", "Song",
+         "Broken", "Golden", "Last", "Hidden", "Distant", "Summer", "Iron", "Paper", "Wild", "Northern")
+FIRST_NAMES = ("Anna", "David", "Maria", "John", "Noa", "Roy", "Sarah", "Daniel", "Lea", "Tom", "Yael", "Omer")
+LAST_NAMES = ("Levi", "Cohen", "Smith", "Garcia", "Brown", "Mizrahi", "Peretz", "Miller", "Wilson", "Katz")
+GENRES = ("Fiction", "Fantasy", "Science Fiction", "Mystery", "Romance", "History", "Biography",
+          "Poetry", "Drama", "Thriller", "Children", "Science")
+
+
+def measure_book_footprint(count=100000):
+    """
+    Measure the average memory cost of a Book, including its slot in the catalog list.
+    Titles are created before tracing starts, since they are the payload rather than overhead;
+    authors and categories repeat, as they do in a real catalog.
+
+    :param count: Number of books to create.
+    :return: Bytes per book.
+    """
+    titles = [f"Title {index}" for index in range(count)]
+    authors = [f"Author {index % 1000}" for index in range(count)]
+    categories = [f"Category {index % 50}" for index in range(count)]
+
+    tracemalloc.start()
+    try:
+        books = [Book(title, author, 1, category, 2000)
+                 for title, author, category in zip(titles, authors, categories)]
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return current / len(books)
+
+
+def measure_view_footprint(count=100000):
+    """
+    Measure the average memory cost of a book adopted by a ColumnarStore: the BookView, its slot
+    in the list of views and its cells in the columns (including the arrays' spare capacity).
+    The Book objects being adopted are created before tracing starts.
+
+    :param count: Number of books to adopt.
+    :return: Bytes per row.
+    """
+    from columnar_store import ColumnarStore
+
+    books = [Book(f"Title {index}", f"Author {index % 1000}", 1, f"Category {index % 50}", 2000)
+             for index in range(count)]
+
+    tracemalloc.start()
+    try:
+        store = ColumnarStore(books)
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return current / len(store)
+
+
+def measure_lend_throughput(thread_counts=(1, 2, 4, 8), operations=2000, titles=64):
+    """
+    Measure lend/return throughput of one Inventory shared by several threads (desk terminals),
+    each thread working on its own titles. The inventory persists to a throwaway SQLite database,
+    so the numbers include the storage transactions but leave the CSV files untouched.
+
+    :param thread_counts: Thread counts to measure.
+    :param operations: Total number of operations per measurement, split between the threads.
+    :param titles: Number of titles in the catalog.
+    :return: Dictionary of thread count -> operations per second.
+    """
+    from action_logger import ActionLogger
+    from inventory import Inventory
+    from storage import SqliteStorage
+
+    results = {}
+    for thread_count in thread_counts:
+        with tempfile.TemporaryDirectory() as directory:
+            storage = SqliteStorage(os.path.join(directory, "library.db"))
+            storage.save_books([Book(f"Title {index}", "Author", 1000, "Category", 2000) for index in range(titles)])
+            with quiet():
+                inventory = Inventory(storage=storage, logger=ActionLogger(os.devnull))
+
+            def work(index):
+                title = f"Title {index % titles}"
+                for _ in range(operations // thread_count // 2):
+                    inventory.lend_book(title, f"User {index}")
+                    inventory.return_book(title)
+
+            threads = [threading.Thread(target=work, args=(index,)) for index in range(thread_count)]
+            with quiet():  # The inventory prints every operation
+                start = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - start
+            storage.close()
+        results[thread_count] = operations // thread_count // 2 * 2 * thread_count / elapsed
+    return results
+
+
+def generate_catalog(directory, count, duplicate_ratio=0.03, loaned_ratio=0.3, waitlist_ratio=0.01,
+                     users=20, seed=42):
+    """
+    Write a synthetic library into directory: books.csv, available_books.csv, loaned_books.csv,
+    waiting_list.csv and users.csv, in the formats of csv_files/.
+
+    :param count: Number of rows in books.csv.
+    :param duplicate_ratio: Share of rows that repeat an earlier title (more copies of it), merged on load.
+    :param loaned_ratio: Share of titles with copies on loan.
+    :param waitlist_ratio: Share of titles fully on loan with users waiting for them.
+    :param users: Number of users, all with the password PASSWORD and a precomputed hash.
+    :param seed: Random seed, so every run measures the same catalog.
+    :return: Dictionary with the unique "titles", the "authors", the "borrowed" and "available"
+             titles and the "users".
+    """
+    from werkzeug.security import generate_password_hash
+
+    rng = random.Random(seed)
+    unique = count - int(count * duplicate_ratio)
+    authors = [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {index}" for index in range(max(1, unique // 10))]
+    author_weights = [1 / (rank + 1) for rank in range(len(authors))]  # A few prolific authors, a long tail
+    titles = [f"{' '.join(rng.sample(WORDS, 3))} {index}" for index in range(unique)]
+    rows = [[title, author, rng.randint(1, 5), rng.choice(GENRES), rng.randint(1900, 2024)]
+            for title, author in zip(titles, rng.choices(authors, author_weights, k=unique))]
+    rows += [list(rows[rng.randrange(unique)]) for _ in range(count - unique)]
+    rng.shuffle(rows)
+
+    copies = {}
+    for title, _, row_copies, _, _ in rows:
+        copies[title] = copies.get(title, 0) + row_copies
+    borrowed = {title: rng.randint(1, copies[title]) for title in titles if rng.random() < loaned_ratio}
+    waiting = [title for title in borrowed if borrowed[title] == copies[title] and rng.random() < waitlist_ratio / loaned_ratio]
+
+    with open(os.path.join(directory, "books.csv"), "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["title", "author", "is_loaned", "copies", "genre", "year"])
+        writer.writerows([title, author, "No", row_copies, genre, year] for title, author, row_copies, genre, year in rows)
+    with open(os.path.join(directory, "available_books.csv"), "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Title", "Available"])
+        writer.writerows([title, copies[title] - borrowed.get(title, 0)] for title in titles)
+    with open(os.path.join(directory, "loaned_books.csv"), "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Title"])
+        writer.writerows([title] for title in borrowed)
+    with open(os.path.join(directory, "waiting_list.csv"), "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Book Title", "Username", "Email", "Phone"])
+        for title in waiting:
+            for position in range(rng.randint(1, 3)):
+                writer.writerow([title, f"reader{position}", f"reader{position}@example.com", f"050{position:07d}"])
+    usernames = [f"user{index}" for index in range(users)]
+    password_hash = generate_password_hash(PASSWORD)  # Hashing is deliberately slow: share one hash
+    with open(os.path.join(directory, "users.csv"), "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Username", "Password", "Hash"])
+        writer.writerows([username, PASSWORD, password_hash] for username in usernames)
+
+    return {
+        "titles": titles,
+        "authors": sorted(set(row[1] for row in rows)),
+        "borrowed": list(borrowed),
+        "available": [title for title in titles if borrowed.get(title, 0) < copies[title]],
+        "users": usernames,
+    }
+
+
+@contextlib.contextmanager
+def library_copy(count, seed=42):
+    """
+    Copy csv_files/ to a temporary directory, replace its contents with a synthetic catalog of
+    count books and point the application at it for the duration of the block.
+    :return: The catalog description returned by generate_catalog.
+    """
+    source = os.path.dirname(get_csv_path("books.csv"))
+    previous = os.environ.get("LIBRARY_DATA_DIR")
+    with tempfile.TemporaryDirectory() as directory:
+        data_dir = os.path.join(directory, "csv_files")
+        shutil.copytree(source, data_dir, ignore=shutil.ignore_patterns("test_csv", "*.db*", "*.jsonl"))
+        catalog = generate_catalog(data_dir, count, seed=seed)
+        os.environ["LIBRARY_DATA_DIR"] = data_dir
+        try:
+            yield catalog
+        finally:
+            if previous is None:
+                os.environ.pop("LIBRARY_DATA_DIR", None)
+            else:
+                os.environ["LIBRARY_DATA_DIR"] = previous
+
+
+@contextlib.contextmanager
+def quiet():
+    """
+    Silence the progress messages the application prints for every operation.
+    """
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def measure(operation, arguments, budget=TIME_BUDGET, min_calls=3):
+    """
+    Time operation(*args) for each args in arguments, stopping early once the time budget is spent,
+    then rerun a few calls under tracemalloc for the peak memory they allocate.
+
+    :param operation: The callable to measure.
+    :param arguments: List of argument tuples, one per call.
+    :return: Dictionary with ops_per_sec, p50_ms, p95_ms, p99_ms, peak_mb and calls.
+    """
+    latencies = []
+    with quiet():
+        started = time.perf_counter()
+        for args in arguments:
+            start = time.perf_counter()
+            operation(*args)
+            latencies.append(time.perf_counter() - start)
+            if len(latencies) >= min_calls and time.perf_counter() - started > budget:
+                break
+
+        tracemalloc.start()
+        try:
+            for args in arguments[:min_calls]:
+                operation(*args)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "calls": len(latencies),
+        "ops_per_sec": len(latencies) / sum(latencies),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "peak_mb": peak / 2 ** 20,
+    }
+
+
+def run_suite(count, iterations=200, seed=42):
+    """
+    Measure the main operations against a synthetic catalog of count books.
+    :param iterations: Maximum number of calls per operation (the time budget may stop it earlier).
+    :return: Dictionary of operation name -> measurement (see measure).
+    """
+    from action_logger import ActionLogger
+    from inventory import CATALOG_FILES, Inventory
+    from mapped_catalog import MappedCatalog
+    from search_strategy import SearchByTitle, SearchByAuthor, SearchByCategory, FuzzySearch
+    from user_manager import UserManager
+
+    rng = random.Random(seed)
+    results = {}
+    with library_copy(count, seed) as catalog:
+        logger = ActionLogger(os.devnull)
+        results["load"] = measure(lambda: Inventory(logger=logger), [()] * min(iterations, 3), min_calls=1)
+        with quiet():
+            inventory = Inventory(logger=logger)
+
+        def sample(values):
+            return [(rng.choice(values),) for _ in range(iterations)]
+
+        lends = sample(catalog["available"])
+        results["lend_book"] = measure(lambda title: inventory.lend_book(title, "benchmark"), lends)
+        results["return_book"] = measure(inventory.return_book, lends[:results["lend_book"]["calls"]])
+        for name, strategy, values in (("search_title", SearchByTitle(), catalog["titles"]),
+                                       ("search_author", SearchByAuthor(), catalog["authors"]),
+                                       ("search_category", SearchByCategory(), GENRES),
+                                       ("search_fuzzy", FuzzySearch(), [title[:-2] for title in catalog["titles"]])):
+            results[name] = measure(lambda value: inventory.search_books_with_strategy(strategy, value), sample(values))
+        results["get_popular_books"] = measure(inventory.get_popular_books, [(10,)] * iterations)
+
+        def full_sync():
+            inventory.mark_dirty(*CATALOG_FILES)  # Rewrite the whole catalog, as after a bulk change
+            inventory.sync_to_files()
+
+        results["sync_to_files"] = measure(full_sync, [()] * iterations, min_calls=1)
+        inventory.close()
+
+        MappedCatalog().close()  # Build the sidecar index once; the measured opens reuse it
+        results["mapped_open"] = measure(lambda: MappedCatalog().close(), [()] * min(iterations, 3), min_calls=1)
+        with MappedCatalog() as mapped:
+            results["mapped_find"] = measure(mapped.find_book, sample(catalog["titles"]))
+
+        with quiet():
+            user_manager = UserManager()
+        results["authenticate_user"] = measure(lambda username: user_manager.authenticate_user(username, PASSWORD),
+                                               sample(catalog["users"]))
+    return results
+
+
+def compare(results, baseline):
+    """
+    Print every measurement next to its baseline.
+    :param results: Dictionary of catalog size -> run_suite results.
+    :param baseline: Same structure, loaded from the baseline file (may be empty).
+    :return: List of "size operation metric" strings that regressed.
+    """
+    regressions = []
+    for size, operations in results.items():
+        print(f"\nCatalog of {size} books")
+        print(f"{'operation':<20}{'calls':>7}{'ops/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak MB':>10}")
+        for name, result in operations.items():
+            reference = baseline.get(str(size), {}).get(name)
+            flags = []
+            if reference:
+                if result["ops_per_sec"] < reference["ops_per_sec"] * (1 - TIMING_TOLERANCE):
+                    flags.append(f"ops/s was {reference['ops_per_sec']:.1f}")
+                if result["peak_mb"] > reference["peak_mb"] * (1 + TOLERANCE) + 0.1:
+                    flags.append(f"peak MB was {reference['peak_mb']:.1f}")
+            regressions += [f"{size} {name}: {flag}" for flag in flags]
+            print(f"{name:<20}{result['calls']:>7}{result['ops_per_sec']:>12.1f}{result['p50_ms']:>10.2f}"
+                  f"{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['peak_mb']:>10.1f}"
+                  + ("  REGRESSION (" + ", ".join(flags) + ")" if flags else ""))
+    return regressions
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path, results):
+    baseline = load_baseline(path)
+    baseline.update({str(size): operations for size, operations in results.items()})
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+
+
+def check(name, measured, documented, unit):
+    """
+    Print a measurement against its documented value.
+    :return: True if the measurement is within the tolerance.
+    """
+    within = measured <= documented * (1 + TOLERANCE)
+    status = "OK" if within else "REGRESSION"
+    print(f"{name}: {measured:.1f} {unit} (documented {documented} {unit}) {status}")
+    return within
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Library management system benchmarks.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Catalog sizes to run the scaling suite on (e.g. 10000 100000 1000000).")
+    parser.add_argument("--iterations", type=int, default=200, help="Maximum calls per operation.")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file to compare against.")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline.")
+    parser.add_argument("--skip-threads", action="store_true", help="Skip the multi-threaded lend/return benchmark.")
+    args = parser.parse_args(argv)
+
+    results = [
+        check("Book memory footprint", measure_book_footprint(), BOOK_FOOTPRINT_BYTES, "bytes/book"),
+        check("BookView memory footprint", measure_view_footprint(), VIEW_FOOTPRINT_BYTES, "bytes/row"),
+    ]
+    if not args.skip_threads:
+        for thread_count, throughput in measure_lend_throughput().items():
+            print(f"Lend/return throughput with {thread_count} threads: {throughput:.0f} ops/s")
+
+    suite = {size: run_suite(size, args.iterations) for size in args.sizes}
+    regressions = compare(suite, load_baseline(args.baseline))
+    if args.save_baseline:
+        save_baseline(args.baseline, suite)
+        print(f"\nBaseline saved to {args.baseline}")
+    elif regressions:
+        print(f"\n{len(regressions)} regressions against {args.baseline}")
+    return 0 if all(results) and (args.save_baseline or not regressions) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
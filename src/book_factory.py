@@ -48,6 +48,41 @@ class BookFactory:
         books.append(book)
         return book
 
+    @staticmethod
+    def create_books(books_df):
+        """
+        Create Book objects for a whole DataFrame of books.csv rows in one pass.
+        Follows the merge semantics of create_book: rows sharing a title become a single book
+        that keeps the details of the first row and the sum of all the copies.
+
+        :param books_df: DataFrame with title, author, is_loaned, copies, genre and year columns
+                         (and optionally waiting_list).
+        :return: List of Book objects in order of first appearance.
+        """
+        # Details come from the first row of each title, copies are summed across all of them
+        first_rows = books_df.drop_duplicates(subset="title", keep="first").set_index("title")
+        total_copies = books_df.groupby("title", sort=False, dropna=False)["copies"].sum()
+
+        books = [
+            Book(title, author, copies, genre, year, is_loaned)
+            for title, author, copies, genre, year, is_loaned in zip(
+                first_rows.index.tolist(),
+                first_rows["author"].tolist(),
+                total_copies.reindex(first_rows.index).astype(int).tolist(),
+                first_rows["genre"].tolist(),
+                first_rows["year"].astype(int).tolist(),
+                (first_rows["is_loaned"] == "Yes").tolist()
+            )
+        ]
+
+        # Handle waiting lists if the file provides them
+        if "waiting_list" in first_rows.columns:
+            for book, waiting_list in zip(books, first_rows["waiting_list"].tolist()):
+                if isinstance(waiting_list, str) and waiting_list:
+                    book.waiting_list = waiting_list.split(",")
+
+        return books
+
     @staticmethod
     def update_book_copies(book):
         """
@@ -0,0 +1,150 @@
+"""
+Virtualized book listing for the GUI.
+
+The listing keeps the books to show in memory and only creates Treeview rows for the part
+the user has scrolled to: the first page when the listing is shown, the next page when the
+view gets close to the bottom. Listing 100k books therefore costs one page of rows instead
+of a full text dump. Inventory change events update, add or delete only the rows of the
+titles that changed, so the listing is never cleared and rebuilt after a lend or return.
+"""
+import itertools
+
+from observer import Observer
+from subject import ChangeEvent
+
+COLUMNS = ("title", "author", "genre", "year", "available")
+HEADINGS = ("Title", "Author", "Genre", "Year", "Available")
+
+
+def row_values(book):
+    return (book.title, book.author, book.category, book.year, f"{book.available_copies}/{book.copies}")
+
+
+class BookTable(Observer):
+    """
+    Feeds a ttk.Treeview from the in-memory inventory, one page of rows at a time.
+    Change events must be applied on the Tk thread: LibraryGUI polls the inventory notifications
+    from its event loop, so update() is always called there.
+    """
+
+    def __init__(self, tree, inventory, page_size=200, scrollbar=None):
+        """
+        :param tree: The Treeview showing the rows (its columns are configured here).
+        :param inventory: The Inventory the books come from.
+        :param page_size: Number of rows materialized at a time.
+        :param scrollbar: Optional vertical Scrollbar attached to the tree.
+        """
+        self.tree = tree
+        self.inventory = inventory
+        self.page_size = page_size
+        self.scrollbar = scrollbar
+        self._iids = []  # Row ids in listing order
+        self._books = {}  # Row id -> book, for every book in the listing
+        self._rows = {}  # Normalized title -> row ids of the listed books with that title
+        self._next_iid = itertools.count()  # Row ids are unique even when books share a title
+        self._materialized = 0  # The first rows of _iids that exist in the tree
+        self._whole_catalog = False  # New books join the listing only when it shows the whole catalog
+
+        tree.configure(columns=COLUMNS, show="headings", yscrollcommand=self.on_scroll)
+        for column, heading in zip(COLUMNS, HEADINGS):
+            tree.heading(column, text=heading)
+
+    @staticmethod
+    def _key(title):
+        return str(title).lower()
+
+    def __len__(self):
+        return len(self._iids)
+
+    @property
+    def materialized(self):
+        return self._materialized
+
+    def show(self, books, whole_catalog=False):
+        """
+        Replace the listing with the given books and materialize the first page.
+        :param whole_catalog: The books are the whole catalog, so books added later are listed as well.
+        """
+        self.tree.delete(*self.tree.get_children())
+        self._iids, self._books, self._rows = [], {}, {}
+        for book in books:
+            self._list(book)
+        self._materialized = 0
+        self._whole_catalog = whole_catalog
+        self.materialize_more()
+
+    def show_catalog(self):
+        self.show(self.inventory.books, whole_catalog=True)
+
+    def materialize_more(self):
+        """
+        Create the rows of the next page.
+        """
+        end = min(self._materialized + self.page_size, len(self._iids))
+        for iid in self._iids[self._materialized:end]:
+            self.tree.insert("", "end", iid=iid, values=row_values(self._books[iid]))
+        self._materialized = end
+
+    def on_scroll(self, first, last):
+        """
+        yscrollcommand of the tree: materialize the next page when the bottom comes into view.
+        """
+        if self.scrollbar is not None:
+            self.scrollbar.set(first, last)
+        if float(last) >= 0.9 and self._materialized < len(self._iids):
+            self.materialize_more()
+
+    def update(self, subject, event=None):
+        """
+        Apply an inventory change event to the listing.
+        """
+        if not event:
+            # No details: refresh the rows on screen
+            for iid in self._iids[:self._materialized]:
+                self.tree.item(iid, values=row_values(self._books[iid]))
+            return
+        for title, kinds in event.changes.items():
+            key = self._key(title)
+            books = self.inventory.find_books(title)
+            for iid in list(self._rows.get(key, ())):
+                if any(book is self._books[iid] for book in books):
+                    if self.tree.exists(iid):
+                        self.tree.item(iid, values=row_values(self._books[iid]))
+                elif ChangeEvent.REMOVED in kinds:
+                    self._remove(key, iid)
+            if ChangeEvent.ADDED in kinds and self._whole_catalog:
+                listed = [self._books[iid] for iid in self._rows.get(key, ())]
+                for book in books:
+                    if not any(book is other for other in listed):
+                        self._append(book)
+
+    def _list(self, book):
+        """
+        Add a book at the end of the listing without creating its row.
+        """
+        iid = str(next(self._next_iid))
+        self._iids.append(iid)
+        self._books[iid] = book
+        self._rows.setdefault(self._key(book.title), []).append(iid)
+        return iid
+
+    def _remove(self, key, iid):
+        """
+        :param key: The normalized title the row is listed under (a renamed book no longer has it).
+        """
+        position = self._iids.index(iid)
+        del self._iids[position]
+        del self._books[iid]
+        self._rows[key].remove(iid)
+        if not self._rows[key]:
+            del self._rows[key]
+        if position < self._materialized:
+            self.tree.delete(iid)
+            self._materialized -= 1
+
+    def _append(self, book):
+        iid = self._list(book)
+        if self._materialized == len(self._iids) - 1:
+            # Every earlier row exists, so the new one belongs on screen too
+            self.tree.insert("", "end", iid=iid, values=row_values(book))
+            self._materialized += 1
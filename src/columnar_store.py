@@ -0,0 +1,243 @@
+"""
+Columnar backing store for the catalog.
+
+Instead of keeping copies, borrow counts, years, authors and categories on millions of
+separate Book objects, the store keeps them in typed columns (array.array, shared with
+NumPy without copying) and dictionary-encodes the author and category strings. The Book
+objects handed out by the store are BookView instances: lightweight views that read and
+write their row of the columns. Aggregates such as the most borrowed books, the number of
+books per category or availability filters then run as vectorized operations over the
+columns instead of Python loops over Book objects. Without NumPy the same queries fall
+back to plain Python over the arrays.
+"""
+import heapq
+from array import array
+from book import BookBase
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class CategoryColumn:
+    """
+    Dictionary-encoded string column: each row stores a small integer code.
+    """
+
+    def __init__(self):
+        self.codes = array("q")
+        self.values = []  # code -> value
+        self._codes_by_value = {}  # value -> code
+
+    def encode(self, value):
+        code = self._codes_by_value.get(value)
+        if code is None:
+            code = self._codes_by_value[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def code_of(self, value):
+        """
+        Get the code of a value, or None if no row ever had it.
+        """
+        return self._codes_by_value.get(value)
+
+    def append(self, value):
+        self.codes.append(self.encode(value))
+
+    def get(self, row):
+        return self.values[self.codes[row]]
+
+    def set(self, row, value):
+        self.codes[row] = self.encode(value)
+
+
+class BookView(BookBase):
+    """
+    A book whose copies, borrow count, year, author and category live in a ColumnarStore row.
+    It only stores what the columns do not hold (the title, the loan flag and the waiting list),
+    so it is smaller than the Book it replaces; see measure_view_footprint in benchmark.py.
+    """
+    __slots__ = ("_store", "_row", "title", "is_loaned", "waiting_list")
+
+    def __init__(self, store, row, title, is_loaned=False, waiting_list=None):
+        self._store = store
+        self._row = row
+        self.title = title
+        self.is_loaned = is_loaned
+        self.waiting_list = waiting_list
+
+    @property
+    def copies(self):
+        return self._store.copies[self._row]
+
+    @copies.setter
+    def copies(self, copies):
+        self._store.copies[self._row] = int(copies)
+
+    @property
+    def borrow_count(self):
+        return self._store.borrow_count[self._row]
+
+    @borrow_count.setter
+    def borrow_count(self, borrow_count):
+        self._store.borrow_count[self._row] = int(borrow_count)
+
+    @property
+    def year(self):
+        return self._store.year[self._row]
+
+    @year.setter
+    def year(self, year):
+        self._store.year[self._row] = int(year)
+
+    @property
+    def author(self):
+        return self._store.author.get(self._row)
+
+    @author.setter
+    def author(self, author):
+        self._store.author.set(self._row, author)
+
+    @property
+    def category(self):
+        return self._store.category.get(self._row)
+
+    @category.setter
+    def category(self, category):
+        self._store.category.set(self._row, category)
+
+
+class ColumnarStore:
+    """
+    Array-backed columns for the books of an Inventory.
+    Rows are never reused: removing a book only clears its "alive" flag, so row numbers stay stable.
+    """
+
+    def __init__(self, books=()):
+        self.copies = array("q")
+        self.borrow_count = array("q")
+        self.year = array("q")
+        self.author = CategoryColumn()
+        self.category = CategoryColumn()
+        self.alive = bytearray()
+        self.views = []  # row -> BookView (None once removed)
+        for book in books:
+            self.adopt(book)
+
+    def __len__(self):
+        return len(self.views) - self.views.count(None)
+
+    def adopt(self, book):
+        """
+        Copy a Book into a new row and return the BookView that replaces it.
+        Views that already belong to this store are returned unchanged.
+        """
+        if isinstance(book, BookView) and book._store is self:
+            return book
+        row = len(self.views)
+        self.copies.append(int(book.copies))
+        self.borrow_count.append(int(book.borrow_count))
+        self.year.append(int(book.year))
+        self.author.append(book.author)
+        self.category.append(book.category)
+        self.alive.append(1)
+        view = BookView(self, row, book.title, book.is_loaned, book.waiting_list)
+        self.views.append(view)
+        return view
+
+    def remove(self, view):
+        """
+        Drop the row of a view from every aggregate.
+        """
+        self.alive[view._row] = 0
+        self.views[view._row] = None
+
+    def _views_of(self, rows):
+        return [self.views[row] for row in rows]
+
+    def top_borrowed(self, n):
+        """
+        Get the n books with the most borrowed copies, most borrowed first (ties in catalog order).
+        """
+        if n <= 0:
+            return []
+        if np is None:
+            rows = (row for row in range(len(self.views)) if self.alive[row] and self.borrow_count[row] > 0)
+            return self._views_of(heapq.nsmallest(n, rows, key=lambda row: (-self.borrow_count[row], row)))
+
+        borrowed = np.frombuffer(self.borrow_count, dtype=np.int64)
+        alive = np.frombuffer(self.alive, dtype=np.uint8)
+        candidates = np.flatnonzero((alive == 1) & (borrowed > 0))
+        values = borrowed[candidates]
+        del borrowed, alive  # Release the buffers so the arrays can grow again
+
+        if len(candidates) > n:
+            # Keep everything above the n-th largest value, then the earliest rows tied with it
+            kth = np.partition(values, len(values) - n)[len(values) - n]
+            above = np.flatnonzero(values > kth)
+            ties = np.flatnonzero(values == kth)[:n - len(above)]
+            selected = np.concatenate([above, ties])
+            candidates, values = candidates[selected], values[selected]
+        order = np.lexsort((candidates, -values))
+        return self._views_of(candidates[order].tolist())
+
+    def count_per_category(self):
+        """
+        Count the books in each category.
+        :return: Dictionary of category -> number of books.
+        """
+        if np is None:
+            counts = {}
+            for row, code in enumerate(self.category.codes):
+                if self.alive[row]:
+                    counts[code] = counts.get(code, 0) + 1
+        else:
+            codes = np.frombuffer(self.category.codes, dtype=np.int64)
+            alive = np.frombuffer(self.alive, dtype=np.uint8)
+            bincount = np.bincount(codes[alive == 1], minlength=len(self.category.values))
+            del codes, alive
+            counts = {code: int(count) for code, count in enumerate(bincount.tolist()) if count}
+        return {self.category.values[code]: count for code, count in counts.items()}
+
+    def filter(self, category=None, author=None, min_available=None, year_from=None, year_to=None):
+        """
+        Find the books matching every given criterion, in catalog order.
+        :param category: Exact category.
+        :param author: Exact author.
+        :param min_available: Minimum number of available copies.
+        :param year_from: Earliest year of publication (inclusive).
+        :param year_to: Latest year of publication (inclusive).
+        :return: List of matching books.
+        """
+        category_code = self.category.code_of(category) if category is not None else None
+        author_code = self.author.code_of(author) if author is not None else None
+        if (category is not None and category_code is None) or (author is not None and author_code is None):
+            return []
+
+        if np is None:
+            rows = [
+                row for row in range(len(self.views))
+                if self.alive[row]
+                and (category_code is None or self.category.codes[row] == category_code)
+                and (author_code is None or self.author.codes[row] == author_code)
+                and (min_available is None or self.copies[row] - self.borrow_count[row] >= min_available)
+                and (year_from is None or self.year[row] >= year_from)
+                and (year_to is None or self.year[row] <= year_to)
+            ]
+            return self._views_of(rows)
+
+        mask = np.frombuffer(self.alive, dtype=np.uint8) == 1
+        if category_code is not None:
+            mask &= np.frombuffer(self.category.codes, dtype=np.int64) == category_code
+        if author_code is not None:
+            mask &= np.frombuffer(self.author.codes, dtype=np.int64) == author_code
+        if min_available is not None:
+            available = np.frombuffer(self.copies, dtype=np.int64) - np.frombuffer(self.borrow_count, dtype=np.int64)
+            mask &= available >= min_available
+        if year_from is not None:
+            mask &= np.frombuffer(self.year, dtype=np.int64) >= year_from
+        if year_to is not None:
+            mask &= np.frombuffer(self.year, dtype=np.int64) <= year_to
+        return self._views_of(np.flatnonzero(mask).tolist())
@@ -0,0 +1,239 @@
+"""
+Local HTTP/JSON service over one shared Inventory and UserManager.
+
+Front-desk clients talk to a single warm, in-memory inventory instead of each loading the
+CSV files. The server speaks HTTP/1.1, so a client keeps its connection open across requests,
+and every connection is served by its own thread (Inventory is thread-safe).
+
+Endpoints:
+    GET  /books/search?q=term            exact title/author/category matches, or the closest matches
+    GET  /books/popular?top=10[&days=7]  most borrowed books (or most lent in the last days)
+    GET  /waitlist?title=...             users waiting for a title
+    GET  /metrics[?format=json]          operation counters and latency histograms (Prometheus text format)
+    POST /lend      {"title", "username"}
+    POST /return    {"title"}
+    POST /waitlist  {"title", "username", "email", "phone"}
+    POST /login     {"username", "password"}
+    POST /batch     {"operations": [{"op": "lend" | "return", ...}, ...]}
+                    applies every operation and persists them with a single flush
+                    (other connections' changes are persisted as usual meanwhile)
+
+Run from the src directory:
+    python http_server.py [port]
+"""
+import json
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from inventory import Inventory
+from metrics import get_metrics
+from user_manager import UserManager
+
+
+class RequestError(Exception):
+    """
+    A request that cannot be served, answered with the given HTTP status.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def book_to_json(book):
+    return {
+        "title": book.title,
+        "author": book.author,
+        "category": book.category,
+        "year": book.year,
+        "copies": book.copies,
+        "available": book.available_copies,
+    }
+
+
+class LibraryRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive: clients reuse their connection
+
+    # Routing
+    def do_GET(self):
+        self._dispatch({
+            "/books/search": self.search,
+            "/books/popular": self.popular,
+            "/waitlist": self.get_waitlist,
+            "/metrics": self.metrics,
+        })
+
+    def do_POST(self):
+        self._dispatch({
+            "/lend": self.lend,
+            "/return": self.return_book,
+            "/waitlist": self.add_to_waitlist,
+            "/login": self.login,
+            "/batch": self.batch,
+        })
+
+    def _dispatch(self, routes):
+        url = urlsplit(self.path)
+        try:
+            body = self._read_body()  # Always consume the body, or the next request on the connection breaks
+            route = routes.get(url.path)
+            if route is None:
+                raise RequestError(404, f"Unknown endpoint {self.command} {url.path}.")
+            self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            self.body = body
+            result = route()
+            if isinstance(result, str):
+                self._send_text(200, result)
+            else:
+                self._send(200, result)
+        except RequestError as e:
+            self._send(e.status, {"error": str(e)})
+        except Exception as e:
+            self.server.inventory.log_action("HTTP Request", success=False, details=f"{self.command} {url.path}: {e}")
+            self._send(500, {"error": f"Internal error: {e}"})
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise RequestError(400, "The request body is not valid JSON.")
+        if not isinstance(body, dict):
+            raise RequestError(400, "The request body must be a JSON object.")
+        return body
+
+    def _send(self, status, payload):
+        self._send_text(status, json.dumps(payload), "application/json")
+
+    def _send_text(self, status, text, content_type="text/plain; version=0.0.4"):
+        data = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    @staticmethod
+    def _require(source, *fields):
+        missing = [field for field in fields if not source.get(field)]
+        if missing:
+            raise RequestError(400, f"Missing required fields: {', '.join(missing)}.")
+        return [source[field] for field in fields]
+
+    def _book(self, title):
+        book = self.server.inventory.find_book(title)
+        if book is None:
+            raise RequestError(404, f"Book '{title}' not found in inventory.")
+        return book
+
+    # Operations shared by the single and batch endpoints
+    def _lend(self, operation):
+        title, username = self._require(operation, "title", "username")
+        book = self._book(title)
+        lent = self.server.inventory.lend_book(title, username, operation.get("email"), operation.get("phone"))
+        return {"title": book.title, "ok": bool(lent), "available": book.available_copies}
+
+    def _return(self, operation):
+        title, = self._require(operation, "title")
+        book = self._book(title)
+        result, next_user = self.server.inventory.return_book_with_next_user(title)
+        return {"title": book.title, "ok": result is True, "available": book.available_copies,
+                "lent_to": next_user["username"] if next_user else None}
+
+    # Endpoints
+    def search(self):
+        term, = self._require(self.query, "q")
+        books, exact = self.server.inventory.search_catalog(term)
+        return {"exact": exact, "books": [book_to_json(book) for book in books]}
+
+    def popular(self):
+        try:
+            top_n = int(self.query.get("top", 10))
+            days = int(self.query["days"]) if "days" in self.query else None
+        except ValueError:
+            raise RequestError(400, "top and days must be integers.")
+        popular = self.server.inventory.get_popular_books(top_n, days)
+        return {"books": [{"title": title, "count": count} for title, count in popular]}
+
+    def get_waitlist(self):
+        title, = self._require(self.query, "title")
+        return {"title": title, "users": [user["username"] for user in self.server.inventory.waitlist.get(title, ())]}
+
+    def metrics(self):
+        if self.query.get("format") == "json":
+            return get_metrics().snapshot()
+        return get_metrics().prometheus_text()
+
+    def lend(self):
+        return self._lend(self.body)
+
+    def return_book(self):
+        return self._return(self.body)
+
+    def add_to_waitlist(self):
+        title, username, email, phone = self._require(self.body, "title", "username", "email", "phone")
+        self._book(title)
+        self.server.inventory.add_to_waitlist(title, username, email, phone)
+        return {"title": title, "position": len(self.server.inventory.waitlist.get(title, ()))}
+
+    def login(self):
+        username, password = self._require(self.body, "username", "password")
+        if self.server.user_manager is None:
+            raise RequestError(404, "User accounts are not available on this server.")
+        return {"username": username, "ok": self.server.user_manager.authenticate_user(username, password) is not None}
+
+    def batch(self):
+        operations = self.body.get("operations")
+        if not isinstance(operations, list):
+            raise RequestError(400, "operations must be a list.")
+        handlers = {"lend": self._lend, "return": self._return}
+        results = []
+        with self.server.inventory.deferred_writes():  # One flush for the whole batch
+            for operation in operations:
+                try:
+                    handler = handlers.get(operation.get("op")) if isinstance(operation, dict) else None
+                    if handler is None:
+                        raise RequestError(400, "op must be 'lend' or 'return'.")
+                    results.append(handler(operation))
+                except RequestError as e:
+                    results.append({"ok": False, "error": str(e)})
+        return {"results": results}
+
+
+class LibraryServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server sharing one Inventory (and optionally one UserManager) between all connections.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, inventory, user_manager=None, verbose=False):
+        """
+        :param address: (host, port) to listen on; port 0 picks a free port.
+        :param inventory: The shared Inventory.
+        :param user_manager: Optional UserManager for /login.
+        :param verbose: Print an access log line per request.
+        """
+        super().__init__(address, LibraryRequestHandler)
+        self.inventory = inventory
+        self.user_manager = user_manager
+        self.verbose = verbose
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    get_metrics().enable()
+    server = LibraryServer(("127.0.0.1", port), Inventory(), UserManager(), verbose=True)
+    print(f"Serving the library on http://127.0.0.1:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.inventory.close()
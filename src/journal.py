@@ -0,0 +1,102 @@
+import json
+import os
+from utils import get_csv_path
+
+
+class InventoryJournal:
+    """
+    Append-only write-ahead journal for inventory mutations.
+
+    Every mutation is written as one JSON line and fsync'd before the operation returns,
+    so the cost of persisting an operation no longer depends on the size of the catalog.
+    Records carry the resulting state (e.g. the new borrow count) rather than a delta,
+    which makes replaying them over a snapshot idempotent: a crash between writing the
+    CSV snapshots and truncating the journal is harmless.
+    """
+
+    def __init__(self, path=None, compact_every=1000):
+        """
+        :param path: Path of the journal file (defaults to csv_files/inventory_journal.jsonl).
+        :param compact_every: Number of records after which the journal should be folded into the CSV snapshots.
+        """
+        self.path = path or get_csv_path("inventory_journal.jsonl")
+        self.compact_every = compact_every
+        self._file = None
+        self._pending = self._count_records()
+
+    def _count_records(self):
+        try:
+            with open(self.path, mode="r", encoding="utf-8") as file:
+                return sum(1 for line in file if line.strip())
+        except FileNotFoundError:
+            return 0
+
+    def append(self, op, **payload):
+        """
+        Append a record to the journal and force it to disk.
+        :param op: The operation name (e.g. "lend", "add_book").
+        :param payload: JSON-serializable details of the resulting state.
+        """
+        if self._file is None:
+            self._file = open(self.path, mode="a", encoding="utf-8")
+        self._file.write(json.dumps({"op": op, **payload}) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending += 1
+
+    def append_many(self, records):
+        """
+        Append several records with a single write and a single fsync (group commit).
+        :param records: Iterable of (op, payload) tuples.
+        """
+        lines = [json.dumps({"op": op, **payload}) + "\n" for op, payload in records]
+        if not lines:
+            return
+        if self._file is None:
+            self._file = open(self.path, mode="a", encoding="utf-8")
+        self._file.write("".join(lines))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending += len(lines)
+
+    def records(self):
+        """
+        Yield the records in the journal in the order they were written.
+        A torn last line (crash mid-append) is ignored, since that operation never completed.
+        """
+        try:
+            with open(self.path, mode="r", encoding="utf-8") as file:
+                for line in file:
+                    if not line.strip():
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        print("WARNING: Ignoring incomplete record at the end of the journal.")
+                        return
+        except FileNotFoundError:
+            return
+
+    def needs_compaction(self):
+        """
+        Check whether enough records accumulated to fold the journal into the snapshots.
+        """
+        return self._pending >= self.compact_every
+
+    def truncate(self):
+        """
+        Empty the journal once its records are part of the CSV snapshots.
+        """
+        self.close()
+        with open(self.path, mode="w", encoding="utf-8") as file:
+            file.flush()
+            os.fsync(file.fileno())
+        self._pending = 0
+
+    def close(self):
+        """
+        Close the journal file handle.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -1,9 +1,13 @@
-import csv
 import tkinter as tk
-from tkinter import messagebox,simpledialog
+from tkinter import messagebox,simpledialog,ttk
+from book_table import BookTable
 from inventory import Inventory
+from task_runner import TaskRunner
 from user_manager import UserManager
-from utils import get_csv_path
+
+NOTIFY_INTERVAL_MS = 100  # Inventory changes are merged and shown at most this often
+SNAPSHOT_CHUNK = 10000  # Books copied between two progress reports when listing the catalog
+
 
 class LibraryGUI:
     """
@@ -34,9 +38,26 @@ class LibraryGUI:
 
         self.login_frame=None
         self.main_frame=None
+        self.book_table=None
+        self.status_frame=None
+
+        # Inventory I/O and password hashing run on worker threads, results come back through root.after
+        self.tasks = TaskRunner(self.root)
+        self.tasks.on_busy = self.show_busy
+
+        # Coalesce inventory change events and deliver them on the Tk thread
+        self.inventory.configure_notifications(debounce=NOTIFY_INTERVAL_MS / 1000)
+        self.root.after(NOTIFY_INTERVAL_MS, self.poll_notifications)
 
         self.show_login_screen()
 
+    def poll_notifications(self):
+        """
+        Deliver the inventory changes merged since the last poll, then poll again.
+        """
+        self.inventory.flush_notifications()
+        self.root.after(NOTIFY_INTERVAL_MS, self.poll_notifications)
+
 
     def show_login_screen(self):
         """
@@ -69,6 +90,55 @@ class LibraryGUI:
         login_button = tk.Button(self.login_frame, text="Login", command=self.login)
         login_button.place(relx=0.5, rely=0.65, anchor="center")
 
+        self.create_status_bar()
+
+    def create_status_bar(self):
+        """
+        Create the bar showing the running background tasks, their progress and a Cancel button.
+        It stays hidden while no task runs.
+        """
+        self.status_frame = tk.Frame(self.root, bg="#eeeeee")
+        self.status_label = tk.Label(self.status_frame, bg="#eeeeee", font=("Ariel", 12), anchor="w")
+        self.status_label.pack(side=tk.LEFT, padx=10)
+        self.cancel_button = tk.Button(self.status_frame, text="Cancel", command=self.tasks.cancel_all)
+        self.cancel_button.pack(side=tk.RIGHT, padx=10, pady=5)
+        self.progress_bar = ttk.Progressbar(self.status_frame, length=200, maximum=1.0)
+        self.progress_bar.pack(side=tk.RIGHT, padx=10)
+        self.show_busy(self.tasks.running)
+
+    def show_busy(self, tasks):
+        """
+        Update the status bar for the given running tasks.
+        """
+        if not self.status_frame or not self.status_frame.winfo_exists():
+            return
+        if not tasks:
+            self.progress_bar.stop()
+            self.status_frame.place_forget()
+            return
+        self.status_label.config(text=", ".join(task.description for task in tasks) + "...")
+        self.cancel_button.config(state=tk.NORMAL if any(task.cancellable for task in tasks) else tk.DISABLED)
+        self.progress_bar.config(mode="indeterminate")
+        self.progress_bar.start(20)
+        self.status_frame.place(relx=0, rely=1, relwidth=1, anchor="sw")
+        self.status_frame.lift()
+
+    def show_progress(self, fraction):
+        """
+        Switch the progress bar to the fraction reported by a task.
+        """
+        if self.status_frame and self.status_frame.winfo_exists():
+            self.progress_bar.stop()
+            self.progress_bar.config(mode="determinate", value=fraction)
+
+    def show_task_error(self, action):
+        """
+        :return: on_error callback reporting that the action failed.
+        """
+        def on_error(error):
+            self.inventory.log_action(action, success=False, details=f"Error: {error}")
+            messagebox.showerror("Error", f"{action} failed: {error}")
+        return on_error
 
 
     def login(self):
@@ -80,14 +150,19 @@ class LibraryGUI:
             messagebox.showerror("Error", "Please enter both username and password.")
             return
 
-        if self.user_manager.authenticate_user(username, password):
-            self.inventory.log_action("User Login", success=True, details=f"User '{username}' logged in successfully.")
-            messagebox.showinfo("Success", f"Welcome {username}!")
-            self.show_main_screen()
-        else:
-            self.inventory.log_action("User Login", success=False,
-                                      details=f"Invalid login attempt for user '{username}'.")
-            messagebox.showerror("Error", "Invalid username or password.")
+        def on_done(user):
+            if user:
+                self.inventory.log_action("User Login", success=True, details=f"User '{username}' logged in successfully.")
+                messagebox.showinfo("Success", f"Welcome {username}!")
+                self.show_main_screen()
+            else:
+                self.inventory.log_action("User Login", success=False,
+                                          details=f"Invalid login attempt for user '{username}'.")
+                messagebox.showerror("Error", "Invalid username or password.")
+
+        # Verifying the password hash is deliberately slow
+        self.tasks.submit(self.user_manager.authenticate_user, username, password, on_done=on_done,
+                          on_error=self.show_task_error("User Login"), description="Logging in")
 
     def logout(self):
         """
@@ -95,6 +170,8 @@ class LibraryGUI:
         """
         confirmation = messagebox.askyesno("Logout", "Are you sure you want to logout?")
         if confirmation:
+            self.tasks.cancel_all()
+            self._detach_book_table()
             for widget in self.root.winfo_children():
                 widget.destroy()
 
@@ -108,6 +185,7 @@ class LibraryGUI:
             self.root.unbind("<Configure>")
             self.login_frame.destroy
 
+        self._detach_book_table()
         for widget in self.root.winfo_children():
             widget.destroy()
 
@@ -171,11 +249,45 @@ class LibraryGUI:
         self.output_area = tk.Text(self.root, wrap=tk.WORD, width=150, height=40,font=("Ariel",20))
         self.output_area.pack(pady=20)
 
+        # Book listings go to a table that only creates the rows scrolled to:
+        self.listing_frame = tk.Frame(self.root, bg="#ffffff")
+        self.listing_label = tk.Label(self.listing_frame, bg="#ffffff", font=("Ariel", 16), anchor="w")
+        self.listing_label.pack(fill=tk.X)
+        tree = ttk.Treeview(self.listing_frame, height=25)
+        scrollbar = ttk.Scrollbar(self.listing_frame, orient=tk.VERTICAL, command=tree.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.book_table = BookTable(tree, self.inventory, scrollbar=scrollbar)
+        self.inventory.attach(self.book_table)
+
+        self.create_status_bar()
+
+    def _detach_book_table(self):
+        if self.book_table:
+            self.inventory.detach(self.book_table)
+            self.book_table = None
+
+    def show_listing(self, header):
+        """
+        Show the book table (instead of the text area) under the given header.
+        """
+        self.output_area.pack_forget()
+        self.listing_label.config(text=header)
+        self.listing_frame.pack(pady=20, fill=tk.BOTH, expand=True)
+
+    def show_text(self):
+        """
+        Show the text area (instead of the book table), cleared.
+        """
+        self.listing_frame.pack_forget()
+        self.output_area.pack(pady=20)
+        self.output_area.delete(1.0, tk.END)
+
     def view_waitlist(self):
         """
         Display the current waitlist in the GUI.
         """
-        self.output_area.delete(1.0, tk.END)  # Clear the output area
+        self.show_text()  # Clear the output area
 
         if not self.inventory.waitlist:
             self.output_area.insert(tk.END, "No waitlist entries found.\n")
@@ -212,10 +324,18 @@ class LibraryGUI:
             #Creating a book object and use the Inventory to add him:
             from book import Book
             new_book=Book(title=book_title,author=book_author,copies=book_copies,category=book_category,year=book_year,is_loaned=False)
-            self.inventory.add_book(new_book)
-            messagebox.showinfo("Success",f"Book {book_title} added successfully!")
         except Exception as e:
             messagebox.showerror("Error",f"Failed to add book :{e}")
+            return
+
+        def on_done(added):
+            if added:
+                messagebox.showinfo("Success",f"Book {book_title} added successfully!")
+            else:
+                messagebox.showerror("Error",f"Failed to add book {book_title}.")
+
+        self.tasks.submit(self.inventory.add_book, new_book, on_done=on_done,
+                          on_error=self.show_task_error("Add Book"), description=f"Adding '{book_title}'")
 
     # Method for remove book:
     def remove_book(self):
@@ -229,10 +349,14 @@ class LibraryGUI:
             messagebox.showerror("Error", "Book's title is required!")
             return
 
-        if self.inventory.remove_book(book_title):
-            messagebox.showinfo("Success", f"Book {book_title} removed successfully!")
-        else:
-            messagebox.showinfo("Error", f"Book {book_title} not found in the inventory")
+        def on_done(removed):
+            if removed:
+                messagebox.showinfo("Success", f"Book {book_title} removed successfully!")
+            else:
+                messagebox.showinfo("Error", f"Book {book_title} not found in the inventory")
+
+        self.tasks.submit(self.inventory.remove_book, book_title, on_done=on_done,
+                          on_error=self.show_task_error("Remove Book"), description=f"Removing '{book_title}'")
 
     def search_book(self):
         """
@@ -245,41 +369,28 @@ class LibraryGUI:
             messagebox.showerror("Error", "Search term is required!")
             return
 
-        try:
-
-            available_books = {}
-            with open(get_csv_path("available_books.csv"), mode="r", encoding="utf-8") as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    title = row.get("Title", "Unknown Title")
-                    available = row.get("Available", "0")
-                    available_books[title] = int(available) if available.isdigit() else 0
-
-            all_terms = set(
-                book.title.lower() for book in self.inventory.books
-            ) | set(
-                book.author.lower() for book in self.inventory.books
-            ) | set(
-                book.category.lower() for book in self.inventory.books
-            )
+        self.tasks.submit(self.inventory.search_catalog, search_term,
+                          on_done=lambda found: self.show_search_results(search_term, *found),
+                          on_error=self.show_task_error("Search Book - GUI"),
+                          description=f"Searching '{search_term}'", cancellable=True)
 
-            if search_term.lower() not in all_terms:
-                self.inventory.log_action(
-                    "Search Book - GUI",
-                    success=False,
-                    details=f"Invalid search term '{search_term}' entered."
-                )
-                messagebox.showerror("Error", f"'{search_term}' is not recognized in the system.")
-                return
-
-            results = [
-                book for book in self.inventory.books
-                if search_term.lower() in book.title.lower() or
-                   search_term.lower() in book.author.lower() or
-                   search_term.lower() in book.category.lower()
-            ]
-
-            self.output_area.delete(1.0, tk.END)
+    def show_search_results(self, search_term, results, exact):
+        """
+        Display the results of search_book.
+        """
+        try:
+            header = "Search Results:\n"
+            if not exact:
+                # Not an exact title, author or category: offer the closest matches instead of rejecting the term
+                header = f"No exact match for '{search_term}'. Closest matches:\n"
+                if not results:
+                    self.inventory.log_action(
+                        "Search Book - GUI",
+                        success=False,
+                        details=f"Invalid search term '{search_term}' entered."
+                    )
+                    messagebox.showerror("Error", f"'{search_term}' is not recognized in the system.")
+                    return
 
             if not results:
                 self.inventory.log_action(
@@ -287,6 +398,7 @@ class LibraryGUI:
                     success=False,
                     details=f"No books found for search term '{search_term}'."
                 )
+                self.show_text()
                 self.output_area.insert(tk.END, "No books found matching the criteria.\n")
             else:
                 self.inventory.log_action(
@@ -294,39 +406,16 @@ class LibraryGUI:
                     success=True,
                     details=f"Found {len(results)} books for search term '{search_term}'."
                 )
-                self.output_area.insert(tk.END, "Search Results:\n")
-                self.output_area.insert(tk.END, "-" * 180 + "\n")
-                for book in results:
-                    title = f"Title: {book.title}"
-                    author = f"Author: {book.author}"
-                    genre = f"Genre: {book.category}"
-                    year = f"Year: {book.year}"
-                    total_copies = book.copies
-                    available_copies = available_books.get(book.title, 0)
-
-                    self.output_area.insert(tk.END, f"{title}\n")
-                    self.output_area.insert(tk.END, f"{author}\n")
-                    self.output_area.insert(tk.END, f"{genre}\n")
-                    self.output_area.insert(tk.END, f"{year}\n")
-                    self.output_area.insert(
-                        tk.END,
-                        f"Available Copies: {available_copies}/{total_copies}\n"
-                    )
-                    self.output_area.insert(tk.END, "-" * 180 + "\n\n")
+                self.show_listing(header)
+                self.book_table.show(results)
 
-        except FileNotFoundError:
-            self.inventory.log_action(
-                "Search Book - GUI",
-                success=False,
-                details="Error: available_books.csv file not found."
-            )
-            self.output_area.insert(tk.END, "Error: available_books.csv file not found.\n")
         except Exception as e:
             self.inventory.log_action(
                 "Search Book - GUI",
                 success=False,
                 details=f"Error loading books: {e}"
             )
+            self.show_text()
             self.output_area.insert(tk.END, f"Error loading books: {e}\n")
 
     def popular_books(self):
@@ -334,14 +423,21 @@ class LibraryGUI:
         Display the most popular books based on the number of borrowed copies.
         """
         top_n = 10  # Number of popular books to display
-        popular_books = self.inventory.get_popular_books(top_n=top_n)
+        self.tasks.submit(self.inventory.get_popular_books, top_n=top_n,
+                          on_done=lambda popular_books: self.show_popular_books(top_n, popular_books),
+                          on_error=self.show_task_error("Popular Books"),
+                          description="Finding popular books", cancellable=True)
 
+    def show_popular_books(self, top_n, popular_books):
+        """
+        Display the results of popular_books.
+        """
         if not popular_books:
             messagebox.showinfo("Popular Books", "No popular books found.")
             return
 
         # Clear the output area and display the results
-        self.output_area.delete(1.0, tk.END)
+        self.show_text()
         self.output_area.insert(tk.END, f"Top {top_n} Popular Books:\n")
         self.output_area.insert(tk.END, "-" * 50 + "\n")
         for idx, (title, borrowed_count) in enumerate(popular_books, start=1):
@@ -354,40 +450,36 @@ class LibraryGUI:
     def display_books(self):
         """
         Display all books in the inventory with their updated available copies out of total copies.
+        The table keeps following the inventory: lends, returns and new books show up without reloading it.
         """
-        self.output_area.delete(1.0, tk.END)  # Clear the output area
+        def on_error(error):
+            self.show_text()
+            self.output_area.insert(tk.END, f"Error loading books: {error}\n")
 
-        try:
-            available_books = {}
-            with open(get_csv_path("available_books.csv"), mode="r", encoding="utf-8") as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    title = row.get("Title", "Unknown Title")
-                    available = row.get("Available", "0")
-                    available_books[title] = int(available) if available.isdigit() else 0
-
-            if not self.inventory.books:
-                self.output_area.insert(tk.END, "No books in the inventory.\n")
-            else:
-                self.output_area.insert(tk.END, "Books in the inventory:\n")
-                self.output_area.insert(tk.END, "-" * 180 + "\n")
-                for book in self.inventory.books:
-                    title = book.title
-                    author = book.author
-                    genre = book.category
-                    year = book.year
-                    total_copies = book.copies
-                    available_copies = available_books.get(title, 0)
-                    self.output_area.insert(
-                        tk.END,
-                        f"Title: {title}\nAuthor: {author}\nGenre: {genre}\nYear: {year}\n"
-                        f"Available Copies: {available_copies}/{total_copies}\n"
-                    )
-                    self.output_area.insert(tk.END, "-" * 180 + "\n\n")
-        except FileNotFoundError:
-            self.output_area.insert(tk.END, "Error: available_books.csv file not found.\n")
-        except Exception as e:
-            self.output_area.insert(tk.END, f"Error loading books: {e}\n")
+        self.tasks.submit(self.snapshot_books, on_done=self.show_books, on_error=on_error, on_progress=self.show_progress,
+                          description="Loading books", cancellable=True, with_task=True)
+
+    def snapshot_books(self, task):
+        """
+        Copy the catalog on a worker thread, reporting progress and stopping if the task is cancelled.
+        """
+        def on_chunk(copied, total):
+            task.report(copied, total)
+            task.check_cancelled()
+
+        task.check_cancelled()
+        return self.inventory.snapshot_books(SNAPSHOT_CHUNK, on_chunk=on_chunk)
+
+    def show_books(self, books):
+        """
+        Display the catalog copied by snapshot_books.
+        """
+        if not books:
+            self.show_text()
+            self.output_area.insert(tk.END, "No books in the inventory.\n")
+        else:
+            self.show_listing(f"Books in the inventory: {len(books)}")
+            self.book_table.show(books, whole_catalog=True)
 
     def register(self):
         new_username = simpledialog.askstring("Register", "Enter a new username:")
@@ -398,14 +490,19 @@ class LibraryGUI:
             messagebox.showerror("Error", "Username and password cannot be empty.")
             return
 
-        if self.user_manager.add_user(new_username, new_password):
-            self.inventory.log_action("User Registration", success=True,
-                                      details=f"User '{new_username}' registered successfully.")
-            messagebox.showinfo("Success", "User registered successfully!")
-        else:
-            self.inventory.log_action("User Registration", success=False,
-                                      details=f"Failed to register '{new_username}'. Username already exists.")
-            messagebox.showerror("Error", "Username already exists.")
+        def on_done(added):
+            if added:
+                self.inventory.log_action("User Registration", success=True,
+                                          details=f"User '{new_username}' registered successfully.")
+                messagebox.showinfo("Success", "User registered successfully!")
+            else:
+                self.inventory.log_action("User Registration", success=False,
+                                          details=f"Failed to register '{new_username}'. Username already exists.")
+                messagebox.showerror("Error", "Username already exists.")
+
+        # Hashing the password is deliberately slow
+        self.tasks.submit(self.user_manager.add_user, new_username, new_password, on_done=on_done,
+                          on_error=self.show_task_error("User Registration"), description=f"Registering '{new_username}'")
 
     # Method for lend book:
     def lend_book(self):
@@ -417,8 +514,14 @@ class LibraryGUI:
             messagebox.showerror("Error", "Book title is required.")
             return
 
-        result = self.inventory.lend_book(book_title, username="example_user")
+        self.tasks.submit(self.inventory.lend_book, book_title, username="example_user",
+                          on_done=lambda result: self.lend_finished(book_title, result),
+                          on_error=self.show_task_error("Lend Book"), description=f"Lending '{book_title}'")
 
+    def lend_finished(self, book_title, result):
+        """
+        Report the outcome of lend_book, offering the waitlist when no copy is available.
+        """
         if result is None:
             messagebox.showerror("Error", f"Book '{book_title}' not found in the inventory.")
             return
@@ -437,8 +540,11 @@ class LibraryGUI:
                     messagebox.showerror("Error", "All fields are required to join the waitlist.")
                     return
 
-                self.inventory.add_to_waitlist(book_title, username, email, phone)
-                messagebox.showinfo("Waitlist", f"You have been added to the waitlist for '{book_title}'.")
+                self.tasks.submit(self.inventory.add_to_waitlist, book_title, username, email, phone,
+                                  on_done=lambda _: messagebox.showinfo(
+                                      "Waitlist", f"You have been added to the waitlist for '{book_title}'."),
+                                  on_error=self.show_task_error("Add to Waitlist"),
+                                  description=f"Adding {username} to the waitlist")
 
     # Method for return book:
     def return_book(self):
@@ -450,14 +556,19 @@ class LibraryGUI:
             messagebox.showerror("Error", "Book title is required.")
             return
 
-        result = self.inventory.return_book(book_title)
+        self.tasks.submit(self.inventory.return_book_with_next_user, book_title,
+                          on_done=lambda outcome: self.return_finished(book_title, *outcome),
+                          on_error=self.show_task_error("Return Book"), description=f"Returning '{book_title}'")
 
+    def return_finished(self, book_title, result, last_lent_user):
+        """
+        Report the outcome of return_book, including the waitlisted user the copy went to.
+        """
         if result == "all_copies_available":
             messagebox.showinfo("Info", f"All copies of '{book_title}' are already available in the library.")
         elif result == True:
             messagebox.showinfo("Success", f"Book '{book_title}' returned successfully!")
 
-            last_lent_user = self.inventory.returned_last_user
             if last_lent_user:
                 messagebox.showinfo(
                     "Waitlist Notification",
@@ -470,9 +581,12 @@ class LibraryGUI:
     # Method for start the GUI:
     def run(self):
         self.root.mainloop()
+        self.tasks.shutdown()  # Let the running actions finish before closing the inventory
+        self.inventory.close()  # Flush the buffered log and journal on shutdown
 
 if __name__ == "__main__":
     inventory = Inventory()
     user_manager=UserManager()
+    user_manager.start_background_hashing()  # Hash legacy passwords without delaying the GUI
     gui = LibraryGUI(inventory,user_manager)
     gui.run()
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""
+Synchronization primitives used by Inventory to serve many threads at once.
+
+Operations on a single title (lend, return, waitlist) take the catalog lock in shared mode
+plus the stripe lock of their title, so operations on different titles run side by side.
+Operations that change the catalog itself (adding, removing or updating books) take the
+catalog lock in exclusive mode.
+"""
+import contextlib
+import threading
+
+
+class ReadWriteLock:
+    """
+    Writer-preferring reader-writer lock.
+    Both modes are reentrant, and the thread holding the write lock may also take the read lock;
+    upgrading a read lock to a write lock is not allowed, since two upgrading readers would deadlock.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = {}  # thread id -> read depth
+        self._writer = None  # thread id of the writer
+        self._writer_depth = 0
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer != me and me not in self._readers:
+                # New readers wait behind waiting writers so writers are not starved
+                while self._writer is not None or self._waiting_writers:
+                    self._condition.wait()
+            self._readers[me] = self._readers.get(me, 0) + 1
+
+    def release_read(self):
+        me = threading.get_ident()
+        with self._condition:
+            depth = self._readers[me] - 1
+            if depth:
+                self._readers[me] = depth
+            else:
+                del self._readers[me]
+                if not self._readers:
+                    self._condition.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if me in self._readers:
+                raise RuntimeError("Cannot upgrade a read lock to a write lock.")
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self):
+        with self._condition:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def read(self):
+        """
+        Hold the lock in shared mode for the duration of a with block.
+        """
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextlib.contextmanager
+    def write(self):
+        """
+        Hold the lock in exclusive mode for the duration of a with block.
+        """
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class StripedLock:
+    """
+    Fixed pool of reentrant locks shared by keys with the same hash stripe,
+    so locking a key costs no allocation and the number of locks stays bounded.
+    """
+
+    def __init__(self, stripes=64):
+        self._locks = [threading.RLock() for _ in range(stripes)]
+
+    def lock_for(self, key):
+        """
+        Get the lock guarding a key.
+        """
+        return self._locks[hash(key) % len(self._locks)]
@@ -0,0 +1,307 @@
+"""
+Read-only, memory-mapped view of a large books.csv.
+
+Loading the catalog through pandas or csv.DictReader materializes every row before the first
+lookup. MappedCatalog instead maps books.csv into memory and keeps a sidecar index next to it
+(books.csv.idx): the 64-bit hash of every normalized title with the byte offset of its row,
+sorted by hash. The index is built by one scan the first time and is itself memory-mapped
+afterwards, so opening the catalog costs a stat and two mmap calls whatever its size, and a
+lookup is a binary search plus the parsing of the matching rows. Book objects are only created
+for the rows that are accessed; the operating system pages in just the parts of the files that
+are read, so the resident memory follows the working set rather than the catalog.
+
+The index records the size and modification time of books.csv and is rebuilt when they change.
+The catalog never writes books.csv: availability, lends and edits stay with Inventory.
+Rows sharing the exact same title are merged like UpdateFiles.load_books does (details of the
+first row, copies summed); titles differing only in case stay separate books, and a lookup
+returns the first of them in the file, like Inventory.find_book.
+"""
+import bisect
+import csv
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from book import Book
+from utils import atomic_write, get_csv_path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b"LIBIDX1" + (b"L" if sys.byteorder == "little" else b"B")  # The arrays are stored in native order
+HEADER = struct.Struct("<8sQqQQ")  # Magic, size and mtime of books.csv, number of rows, number of titles
+COLUMNS = ("title", "author", "is_loaned", "copies", "genre", "year")
+
+
+def title_hash(title):
+    """
+    Stable 64-bit hash of a normalized title (Python's hash() changes between runs).
+    """
+    return int.from_bytes(hashlib.blake2b(str(title).lower().encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class MappedCatalog:
+    """
+    Read-only catalog backed by a memory-mapped books.csv and its offset index.
+    """
+
+    def __init__(self, path=None, index_path=None):
+        """
+        :param path: The books.csv to map (defaults to csv_files/books.csv).
+        :param index_path: The sidecar index (defaults to <path>.idx). It is (re)built when it is
+                           missing or out of date; if it cannot be written it is kept in memory.
+        """
+        self.path = path or get_csv_path("books.csv")
+        self.index_path = index_path or f"{self.path}.idx"
+        self._file = open(self.path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._columns, self._start = self._read_header()
+        self._index_file = self._index_map = None
+        self._load_index()
+
+    # Context manager
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self):
+        """
+        Unmap the files.
+        """
+        for view in (getattr(self, "_hashes", None), getattr(self, "_offsets", None)):
+            if isinstance(view, memoryview):
+                view.release()
+        self._hashes = self._offsets = array("Q")
+        for resource in (self._index_map, self._index_file, self._data, self._file):
+            if resource is not None and hasattr(resource, "close"):
+                resource.close()
+        self._index_map = self._index_file = None
+
+    # Records
+    def _read_header(self):
+        """
+        :return: (column name -> position, offset of the first row).
+        """
+        data = self._data
+        start = 3 if data[:3] == b"\xef\xbb\xbf" else 0
+        end = data.find(b"\n", start)
+        end = len(data) if end == -1 else end
+        header = next(csv.reader([data[start:end].decode("utf-8").rstrip("\r")]), [])
+        if not header:  # Empty file
+            return {name: position for position, name in enumerate(COLUMNS)}, len(data)
+        columns = {name.strip(): position for position, name in enumerate(header)}
+        missing = [name for name in COLUMNS if name not in columns]
+        if missing:
+            raise ValueError(f"{self.path} has no {', '.join(missing)} column")
+        return columns, min(end + 1, len(data))
+
+    def _row_end(self, start):
+        """
+        :return: Offset of the newline ending the row that starts at start (quoted fields may span lines).
+        """
+        data, size = self._data, len(self._data)
+        end = data.find(b"\n", start)
+        end = size if end == -1 else end
+        quotes = data[start:end].count(b'"')
+        while quotes % 2 and end < size:  # Inside a quoted field
+            next_end = data.find(b"\n", end + 1)
+            next_end = size if next_end == -1 else next_end
+            quotes += data[end:next_end].count(b'"')
+            end = next_end
+        return end
+
+    def _records(self):
+        """
+        Scan the rows in file order.
+        :return: Iterator of (offset, raw row bytes).
+        """
+        position = self._start
+        while position < len(self._data):
+            end = self._row_end(position)
+            row = self._data[position:end]
+            if row.strip():
+                yield position, row
+            position = end + 1
+
+    def _record_at(self, offset):
+        return self._data[offset:self._row_end(offset)]
+
+    def _fields(self, row):
+        return next(csv.reader([row.decode("utf-8").rstrip("\r")]))
+
+    def _title_of(self, row):
+        position = self._columns["title"]
+        if b'"' not in row:
+            fields = row.rstrip(b"\r").split(b",")
+            return fields[position].decode("utf-8") if position < len(fields) else ""
+        fields = self._fields(row)
+        return fields[position] if position < len(fields) else ""
+
+    def _book(self, fields):
+        column = self._columns
+        return Book(fields[column["title"]], fields[column["author"]], int(fields[column["copies"]]),
+                    fields[column["genre"]], int(float(fields[column["year"]])),
+                    fields[column["is_loaned"]] == "Yes")
+
+    # Index
+    def _load_index(self):
+        stat = os.stat(self.path)
+        try:
+            self._index_file = open(self.index_path, "rb")
+            self._index_map = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, size, mtime, rows, titles = HEADER.unpack_from(self._index_map)
+            if (magic, size, mtime) != (MAGIC, stat.st_size, stat.st_mtime_ns) or \
+                    len(self._index_map) != HEADER.size + 16 * rows:
+                raise ValueError("stale index")
+            entries = memoryview(self._index_map)[HEADER.size:].cast("Q")
+            self._hashes, self._offsets = entries[:rows], entries[rows:]
+            entries.release()
+            self._titles = titles
+            return
+        except (OSError, ValueError, struct.error):
+            if self._index_map is not None:
+                self._index_map.close()
+            if self._index_file is not None:
+                self._index_file.close()
+            self._index_file = self._index_map = None
+
+        hashes, offsets = self._build_index()
+        titles = self._count_titles(hashes, offsets)
+        try:
+            with atomic_write(self.index_path, binary=True) as file:
+                file.write(HEADER.pack(MAGIC, stat.st_size, stat.st_mtime_ns, len(hashes), titles))
+                hashes.tofile(file)
+                offsets.tofile(file)
+        except OSError as e:
+            print(f"WARNING: Could not save the catalog index {self.index_path}: {e}")
+        self._hashes, self._offsets, self._titles = hashes, offsets, titles
+
+    def _build_index(self):
+        """
+        Scan books.csv once.
+        :return: (hashes, offsets) arrays sorted by hash, then offset.
+        """
+        hashes, offsets = array("Q"), array("Q")
+        for offset, row in self._records():
+            hashes.append(title_hash(self._title_of(row)))
+            offsets.append(offset)
+        if np is not None:
+            order = np.lexsort((np.frombuffer(offsets, dtype=np.uint64), np.frombuffer(hashes, dtype=np.uint64)))
+            return (array("Q", np.frombuffer(hashes, dtype=np.uint64)[order].tobytes()),
+                    array("Q", np.frombuffer(offsets, dtype=np.uint64)[order].tobytes()))
+        order = sorted(range(len(hashes)), key=lambda row: (hashes[row], offsets[row]))
+        return array("Q", (hashes[row] for row in order)), array("Q", (offsets[row] for row in order))
+
+    def _count_titles(self, hashes, offsets):
+        """
+        Count the distinct exact titles: one per hash, except in the rare groups of rows sharing a hash.
+        """
+        titles, position = 0, 0
+        while position < len(hashes):
+            end = position + 1
+            while end < len(hashes) and hashes[end] == hashes[position]:
+                end += 1
+            if end - position == 1:
+                titles += 1
+            else:
+                titles += len({self._title_of(self._record_at(offsets[row])) for row in range(position, end)})
+            position = end
+        return titles
+
+    def _rows_of(self, title):
+        """
+        :return: The (offset, parsed row) pairs whose title matches case-insensitively, in file order.
+        """
+        key = str(title).lower()
+        digest = title_hash(key)
+        position = bisect.bisect_left(self._hashes, digest)
+        rows = []
+        while position < len(self._hashes) and self._hashes[position] == digest:
+            offset = self._offsets[position]
+            fields = self._fields(self._record_at(offset))
+            if fields[self._columns["title"]].lower() == key:  # Not a hash collision
+                rows.append((offset, fields))
+            position += 1
+        return rows
+
+    def _titled(self, rows, title):
+        """
+        :return: The rows of exactly this title, as load_books groups them.
+        """
+        return [(offset, fields) for offset, fields in rows if fields[self._columns["title"]] == title]
+
+    def _merge(self, rows):
+        book = self._book(rows[0][1])
+        book.copies += sum(int(fields[self._columns["copies"]]) for _, fields in rows[1:])
+        return book
+
+    # Queries
+    def __len__(self):
+        """
+        :return: Number of distinct titles.
+        """
+        return self._titles
+
+    def __contains__(self, title):
+        return bool(self._rows_of(title))
+
+    def find_book(self, title):
+        """
+        Find a book by title (case-insensitive). Like Inventory.find_book, titles differing only in
+        case are separate books and the first one in the file is returned.
+        :return: A new Book parsed from the file, or None.
+        """
+        rows = self._rows_of(title)
+        if not rows:
+            return None
+        return self._merge(self._titled(rows, rows[0][1][self._columns["title"]]))
+
+    def __iter__(self):
+        """
+        Iterate over the books in file order, parsing them one at a time.
+        """
+        title_column = self._columns["title"]
+        for offset, row in self._records():
+            fields = self._fields(row)
+            title = fields[title_column]
+            digest = title_hash(title)
+            position = bisect.bisect_left(self._hashes, digest) + 1
+            if position < len(self._hashes) and self._hashes[position] == digest:
+                # Several rows share the hash: the first row of the title yields the merged book
+                rows = self._titled(self._rows_of(title), title)
+                if rows[0][0] == offset:
+                    yield self._merge(rows)
+            else:
+                yield self._book(fields)
+
+    def search(self, field, query):
+        """
+        Find the books whose field contains the query (case-insensitive), in file order.
+        Same interface as SearchIndex.search, so a catalog can be passed as the index of a SearchStrategy.
+        :param field: One of "title", "author" or "category".
+        :param query: The substring to look for.
+        :return: List of matching books.
+        """
+        column = self._columns["genre" if field == "category" else field]
+        query = str(query).lower()
+        needle = query.encode("utf-8") if query.isascii() else None
+        books, seen = [], set()
+        for offset, row in self._records():
+            if needle is not None and needle not in row.lower():
+                continue  # Cheap byte test before decoding the row
+            fields = self._fields(row)
+            if query not in fields[column].lower():
+                continue
+            title = fields[self._columns["title"]]
+            if title not in seen:
+                seen.add(title)
+                books.append(self._merge(self._titled(self._rows_of(title), title)))
+        return books
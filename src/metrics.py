@@ -0,0 +1,237 @@
+"""
+Per-operation counters and latency histograms for the library.
+
+instrument() wraps the listed methods of a class (Inventory, UserManager, ...). Every call of
+an instrumented method counts as an operation: its calls, errors and total latency are recorded.
+A method can also stand for a phase (lookup, csv_read, csv_write, log_write, notify): when it
+runs inside another operation, its time is added to that operation's histogram for the phase,
+so "lend_book" shows how long it spent finding the book, writing files, logging and notifying
+the observers. Nested phases are attributed to the outermost one only, so a phase that calls
+another (sync_to_files -> save_availability) is not counted twice. csv_write covers the
+persistence writes of whichever backend is in use (CSV files, the journal or SQLite).
+
+Metrics are disabled unless LIBRARY_METRICS=1 is set or get_metrics().enable() is called;
+an instrumented call then only costs one flag check. Read them with snapshot() or
+prometheus_text() (also served on GET /metrics by http_server.py).
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+
+PHASES = ("lookup", "csv_read", "csv_write", "log_write", "notify")
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)  # Upper bounds in seconds
+
+
+class Histogram:
+    """
+    Cumulative-style latency histogram with fixed buckets (the last slot counts everything above BUCKETS[-1]).
+    """
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def to_dict(self):
+        cumulative, buckets = 0, {}
+        for bound, count in zip(BUCKETS + (float("inf"),), self.counts):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else repr(bound)] = cumulative
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of the operation counters and histograms.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls = {}  # Operation -> number of calls
+        self._errors = {}  # Operation -> number of calls that raised
+        self._histograms = {}  # (operation, phase) -> Histogram; phase "total" is the whole call
+        self._local = threading.local()  # Per-thread stack of running operations and the active phase
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._calls.clear()
+            self._errors.clear()
+            self._histograms.clear()
+
+    def _observe(self, operation, phase, seconds):
+        histogram = self._histograms.get((operation, phase))
+        if histogram is None:
+            histogram = self._histograms[(operation, phase)] = Histogram()
+        histogram.observe(seconds)
+
+    def record(self, operation, seconds, failed=False):
+        """
+        Record one call of an operation.
+        """
+        with self._lock:
+            self._calls[operation] = self._calls.get(operation, 0) + 1
+            if failed:
+                self._errors[operation] = self._errors.get(operation, 0) + 1
+            self._observe(operation, "total", seconds)
+
+    def record_phase(self, operation, phase, seconds):
+        """
+        Add time spent in a phase to an operation.
+        """
+        with self._lock:
+            self._observe(operation, phase, seconds)
+
+    def call(self, operation, phase, func, args, kwargs):
+        """
+        Run func as an instrumented operation (see instrument).
+        """
+        local = self._local
+        stack = getattr(local, "stack", None)
+        if stack is None:
+            stack = local.stack = []
+            local.phase = None
+        parent = stack[-1] if stack else None
+        owns_phase = phase is not None and parent is not None and local.phase is None
+        if owns_phase:
+            local.phase = phase
+        stack.append(operation)
+        failed = False
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            if owns_phase:
+                local.phase = None
+                self.record_phase(parent, phase, elapsed)
+            self.record(operation, elapsed, failed)
+
+    def phase(self, name):
+        """
+        Context manager attributing the time of a block to a phase of the running operation.
+        """
+        return _Phase(self, name)
+
+    def snapshot(self):
+        """
+        :return: {operation: {"calls", "errors", "phases": {phase: {"count", "sum", "buckets"}}}},
+                 the phase "total" being the whole call.
+        """
+        with self._lock:
+            result = {operation: {"calls": calls, "errors": self._errors.get(operation, 0), "phases": {}}
+                      for operation, calls in self._calls.items()}
+            for (operation, phase), histogram in self._histograms.items():
+                result.setdefault(operation, {"calls": 0, "errors": 0, "phases": {}})["phases"][phase] = histogram.to_dict()
+        return result
+
+    def prometheus_text(self):
+        """
+        :return: The metrics in the Prometheus text exposition format.
+        """
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP library_operation_calls_total Calls of each library operation.",
+            "# TYPE library_operation_calls_total counter",
+        ]
+        lines += [f'library_operation_calls_total{{operation="{operation}"}} {data["calls"]}'
+                  for operation, data in sorted(snapshot.items())]
+        lines += [
+            "# HELP library_operation_errors_total Calls of each library operation that raised an exception.",
+            "# TYPE library_operation_errors_total counter",
+        ]
+        lines += [f'library_operation_errors_total{{operation="{operation}"}} {data["errors"]}'
+                  for operation, data in sorted(snapshot.items())]
+        lines += [
+            "# HELP library_operation_seconds Latency of each library operation, in total and per phase.",
+            "# TYPE library_operation_seconds histogram",
+        ]
+        for operation, data in sorted(snapshot.items()):
+            for phase, histogram in sorted(data["phases"].items()):
+                labels = f'operation="{operation}",phase="{phase}"'
+                lines += [f'library_operation_seconds_bucket{{{labels},le="{bound}"}} {count}'
+                          for bound, count in histogram["buckets"].items()]
+                lines.append(f"library_operation_seconds_sum{{{labels}}} {histogram['sum']}")
+                lines.append(f"library_operation_seconds_count{{{labels}}} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+class _Phase:
+    __slots__ = ("registry", "name", "parent", "start")
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+        self.parent = None
+
+    def __enter__(self):
+        if not self.registry.enabled:
+            return self
+        local = self.registry._local
+        if getattr(local, "stack", None) and local.phase is None:
+            self.parent = local.stack[-1]
+            local.phase = self.name
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.parent is not None:
+            self.registry._local.phase = None
+            self.registry.record_phase(self.parent, self.name, time.perf_counter() - self.start)
+            self.parent = None
+        return False
+
+
+def instrument(cls, operations, registry=None):
+    """
+    Wrap methods of a class so that their calls are recorded as operations.
+    :param cls: The class to instrument.
+    :param operations: Dictionary of method name -> phase it stands for inside other operations (or None).
+    :param registry: MetricsRegistry to record into (defaults to the process-wide one).
+    :return: The class.
+    """
+    registry = registry or get_metrics()
+    for name, phase in operations.items():
+        method = cls.__dict__[name]
+        static = isinstance(method, staticmethod)
+        func = method.__func__ if static else method
+        wrapper = _wrap(registry, f"{cls.__name__}.{name}", phase, func)
+        setattr(cls, name, staticmethod(wrapper) if static else wrapper)
+    return cls
+
+
+def _wrap(registry, operation, phase, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not registry.enabled:
+            return func(*args, **kwargs)
+        return registry.call(operation, phase, func, args, kwargs)
+    return wrapper
+
+
+_default_registry = MetricsRegistry(enabled=os.environ.get("LIBRARY_METRICS") == "1")
+
+
+def get_metrics():
+    """
+    Get the process-wide MetricsRegistry.
+    """
+    return _default_registry
@@ -4,8 +4,9 @@ class Observer:
     @author Noa Agassi
     The Observer interface declares the update method, which is called when the Subject changes state.
     """
-    def update(self, subject):
+    def update(self, subject, event=None):
         """
         Receive update from subject.
+        :param event: ChangeEvent telling which titles changed and how.
         """
         pass
\ No newline at end of file
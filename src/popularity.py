@@ -0,0 +1,115 @@
+"""
+Incrementally maintained popularity of the books.
+
+The tracker mirrors the borrow count of every book that has copies out on loan, so a
+top-N query only looks at the books currently borrowed (O(m log N) with heapq.nlargest,
+m being the number of borrowed titles) instead of recomputing and sorting the whole
+catalog. Lends are also counted in one bucket per day, which answers "most borrowed in
+the last 7/30 days" by adding up at most retention_days small counters. Daily buckets are
+kept in memory only, so windowed popularity covers the lends seen since startup.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class PopularityTracker:
+    """
+    Leaderboard of borrowed copies plus time-bucketed lend counters.
+    Books are tracked by identity, so renaming a book keeps its history.
+    """
+
+    def __init__(self, retention_days=30, clock=time.time):
+        """
+        :param retention_days: Number of daily buckets kept for windowed queries.
+        :param clock: Function returning the current time in seconds (replaceable in tests).
+        """
+        self.retention_days = retention_days
+        self.clock = clock
+        self._lock = threading.RLock()  # Lends of different titles update the tracker concurrently
+        self._borrowed = {}  # book -> borrow count, only for books with copies on loan
+        self._sequence = {}  # book -> catalog position, to break ties in catalog order
+        self._positions = itertools.count()  # Never reused, so books added after a removal sort last
+        self._daily = {}  # day number -> {book: lends that day}
+
+    def _day(self, when=None):
+        return int((self.clock() if when is None else when) // SECONDS_PER_DAY)
+
+    def rebuild(self, books):
+        """
+        Reset the leaderboard from the current borrow counts of the catalog.
+        """
+        with self._lock:
+            self._borrowed = {}
+            self._sequence = {}
+            self._positions = itertools.count()
+            for book in books:
+                self.update(book)
+
+    def update(self, book):
+        """
+        Refresh the entry of a book after its borrow count changed.
+        """
+        with self._lock:
+            if book not in self._sequence:
+                self._sequence[book] = next(self._positions)
+            if book.borrow_count > 0:
+                self._borrowed[book] = book.borrow_count
+            else:
+                self._borrowed.pop(book, None)
+
+    def discard(self, book):
+        """
+        Forget a book that left the catalog.
+        """
+        with self._lock:
+            self._borrowed.pop(book, None)
+            self._sequence.pop(book, None)
+            for counts in self._daily.values():
+                counts.pop(book, None)
+
+    def record_lend(self, book, when=None):
+        """
+        Count one lend of a book in the bucket of the day it happened and refresh its entry.
+        :param when: Time of the lend in seconds (defaults to now).
+        """
+        with self._lock:
+            self.update(book)
+            day = self._day(when)
+            counts = self._daily.setdefault(day, {})
+            counts[book] = counts.get(book, 0) + 1
+            self._prune(self._day())
+
+    def _prune(self, today):
+        for day in [day for day in self._daily if day <= today - self.retention_days]:
+            del self._daily[day]
+
+    def _largest(self, counts, n):
+        return heapq.nlargest(n, counts.items(), key=lambda item: (item[1], -self._sequence.get(item[0], 0)))
+
+    def top(self, n=10):
+        """
+        Get the n books with the most copies currently on loan.
+        :return: List of (book, borrowed copies), most borrowed first.
+        """
+        with self._lock:
+            return self._largest(self._borrowed, n)
+
+    def top_in_window(self, n=10, days=7):
+        """
+        Get the n books lent most often in the last `days` days (today included).
+        :return: List of (book, number of lends), most lent first.
+        """
+        if days > self.retention_days:
+            raise ValueError(f"Only the last {self.retention_days} days are tracked.")
+        today = self._day()
+        totals = {}
+        with self._lock:
+            for day, counts in self._daily.items():
+                if today - days < day <= today:
+                    for book, count in counts.items():
+                        totals[book] = totals.get(book, 0) + count
+            return self._largest(totals, n)
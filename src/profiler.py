@@ -0,0 +1,152 @@
+"""
+Profiling mode for slow inventory operations.
+
+A slow call usually cannot be reproduced later, so in profiling mode every profiled operation
+runs under cProfile while tracemalloc traces allocations. Calls faster than the threshold
+throw their profile away; slower ones are dumped for offline analysis:
+    <stamp>-<operation>.prof         cProfile stats (python -m pstats, snakeviz, ...)
+    <stamp>-<operation>.tracemalloc  tracemalloc snapshot (tracemalloc.Snapshot.load)
+    <stamp>-<operation>.txt          summary: duration, top functions, memory allocated by the call
+                                     and top allocations since the previous capture
+Only the newest max_dumps captures are kept in the directory.
+
+Enable it with Inventory(profile=True) or the LIBRARY_PROFILE=1 environment variable.
+LIBRARY_PROFILE_THRESHOLD_MS (default 500) and LIBRARY_PROFILE_DIR (default "profiles")
+configure the threshold and the directory. Profiling slows every operation down noticeably;
+it is meant for hunting a problem, not for normal use.
+
+The memory figures of a call (net growth and peak above its start) come from tracemalloc's
+process-wide counters, so calls running on other threads at the same time are included.
+"""
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+DEFAULT_THRESHOLD_MS = 500
+DEFAULT_DIRECTORY = "profiles"
+
+
+def profiling_requested():
+    """
+    :return: True if the LIBRARY_PROFILE environment variable turns profiling mode on.
+    """
+    return os.environ.get("LIBRARY_PROFILE", "").lower() in ("1", "true", "yes", "on")
+
+
+class SlowCallProfiler:
+    """
+    Profiles operations and keeps the captures of the calls slower than the threshold.
+    """
+
+    def __init__(self, threshold=None, directory=None, max_dumps=20, trace_frames=10):
+        """
+        :param threshold: Duration in seconds above which a call is captured
+                          (defaults to $LIBRARY_PROFILE_THRESHOLD_MS, or 500 ms).
+        :param directory: Directory of the captures (defaults to $LIBRARY_PROFILE_DIR, or ./profiles).
+        :param max_dumps: Number of captures kept; the oldest are deleted.
+        :param trace_frames: Frames stored per allocation traceback by tracemalloc.
+        """
+        if threshold is None:
+            threshold = float(os.environ.get("LIBRARY_PROFILE_THRESHOLD_MS", DEFAULT_THRESHOLD_MS)) / 1000
+        self.threshold = threshold
+        self.directory = directory or os.environ.get("LIBRARY_PROFILE_DIR", DEFAULT_DIRECTORY)
+        self.max_dumps = max_dumps
+        self._local = threading.local()  # Set while a profiled call runs on the thread
+        self._lock = threading.Lock()  # Serializes dumps and rotation
+        self._sequence = itertools.count()
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start(trace_frames)
+        self._previous = tracemalloc.take_snapshot()  # Captures list the allocations made since this snapshot
+
+    def call(self, name, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs) as the operation `name`, capturing it if it is slow.
+        Operations called by a profiled operation are covered by its profile.
+        """
+        if getattr(self._local, "active", False):
+            return func(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            profile = None  # Another profiler is running (possible on Python 3.12+): only time the call
+        self._local.active = True
+        baseline = None
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+            self._local.active = False
+            if elapsed >= self.threshold:
+                self._dump(name, elapsed, profile, baseline)
+
+    def _dump(self, name, elapsed, profile, baseline=None):
+        """
+        :param baseline: Traced memory in bytes when the call started (None if tracing was off).
+        """
+        try:
+            tracing = baseline is not None and tracemalloc.is_tracing()
+            if tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                snapshot = tracemalloc.take_snapshot()
+            with self._lock:
+                os.makedirs(self.directory, exist_ok=True)
+                base = os.path.join(self.directory,
+                                    f"{time.strftime('%Y%m%d-%H%M%S')}-{next(self._sequence):04d}-{name}")
+                summary = [f"{name} took {elapsed * 1000:.1f} ms "
+                           f"(threshold {self.threshold * 1000:.0f} ms, thread {threading.current_thread().name})"]
+                if profile is not None:
+                    profile.dump_stats(base + ".prof")
+                    stream = io.StringIO()
+                    pstats.Stats(profile, stream=stream).sort_stats("cumulative").print_stats(25)
+                    summary.append(stream.getvalue())
+                if tracing:
+                    snapshot.dump(base + ".tracemalloc")
+                    summary.append(f"Memory: {(current - baseline) / 1024:+.1f} KiB net, "
+                                   f"peak {(peak - baseline) / 1024:.1f} KiB above the start of the call")
+                    summary.append("Top allocations since the previous capture:")
+                    summary += [str(stat) for stat in snapshot.compare_to(self._previous, "lineno")[:25]]
+                    self._previous = snapshot
+                with open(base + ".txt", "w", encoding="utf-8") as file:
+                    file.write("\n".join(summary) + "\n")
+                self._rotate()
+            print(f"WARNING: {name} took {elapsed * 1000:.0f} ms; profile saved to {base}.txt")
+        except Exception as e:
+            print(f"ERROR: Failed to save the profile of {name}: {e}")
+
+    def captures(self):
+        """
+        :return: Paths of the kept captures (without extension), oldest first.
+        """
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(os.path.join(self.directory, name[:-4]) for name in names if name.endswith(".txt"))
+
+    def _rotate(self):
+        captures = self.captures()
+        for base in captures[:max(0, len(captures) - self.max_dumps)]:
+            for extension in (".prof", ".tracemalloc", ".txt"):
+                if os.path.exists(base + extension):
+                    os.remove(base + extension)
+
+    def close(self):
+        """
+        Stop tracing allocations if this profiler started it.
+        """
+        if self._started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._started_tracing = False
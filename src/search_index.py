@@ -0,0 +1,219 @@
+"""
+Inverted index over the searchable fields of the books (title, author and category).
+
+Every distinct field value is indexed once, by its whitespace-separated tokens and by the
+character trigrams of the value padded with a space on each side, and points to the books
+that carry it. A substring query intersects the trigram postings of the query (or scans the
+much smaller token vocabulary for queries shorter than a trigram) and then verifies the
+candidates, so the cost of a search depends on the number of matching values rather than on
+the size of the catalog. The same trigram postings drive the typo-tolerant similarity search.
+The index is maintained incrementally by Inventory as books are added, updated and removed.
+"""
+import heapq
+
+
+def normalize(value):
+    """
+    Normalize a field value or query for case-insensitive matching.
+    """
+    return str(value).lower()
+
+
+def trigrams(text):
+    """
+    Return the set of character trigrams of a string.
+    """
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def padded_trigrams(text):
+    """
+    Return the trigrams of a string padded with a space on each side,
+    so that the beginning and end of the string weigh in when comparing similarity.
+    """
+    return trigrams(f" {text} ")
+
+
+class SearchIndex:
+    """
+    Incrementally maintained inverted index of tokens and trigrams.
+    """
+    FIELDS = ("title", "author", "category")
+
+    def __init__(self, books=()):
+        self._values = {field: {} for field in self.FIELDS}  # value -> {book: None}, an ordered set of books
+        self._tokens = {field: {} for field in self.FIELDS}  # token -> set of values
+        self._grams = {field: {} for field in self.FIELDS}  # padded trigram -> set of values
+        self._gram_counts = {field: {} for field in self.FIELDS}  # value -> number of its padded trigrams
+        self._indexed = {}  # book -> (sequence number, indexed values), so removals don't depend on the book's current fields
+        self._next_sequence = 0
+        for book in books:
+            self.add(book)
+
+    def __len__(self):
+        return len(self._indexed)
+
+    def __contains__(self, book):
+        return book in self._indexed
+
+    def add(self, book, sequence=None):
+        """
+        Index a book.
+        :param book: The Book object.
+        :param sequence: Position used to order results (defaults to after every indexed book).
+        """
+        if book in self._indexed:
+            return
+        if sequence is None:
+            sequence = self._next_sequence
+            self._next_sequence += 1
+        values = tuple(normalize(getattr(book, field)) for field in self.FIELDS)
+        self._indexed[book] = (sequence, values)
+
+        for field, value in zip(self.FIELDS, values):
+            postings = self._values[field].get(value)
+            if postings is None:
+                postings = self._values[field][value] = {}
+                self._add_value(field, value)
+            postings[book] = None
+
+    def remove(self, book):
+        """
+        Remove a book from the index.
+        """
+        entry = self._indexed.pop(book, None)
+        if entry is None:
+            return
+        for field, value in zip(self.FIELDS, entry[1]):
+            postings = self._values[field][value]
+            del postings[book]
+            if not postings:
+                del self._values[field][value]
+                self._remove_value(field, value)
+
+    def reindex(self, book):
+        """
+        Re-index a book after its fields changed, keeping its position in the results.
+        """
+        entry = self._indexed.get(book)
+        self.remove(book)
+        self.add(book, entry[0] if entry else None)
+
+    def _add_value(self, field, value):
+        for token in value.split():
+            self._tokens[field].setdefault(token, set()).add(value)
+        grams = padded_trigrams(value)
+        self._gram_counts[field][value] = len(grams)
+        for gram in grams:
+            self._grams[field].setdefault(gram, set()).add(value)
+
+    def _remove_value(self, field, value):
+        for token in value.split():
+            self._discard(self._tokens[field], token, value)
+        del self._gram_counts[field][value]
+        for gram in padded_trigrams(value):
+            self._discard(self._grams[field], gram, value)
+
+    @staticmethod
+    def _discard(postings, key, value):
+        values = postings.get(key)
+        if values is not None:
+            values.discard(value)
+            if not values:
+                del postings[key]
+
+    def _matching_values(self, field, query):
+        """
+        Find the distinct values of a field that contain the query as a substring.
+        """
+        if len(query) >= 3:
+            # Every trigram of the query must appear in a matching value (the padded grams are a superset)
+            posting_sets = sorted((self._grams[field].get(gram, set()) for gram in trigrams(query)), key=len)
+            candidates = set(posting_sets[0]).intersection(*posting_sets[1:])
+        elif not any(char.isspace() for char in query):
+            # A short query without whitespace lies inside a single token
+            candidates = set()
+            for token, values in self._tokens[field].items():
+                if query in token:
+                    candidates |= values
+        else:
+            candidates = self._values[field].keys()
+        return [value for value in candidates if query in value]
+
+    def _ordered(self, books):
+        return sorted(books, key=lambda book: self._indexed[book][0])
+
+    def search(self, field, query):
+        """
+        Find the books whose field contains the query (case-insensitive), in catalog order.
+        :param field: One of "title", "author" or "category".
+        :param query: The substring to look for.
+        :return: List of matching books.
+        """
+        return self.search_any(query, fields=(field,))
+
+    def search_any(self, query, fields=FIELDS):
+        """
+        Find the books where any of the given fields contains the query, in catalog order.
+        """
+        query = normalize(query)
+        if not query:
+            return self._ordered(self._indexed)
+        books = set()
+        for field in fields:
+            for value in self._matching_values(field, query):
+                books.update(self._values[field][value])
+        return self._ordered(books)
+
+    def lookup(self, field, value):
+        """
+        Find the books whose field equals the value (case-insensitive), in catalog order.
+        """
+        return self._ordered(self._values[field].get(normalize(value), ()))
+
+    def has_value(self, value, fields=FIELDS):
+        """
+        Check whether any book has exactly this value (case-insensitive) in one of the fields.
+        """
+        value = normalize(value)
+        return any(value in self._values[field] for field in fields)
+
+    def similar(self, query, fields=FIELDS, top_k=10, min_score=0.4):
+        """
+        Rank the books by trigram similarity between the query and their field values.
+        The score is the share of the query's trigrams found in the value, so a misspelled
+        word still matches a longer title; ties are broken by the Jaccard similarity of the
+        whole value, which prefers the closest values. Only values sharing at least one
+        trigram with the query are scored, so the work depends on the posting lists of the
+        query's trigrams, not on the catalog size.
+
+        :param query: The (possibly misspelled) search term.
+        :param fields: Fields to compare against.
+        :param top_k: Maximum number of results.
+        :param min_score: Minimum score (0..1) for a book to be returned.
+        :return: List of (book, score) tuples, best match first.
+        """
+        query_grams = padded_trigrams(normalize(query).strip())
+        if not query_grams:
+            return []
+
+        book_scores = {}  # book -> (score, jaccard)
+        for field in fields:
+            gram_counts = self._gram_counts[field]
+            shared_counts = {}
+            for gram in query_grams:
+                for value in self._grams[field].get(gram, ()):
+                    shared_counts[value] = shared_counts.get(value, 0) + 1
+
+            for value, shared in shared_counts.items():
+                score = shared / len(query_grams)
+                if score < min_score:
+                    continue
+                rank = (score, shared / (len(query_grams) + gram_counts[value] - shared))
+                for book in self._values[field][value]:
+                    if rank > book_scores.get(book, (0, 0)):
+                        book_scores[book] = rank
+
+        best = heapq.nsmallest(top_k, book_scores.items(),
+                               key=lambda item: (-item[1][0], -item[1][1], self._indexed[item[0]][0]))
+        return [(book, rank[0]) for book, rank in best]
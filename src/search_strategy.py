@@ -1,5 +1,6 @@
 
 from abc import ABC ,abstractmethod
+from search_index import SearchIndex
 
 #Basic class for search strategy:
 class SearchStrategy(ABC):
@@ -7,9 +8,10 @@ class SearchStrategy(ABC):
     Abstract base class for search strategies
     """""
     @abstractmethod
-    def search(self,books,value):
+    def search(self,books,value,index=None):
         """""
         Abstract method for searching books
+        When a SearchIndex is given it is queried instead of scanning the books
         Return list of matching books
         """""
         pass
@@ -19,7 +21,9 @@ class SearchByTitle(SearchStrategy):
     """""
     Search strategy to find books by title
     """""
-    def search(self,books,value):
+    def search(self,books,value,index=None):
+        if index is not None:
+            return index.search("title",value)
         return [book for book in books if value.lower() in book.title.lower()]
 
 #Search by author:
@@ -27,7 +31,9 @@ class SearchByAuthor(SearchStrategy):
     """""
     Search strategy to find books by author
     """""
-    def search(self,books,value):
+    def search(self,books,value,index=None):
+        if index is not None:
+            return index.search("author",value)
         return [book for book in books if value.lower() in book.author.lower()]
 
 #Search by title:
@@ -35,9 +41,27 @@ class SearchByCategory(SearchStrategy):
     """""
     Search strategy to find books by category
     """""
-    def search(self,books,value):
+    def search(self,books,value,index=None):
+        if index is not None:
+            return index.search("category",value)
         return [book for book in books if value.lower() in book.category.lower()]
 
+#Typo-tolerant search:
+class FuzzySearch(SearchStrategy):
+    """""
+    Search strategy that tolerates typos by ranking books on trigram similarity
+    over title, author and category. Returns up to top_k books, best match first
+    """""
+    def __init__(self,top_k=10,min_score=0.4,fields=SearchIndex.FIELDS):
+        self.top_k=top_k
+        self.min_score=min_score
+        self.fields=fields
+
+    def search(self,books,value,index=None):
+        if index is None:
+            index=SearchIndex(books)  #Without a prebuilt index, build one for this query
+        return [book for book,score in index.similar(value,self.fields,self.top_k,self.min_score)]
+
 #Manges the strategies:
 class SearchManager:
     """""
@@ -52,8 +76,8 @@ class SearchManager:
         """""
         self.strategy=strategy
 
-    def search(self,books,value):
+    def search(self,books,value,index=None):
         """""
         Perform a search using the current strategy
         """""
-        return self.strategy.search(books,value)
\ No newline at end of file
+        return self.strategy.search(books,value,index)
\ No newline at end of file
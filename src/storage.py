@@ -0,0 +1,310 @@
+"""
+SQLite storage backend, a drop-in alternative to the CSV files.
+
+The whole library state (books with their borrow counts, waitlists and users) lives in one
+SQLite database in WAL mode. Inventory hands every mutation to SqliteStorage.apply with the
+same operation records it writes to the journal, so each operation is a single indexed
+INSERT/UPDATE/DELETE in its own transaction instead of a rewrite of whole CSV files.
+
+Create the database from the existing CSV files once with:
+    python storage.py [path/to/library.db]
+"""
+import contextlib
+import sqlite3
+import sys
+import threading
+from book import Book
+from utils import get_csv_path
+
+BOOKS_TABLE = """
+CREATE TABLE IF NOT EXISTS books (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    title_key TEXT NOT NULL,
+    author TEXT NOT NULL,
+    genre TEXT NOT NULL,
+    copies INTEGER NOT NULL,
+    year INTEGER,
+    is_loaned INTEGER NOT NULL DEFAULT 0,
+    borrow_count INTEGER NOT NULL DEFAULT 0
+)"""
+
+SCHEMA = BOOKS_TABLE + """;
+CREATE INDEX IF NOT EXISTS books_title ON books (title_key);
+CREATE INDEX IF NOT EXISTS books_author ON books (author COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS books_genre ON books (genre COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS waitlist (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    username TEXT NOT NULL,
+    email TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    UNIQUE (title, username, email, phone)
+);
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    hash TEXT
+);
+"""
+
+# Book attribute -> books column, for update_book records
+BOOK_COLUMNS = {
+    "author": "author",
+    "category": "genre",
+    "copies": "copies",
+    "year": "year",
+    "is_loaned": "is_loaned",
+    "borrow_count": "borrow_count",
+}
+
+BOOK_FIELDS = "title, author, copies, genre, year, is_loaned, borrow_count"
+
+# Like Inventory.find_book, operations on a title apply to the first book carrying it
+FIRST_BOOK = "id = (SELECT MIN(id) FROM books WHERE title_key = ?)"
+
+
+def _title_key(title):
+    return str(title).lower()
+
+
+class SqliteStorage:
+    """
+    Library state in a SQLite database, with indexed lookups by title, author and genre.
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: Path of the database file (defaults to csv_files/library.db).
+        """
+        self.path = path or get_csv_path("library.db")
+        # Transactions are managed explicitly (see transaction()); the lock serializes threads
+        self._connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        self._allow_duplicate_titles()
+
+    def _allow_duplicate_titles(self):
+        """
+        Rebuild the books table of databases created when title_key was UNIQUE, which made
+        adding a second book with an existing title overwrite the first one.
+        """
+        unique_titles = any(
+            unique and [column for _, _, column in self._connection.execute(f"PRAGMA index_info('{name}')")] == ["title_key"]
+            for _, name, unique, *_ in self._connection.execute("PRAGMA index_list(books)").fetchall())
+        if not unique_titles:
+            return
+        with self.transaction() as connection:
+            connection.execute("ALTER TABLE books RENAME TO books_unique_titles")
+            connection.execute(BOOKS_TABLE)
+            connection.execute("INSERT INTO books SELECT * FROM books_unique_titles")
+            connection.execute("DROP TABLE books_unique_titles")
+        self._connection.executescript(SCHEMA)  # The indexes went away with the old table
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Run a block of statements atomically. Nested blocks join the outermost transaction.
+        """
+        with self._lock:
+            if self._depth == 0:
+                self._connection.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self._connection
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._connection.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self._connection.execute("COMMIT")
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    # Books
+    @staticmethod
+    def _book_from_row(row):
+        title, author, copies, genre, year, is_loaned, borrow_count = row
+        book = Book(title, author, copies, genre, year, is_loaned=bool(is_loaned))
+        book.borrow_count = borrow_count
+        return book
+
+    def load_books(self):
+        """
+        Load every book, with its borrow count, in catalog order.
+        :return: List of Book objects.
+        """
+        return [self._book_from_row(row) for row in self._query(f"SELECT {BOOK_FIELDS} FROM books ORDER BY id")]
+
+    def load_available_books(self):
+        """
+        :return: Dictionary of title -> number of available copies.
+        """
+        return {title: copies - borrowed for title, copies, borrowed
+                in self._query("SELECT title, copies, borrow_count FROM books ORDER BY id")}
+
+    def find_books(self, title=None, author=None, genre=None):
+        """
+        Find books by exact (case-insensitive) title, author and/or genre using the indexes.
+        :return: List of Book objects in catalog order.
+        """
+        conditions, parameters = [], []
+        if title is not None:
+            conditions.append("title_key = ?")
+            parameters.append(_title_key(title))
+        if author is not None:
+            conditions.append("author = ? COLLATE NOCASE")
+            parameters.append(author)
+        if genre is not None:
+            conditions.append("genre = ? COLLATE NOCASE")
+            parameters.append(genre)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return [self._book_from_row(row)
+                for row in self._query(f"SELECT {BOOK_FIELDS} FROM books{where} ORDER BY id", parameters)]
+
+    def save_books(self, books):
+        """
+        Replace the whole catalog with the given books.
+        """
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM books")
+            for book in books:
+                self._insert_book(connection, book.title, book.author, book.copies, book.category, book.year,
+                                  book.is_loaned, book.borrow_count)
+
+    @staticmethod
+    def _insert_book(connection, title, author, copies, category, year, is_loaned=False, borrow_count=0):
+        """
+        Append a book to the catalog. Books sharing a title are kept as separate rows, in catalog order,
+        as Inventory keeps them.
+        """
+        connection.execute(
+            "INSERT INTO books (title, title_key, author, genre, copies, year, is_loaned, borrow_count) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (title, _title_key(title), author, category, int(copies), year, int(bool(is_loaned)), int(borrow_count)))
+
+    # Waitlist
+    def load_waitlist(self):
+        """
+        :return: Dictionary of title -> list of entries, in the order the users joined.
+        """
+        waitlist = {}
+        for title, username, email, phone in self._query(
+                "SELECT title, username, email, phone FROM waitlist ORDER BY id"):
+            waitlist.setdefault(title, []).append({"username": username, "email": email, "phone": phone})
+        return waitlist
+
+    def save_waitlist(self, waitlist):
+        """
+        Replace every waitlist with the given mapping of title -> entries.
+        """
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM waitlist")
+            for title, users in waitlist.items():
+                for user in users:
+                    connection.execute("INSERT OR IGNORE INTO waitlist (title, username, email, phone) VALUES (?, ?, ?, ?)",
+                                       (title, user["username"], user["email"], user["phone"]))
+
+    # Inventory operations
+    def apply(self, op, **payload):
+        """
+        Apply one inventory operation record (the same records the journal holds) in a transaction.
+        Operations on a title apply to the first book carrying it, like Inventory.find_book.
+        """
+        with self.transaction() as connection:
+            if op == "add_book":
+                self._insert_book(connection, payload["title"], payload["author"], payload["copies"],
+                                  payload["category"], payload["year"], borrow_count=payload.get("borrow_count", 0))
+            elif op == "remove_book":
+                connection.execute(f"DELETE FROM books WHERE {FIRST_BOOK}", (_title_key(payload["title"]),))
+            elif op == "update_book":
+                self._update_book(connection, payload["title"], payload["changes"])
+            elif op in ("lend", "return"):
+                connection.execute(f"UPDATE books SET borrow_count = ? WHERE {FIRST_BOOK}",
+                                   (payload["borrow_count"], _title_key(payload["title"])))
+            elif op == "waitlist_add":
+                connection.execute("INSERT OR IGNORE INTO waitlist (title, username, email, phone) VALUES (?, ?, ?, ?)",
+                                   (payload["title"], payload["username"], payload["email"], payload["phone"]))
+            elif op == "waitlist_remove":
+                connection.execute("DELETE FROM waitlist WHERE title = ? AND username = ? AND email = ? AND phone = ?",
+                                   (payload["title"], payload["username"], payload["email"], payload["phone"]))
+            else:
+                raise ValueError(f"Unknown storage operation '{op}'.")
+
+    @staticmethod
+    def _update_book(connection, title, changes):
+        assignments, parameters = [], []
+        for key, value in changes.items():
+            if key == "title":
+                assignments += ["title = ?", "title_key = ?"]
+                parameters += [value, _title_key(value)]
+            elif key in BOOK_COLUMNS:
+                assignments.append(f"{BOOK_COLUMNS[key]} = ?")
+                parameters.append(int(bool(value)) if key == "is_loaned" else value)
+        if assignments:
+            connection.execute(f"UPDATE books SET {', '.join(assignments)} WHERE {FIRST_BOOK}",
+                               parameters + [_title_key(title)])
+
+    # Users
+    def load_users(self):
+        """
+        :return: List of (username, password, hash) tuples.
+        """
+        return self._query("SELECT username, password, hash FROM users ORDER BY rowid")
+
+    def save_user(self, user):
+        """
+        Insert or update a single user.
+        """
+        with self.transaction() as connection:
+            self._upsert_user(connection, user)
+
+    def save_users(self, users):
+        """
+        Insert or update several users in one transaction.
+        """
+        with self.transaction() as connection:
+            for user in users:
+                self._upsert_user(connection, user)
+
+    @staticmethod
+    def _upsert_user(connection, user):
+        connection.execute("INSERT INTO users (username, password, hash) VALUES (?, ?, ?) "
+                           "ON CONFLICT (username) DO UPDATE SET password = excluded.password, hash = excluded.hash",
+                           (user.username, user.original_password, user.password))
+
+    def close(self):
+        """
+        Close the database connection.
+        """
+        with self._lock:
+            self._connection.close()
+
+
+def import_csv_files(storage):
+    """
+    Copy the current CSV state (books with their availability, waitlists and users) into a storage.
+    """
+    from inventory import Inventory
+    from user_manager import UserManager
+
+    inventory = Inventory()
+    users = UserManager()
+    storage.save_books(inventory.books)
+    storage.save_waitlist(inventory.waitlist)
+    storage.save_users(users.users.values())
+    print(f"Imported {len(inventory.books)} books, {len(inventory.waitlist)} waitlists "
+          f"and {len(users.users)} users into {storage.path}.")
+
+
+if __name__ == "__main__":
+    sqlite_storage = SqliteStorage(sys.argv[1] if len(sys.argv) > 1 else None)
+    import_csv_files(sqlite_storage)
+    sqlite_storage.close()
@@ -1,29 +1,183 @@
+import inspect
+import threading
+import time
+
+
+class ChangeEvent:
+    """
+    Describes what changed in a subject: the kinds of change that happened to each title.
+    Events merge, so many changes can be delivered to the observers as one notification.
+    An empty event means "something changed" without details.
+    """
+    ADDED = "added"
+    REMOVED = "removed"
+    UPDATED = "updated"
+    LENT = "lent"
+    RETURNED = "returned"
+    WAITLIST = "waitlist"
+
+    def __init__(self, title=None, kind=None):
+        self.changes = {}  # Title -> set of kinds
+        if title is not None:
+            self.add(title, kind)
+
+    def add(self, title, kind):
+        self.changes.setdefault(title, set()).add(kind)
+
+    def merge(self, other):
+        for title, kinds in other.changes.items():
+            self.changes.setdefault(title, set()).update(kinds)
+
+    @property
+    def titles(self):
+        return set(self.changes)
+
+    def __bool__(self):
+        return bool(self.changes)
+
+    def __repr__(self):
+        return f"ChangeEvent({self.changes!r})"
+
+
 class Subject:
     """
     @author Roy Meoded
     @author Noa Agassi
     The Subject interface declares methods for attaching, detaching, and notifying observers.
+
+    By default observers are called synchronously on every notify. configure_notifications can
+    instead coalesce the events raised within a debounce window into one notification, delivered
+    either on a dispatcher thread or by flush_notifications (e.g. polled from a GUI event loop).
     """
     def __init__(self):
-        self._observers = []  # List to store observers
+        self._observers = {}  # Observer -> whether its update method takes the event, in attach order
+        self._debounce = 0.0
+        self._threaded = False
+        self._pending = None  # ChangeEvent waiting for delivery
+        self._due = 0.0  # When the pending event may be delivered
+        self._condition = threading.Condition()
+        self._dispatcher = None
+        self._closed = False
 
     def attach(self, observer):
         """
         Attach an observer to the subject.
         """
         if observer not in self._observers:
-            self._observers.append(observer)
+            self._observers[observer] = self._takes_event(observer)
 
     def detach(self, observer):
         """
         Detach an observer from the subject.
         """
-        if observer in self._observers:
-            self._observers.remove(observer)
+        self._observers.pop(observer, None)
 
-    def notify(self):
+    @staticmethod
+    def _takes_event(observer):
+        """
+        Check whether the observer's update method accepts the event; observers written before
+        events existed only take the subject.
+        """
+        try:
+            parameters = inspect.signature(observer.update).parameters.values()
+        except (TypeError, ValueError):  # No signature available (e.g. a builtin)
+            return True
+        positional = [parameter for parameter in parameters
+                      if parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD)]
+        return len(positional) >= 2 or any(parameter.kind == parameter.VAR_POSITIONAL for parameter in parameters)
+
+    def configure_notifications(self, debounce=0.0, threaded=False):
+        """
+        :param debounce: Seconds during which events are merged into one notification (0: deliver immediately).
+        :param threaded: Deliver on a dispatcher thread; otherwise, with a debounce window,
+                         pending events are delivered by flush_notifications.
+        """
+        self.flush_notifications(force=True)
+        with self._condition:
+            self._debounce = debounce
+            self._threaded = threaded
+
+    def notify(self, event=None):
         """
         Notify all observers about an event.
+        :param event: ChangeEvent describing the change (an empty event if omitted).
+        """
+        event = event if event is not None else ChangeEvent()
+        if not self._debounce and not self._threaded:
+            self._deliver(event)
+            return
+        with self._condition:
+            if self._pending is None:
+                self._pending = ChangeEvent()
+                self._due = time.monotonic() + self._debounce
+            self._pending.merge(event)
+            if self._threaded:
+                if self._dispatcher is None:
+                    self._closed = False
+                    self._dispatcher = threading.Thread(target=self._dispatch_loop, name="observer-dispatcher", daemon=True)
+                    self._dispatcher.start()
+                self._condition.notify()
+
+    def _take_pending(self, force=False):
+        """
+        Remove and return the pending event if its debounce window is over (or if forced). Hold the condition.
+        """
+        if self._pending is None or (not force and time.monotonic() < self._due):
+            return None
+        event, self._pending = self._pending, None
+        return event
+
+    def flush_notifications(self, force=False):
+        """
+        Deliver the pending event on the calling thread if its debounce window is over.
+        :param force: Deliver it even if the window is still open.
+        :return: True if observers were notified.
+        """
+        with self._condition:
+            event = self._take_pending(force)
+        if event is None:
+            return False
+        self._deliver(event)
+        return True
+
+    def _dispatch_loop(self):
+        while True:
+            with self._condition:
+                while True:
+                    event = self._take_pending(force=self._closed)
+                    if event is not None or self._closed:
+                        break
+                    timeout = self._due - time.monotonic() if self._pending is not None else None
+                    self._condition.wait(timeout)
+            if event is not None:
+                self._deliver(event)
+            elif self._closed:
+                return
+
+    def close_notifications(self):
+        """
+        Stop the dispatcher thread after delivering the pending event.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+            dispatcher, self._dispatcher = self._dispatcher, None
+        if dispatcher is not None and dispatcher is not threading.current_thread():
+            dispatcher.join()
+        self.flush_notifications(force=True)
+
+    def _deliver(self, event):
+        for observer, takes_event in list(self._observers.items()):
+            try:
+                if takes_event:
+                    observer.update(self, event)
+                else:
+                    observer.update(self)
+            except Exception as e:
+                self.observer_failed(observer, event, e)
+
+    def observer_failed(self, observer, event, error):
+        """
+        Report an observer that raised while handling an event; the other observers are still notified.
         """
-        for observer in self._observers:
-            observer.update(self)
\ No newline at end of file
+        print(f"ERROR: Observer {observer} failed to handle {event}: {error}")
@@ -0,0 +1,188 @@
+"""
+Runs slow GUI actions on worker threads so the Tk mainloop never blocks.
+
+Tk widgets may only be touched from the thread running the mainloop. Workers therefore never
+call back into Tk: they put their outcome (and progress reports) on a queue, and the runner
+drains that queue from the Tk thread with root.after, calling the task's callbacks there.
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TaskCancelled(Exception):
+    """
+    Raised by Task.check_cancelled inside a task whose cancellation was requested.
+    """
+
+
+class Task:
+    """
+    Handle on a submitted task, shared by the worker running it and the GUI.
+    """
+
+    def __init__(self, runner, description, cancellable):
+        self.runner = runner
+        self.description = description
+        self.cancellable = cancellable
+        self.future = None
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def cancel(self):
+        """
+        Request cancellation. A task that has not started yet never runs; a running task stops at its
+        next check_cancelled. Either way its callbacks are not called.
+        :return: False if the task cannot be cancelled.
+        """
+        if not self.cancellable:
+            return False
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+        return True
+
+    def check_cancelled(self):
+        """
+        Called by long-running task functions between steps.
+        """
+        if self.cancelled:
+            raise TaskCancelled(self.description)
+
+    def report(self, done, total=None):
+        """
+        Report progress from the worker; delivered to the on_progress callback on the Tk thread.
+        :param done: Work done so far (a fraction in [0, 1] when total is omitted).
+        :param total: Total amount of work.
+        """
+        fraction = done if total is None else (done / total if total else 1.0)
+        self.runner._post(self, "progress", fraction)
+
+
+class TaskRunner:
+    """
+    Worker pool for GUI actions, with the results marshalled back to the Tk thread.
+    """
+
+    def __init__(self, root, max_workers=4, poll_ms=50):
+        """
+        :param root: The Tk root whose after() schedules the result polling.
+        :param max_workers: Number of worker threads.
+        :param poll_ms: Interval between two drains of the result queue while tasks are running.
+        """
+        self.root = root
+        self.poll_ms = poll_ms
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gui-task")
+        self._results = queue.Queue()
+        self._callbacks = {}  # Task -> (on_done, on_error, on_progress)
+        self._polling = False
+        self.on_busy = None  # Called on the Tk thread with the running tasks whenever that set changes
+
+    @property
+    def running(self):
+        return [task for task in self._callbacks if not task.cancelled]
+
+    def submit(self, function, *args, on_done=None, on_error=None, on_progress=None,
+               description="", cancellable=False, with_task=False, **kwargs):
+        """
+        Run function(*args, **kwargs) on a worker thread. Call this from the Tk thread.
+        :param on_done: Called on the Tk thread with the function's result.
+        :param on_error: Called on the Tk thread with the exception the function raised.
+        :param on_progress: Called on the Tk thread with the fractions the task reports.
+        :param description: Text shown while the task runs.
+        :param cancellable: Whether the user may cancel the task (only safe for tasks without side effects,
+                            or that check for cancellation before making them).
+        :param with_task: Pass the Task to the function as its first argument, for progress reports
+                          and cancellation checks.
+        :return: The Task.
+        """
+        task = Task(self, description, cancellable)
+        self._callbacks[task] = (on_done, on_error, on_progress)
+        task.future = self._executor.submit(self._run, task, function, args, kwargs, with_task)
+        self._busy_changed()
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_ms, self.poll)
+        return task
+
+    def _run(self, task, function, args, kwargs, with_task):
+        if task.cancelled:
+            return
+        try:
+            result = function(task, *args, **kwargs) if with_task else function(*args, **kwargs)
+        except TaskCancelled:
+            self._post(task, "cancelled", None)
+        except Exception as e:
+            self._post(task, "error", e)
+        else:
+            self._post(task, "done", result)
+
+    def _post(self, task, kind, value):
+        self._results.put((task, kind, value))
+
+    def poll(self):
+        """
+        Deliver the queued results and progress reports on the Tk thread.
+        """
+        changed = False
+        while True:
+            try:
+                task, kind, value = self._results.get_nowait()
+            except queue.Empty:
+                break
+            callbacks = self._callbacks.get(task)
+            if callbacks is None:
+                continue
+            on_done, on_error, on_progress = callbacks
+            if kind == "progress":
+                if on_progress and not task.cancelled:
+                    on_progress(value)
+                continue
+            del self._callbacks[task]
+            changed = True
+            if task.cancelled:
+                continue
+            try:
+                if kind == "done" and on_done:
+                    on_done(value)
+                elif kind == "error":
+                    if on_error:
+                        on_error(value)
+                    else:
+                        print(f"ERROR: {task.description or 'Background task'} failed: {value}")
+            except Exception as e:
+                print(f"ERROR: Callback of {task.description or 'background task'} failed: {e}")
+
+        # Tasks cancelled before they started never post a result
+        for task in [task for task in self._callbacks if task.cancelled and task.done]:
+            del self._callbacks[task]
+            changed = True
+        if changed:
+            self._busy_changed()
+
+        if self._callbacks:
+            self.root.after(self.poll_ms, self.poll)
+        else:
+            self._polling = False
+
+    def cancel_all(self):
+        """
+        Cancel every cancellable running task.
+        """
+        for task in list(self._callbacks):
+            task.cancel()
+        self._busy_changed()
+
+    def _busy_changed(self):
+        if self.on_busy:
+            self.on_busy(self.running)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
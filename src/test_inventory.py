@@ -1,14 +1,56 @@
+import asyncio
 import csv
+import http.client
+import json
 import os
+import pstats
+import re
+import sqlite3
 import sys
+import tempfile
+import threading
+import time
 import unittest
-from unittest.mock import mock_open, patch
+from unittest.mock import MagicMock, mock_open, patch
+import pandas as pd
+os.environ.setdefault("LIBRARY_LOG_FILE", os.devnull)  # Keep test runs out of log.txt
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
 from inventory import Inventory
 from book import Book
+from book_table import BookTable
+from book_factory import BookFactory
+from journal import InventoryJournal
+from action_logger import ActionLogger
+import search_index
+from search_index import SearchIndex
+from columnar_store import BookView, ColumnarStore
+from waitlist import Waitlist
+from storage import SCHEMA, SqliteStorage
+from locks import ReadWriteLock
+from async_inventory import AsyncInventory
+from http_server import LibraryServer
+from popularity import PopularityTracker, SECONDS_PER_DAY
+from task_runner import TaskRunner
+from metrics import MetricsRegistry, get_metrics, instrument
+from profiler import SlowCallProfiler
+from mapped_catalog import MappedCatalog
+from update_files import UpdateFiles
+import benchmark
+from search_strategy import SearchByTitle, SearchByAuthor, SearchByCategory, FuzzySearch
 from utils import get_csv_path
 
 
+def written(name):
+    """
+    Path opened when a CSV file is rewritten: a temporary file renamed over it (see utils.atomic_write).
+    """
+    return get_csv_path(name) + ".tmp"
+
+
+# With open() mocked there is no temporary file to fsync and rename
+mock_atomic_rename = patch.multiple("utils.os", fsync=MagicMock(), replace=MagicMock())
+
+
 class TestAvailableBooks(unittest.TestCase):
     @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\nBook1,5\nBook2,3")
     def test_load_available_books(self, mock_file):
@@ -151,6 +193,7 @@ class TestAddBookWithCSV(unittest.TestCase):
         self.assertIn("5", str(written_books))
 
 class TestInventoryRemoveBook(unittest.TestCase):
+    @mock_atomic_rename
     @patch("builtins.open", new_callable=mock_open, read_data="title,author,copies,genre,year\nBook1,Author1,5,Fiction,2021\n")
     def test_remove_existing_book(self, mock_file):
 
@@ -163,7 +206,7 @@ class TestInventoryRemoveBook(unittest.TestCase):
 
         self.assertNotIn("Book1", [book.title for book in inventory.books])
 
-        mock_file.assert_any_call(get_csv_path("books.csv"), mode="w", newline="", encoding="utf-8")
+        mock_file.assert_any_call(written("books.csv"), mode="w", newline="", encoding="utf-8")
 
 class TestUpdateAvailableBooks(unittest.TestCase):
     @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\nBook1,5\nBook2,3")
@@ -183,12 +226,13 @@ class TestWaitlist(unittest.TestCase):
 
         inventory.add_to_waitlist("Book1", "User1", "user1@example.com", "123456789")
 
-        mock_file.assert_any_call(get_csv_path("waiting_list.csv"), mode="w", newline="", encoding="utf-8")
+        # Joining a waitlist appends one row instead of rewriting the file
+        mock_file.assert_any_call(get_csv_path("waiting_list.csv"), mode="a", newline="", encoding="utf-8")
 
         handle = mock_file()
-        handle.write.assert_any_call("Book Title,Username,Email,Phone\r\n")
         handle.write.assert_any_call("Book1,User1,user1@example.com,123456789\r\n")
 
+    @mock_atomic_rename
     @patch("builtins.open", new_callable=mock_open, read_data="Book Title,Username,Email,Phone\nBook1,User1,user1@example.com,123456789\n")
     def test_remove_from_waitlist(self, mock_file):
         inventory = Inventory()
@@ -199,10 +243,92 @@ class TestWaitlist(unittest.TestCase):
         inventory.waitlist["Book1"].pop(0)
         inventory.sync_waitlist_to_file()
 
-        mock_file.assert_called_with(get_csv_path("waiting_list.csv"), mode="w", newline="", encoding="utf-8")
+        mock_file.assert_called_with(written("waiting_list.csv"), mode="w", newline="", encoding="utf-8")
         handle = mock_file()
         self.assertNotIn("User1", str(handle.write.call_args_list))
 
+class TestWaitlistQueues(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "waiting_list.csv")
+        self.waitlist = Waitlist(self.path, min_compaction=3)
+        self.users = [{"username": f"User{index}", "email": f"user{index}@example.com", "phone": str(index)}
+                      for index in range(1, 5)]
+
+    def add(self, title, user):
+        if self.waitlist.add(title, user):
+            self.waitlist.append_added(title, user)
+
+    def pop(self, title):
+        user = self.waitlist.pop(title)
+        self.waitlist.append_removed(title, user)
+        return user
+
+    def reload(self):
+        restored = Waitlist(self.path)
+        restored.load()
+        return restored
+
+    def test_fifo_order_and_duplicates(self):
+        for user in self.users[:3]:
+            self.add("Book1", user)
+        self.assertFalse(self.waitlist.add("Book1", dict(self.users[0])))
+
+        self.assertEqual(self.pop("Book1"), self.users[0])
+        self.assertEqual(self.waitlist["Book1"], self.users[1:3])
+        self.assertIsNone(self.waitlist.pop("Book2"))
+
+    def test_tombstones_replay_on_load(self):
+        for user in self.users[:2]:
+            self.add("Book1", user)
+        self.add("Book2", self.users[2])
+        self.pop("Book1")
+        self.add("Book1", self.users[0])  # Rejoining after leaving goes to the end of the queue
+
+        with open(self.path, encoding="utf-8") as file:
+            self.assertEqual(sum(1 for line in file if line.rstrip().endswith(",removed")), 1)
+        restored = self.reload()
+        self.assertEqual(restored["Book1"], [self.users[1], self.users[0]])
+        self.assertEqual(restored["Book2"], [self.users[2]])
+
+    def test_file_is_compacted_when_tombstones_pile_up(self):
+        for user in self.users:
+            self.add("Book1", user)
+        for _ in range(3):
+            self.pop("Book1")
+
+        with open(self.path, encoding="utf-8") as file:
+            self.assertEqual(file.read().splitlines(), ["Book Title,Username,Email,Phone", "Book1,User4,user4@example.com,4"])
+        self.assertEqual(self.reload()["Book1"], [self.users[3]])
+
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def test_return_book_serves_waitlist_in_order(self, mock_file):
+        inventory = Inventory()
+        inventory.books = [Book(title="Book1", author="Author1", category="Fiction", year=2021, copies=1)]
+        inventory.waitlist = {"Book1": self.users[:2]}
+        inventory.lend_book("Book1", "User0")
+
+        inventory.return_book("Book1")
+
+        self.assertEqual(inventory.returned_last_user, self.users[0])
+        self.assertEqual(inventory.waitlist["Book1"], [self.users[1]])
+        self.assertEqual(inventory.find_book("Book1").available_copies, 0)
+
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def test_return_book_with_next_user_returns_the_user(self, mock_file):
+        inventory = Inventory()
+        inventory.books = [Book(title="Book1", author="Author1", category="Fiction", year=2021, copies=1),
+                           Book(title="Book2", author="Author2", category="Fiction", year=2021, copies=1)]
+        inventory.waitlist = {"Book1": self.users[:1]}
+        inventory.lend_book("Book1", "User0")
+        inventory.lend_book("Book2", "User0")
+
+        self.assertEqual(inventory.return_book_with_next_user("Book1"), (True, self.users[0]))
+        self.assertEqual(inventory.return_book_with_next_user("Book2"), (True, None))
+        self.assertEqual(inventory.return_book_with_next_user("Book2"), ("all_copies_available", None))
+        self.assertEqual(inventory.return_book_with_next_user("Missing"), (False, None))
+
 class TestPopularBooks(unittest.TestCase):
     @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\nBook1,3\nBook2,1\n")
     def test_get_popular_books(self, mock_file):
@@ -211,6 +337,9 @@ class TestPopularBooks(unittest.TestCase):
             Book(title="Book1", author="Author1", category="Fiction", year=2021, copies=5),
             Book(title="Book2", author="Author2", category="Non-Fiction", year=2020, copies=4),
         ]
+        for title, lends in (("Book1", 2), ("Book2", 3)):
+            for _ in range(lends):
+                inventory.lend_book(title, "user1")
 
         popular_books = inventory.get_popular_books()
 
@@ -218,6 +347,7 @@ class TestPopularBooks(unittest.TestCase):
         self.assertEqual(popular_books[1][0], "Book1")
 
 class TestReturnBook(unittest.TestCase):
+    @mock_atomic_rename
     @patch("builtins.open", new_callable=mock_open)
     def test_return_book(self, mock_file):
         inventory = Inventory()
@@ -225,10 +355,10 @@ class TestReturnBook(unittest.TestCase):
         inventory.books = [
             Book(title="Book1", author="Author1", category="Fiction", year=2021, copies=1)
         ]
-        with patch("csv.DictReader", return_value=[{"Title": "Book1", "Available": "0"}]):
-            result = inventory.return_book("Book1")
+        inventory.books[0].borrow_count = 1
+        result = inventory.return_book("Book1")
 
-        mock_file.assert_any_call(get_csv_path("available_books.csv"), mode="w", newline="", encoding="utf-8")
+        mock_file.assert_any_call(written("available_books.csv"), mode="w", newline="", encoding="utf-8")
 
         handle = mock_file()
         handle.write.assert_any_call("Title,Available\r\n")
@@ -237,6 +367,7 @@ class TestReturnBook(unittest.TestCase):
         self.assertTrue(result)
 
 class TestLendBook(unittest.TestCase):
+    @mock_atomic_rename
     @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\nBook1,1\nBook2,0")
     def test_lend_book_successful(self, mock_file):
         inventory = Inventory()
@@ -248,12 +379,65 @@ class TestLendBook(unittest.TestCase):
 
         self.assertTrue(result)
 
-        mock_file.assert_any_call(get_csv_path("available_books.csv"), mode="w", newline="", encoding="utf-8")
+        mock_file.assert_any_call(written("available_books.csv"), mode="w", newline="", encoding="utf-8")
         handle = mock_file()
         handle.write.assert_any_call("Title,Available\r\n")
         handle.write.assert_any_call("Book1,0\r\n")
 
+    @patch("builtins.open", new_callable=mock_open)
+    def test_return_book_all_copies_available(self, mock_file):
+        inventory = Inventory()
+        inventory.books = [
+            Book(title="Book1", author="Author1", category="Fiction", year=2021, copies=1)
+        ]
+
+        self.assertEqual(inventory.return_book("Book1"), "all_copies_available")
+
+class TestAvailabilityLedger(unittest.TestCase):
+    @patch("builtins.open", new_callable=mock_open)
+    def test_seed_availability(self, mock_file):
+        inventory = Inventory()
+        inventory.books = [
+            Book(title="Book1", author="Author1", category="Fiction", year=2021, copies=5),
+            Book(title="Book2", author="Author2", category="Non-Fiction", year=2020, copies=2),
+        ]
+
+        with patch("update_files.UpdateFiles.load_available_books", return_value={"book1": 3}):
+            inventory.seed_availability()
+
+        self.assertEqual(inventory.books[0].available_copies, 3)
+        self.assertEqual(inventory.books[1].available_copies, 0)
+
+    @patch("builtins.open", new_callable=mock_open)
+    def test_seed_without_available_books_puts_no_copy_on_the_shelf(self, mock_file):
+        inventory = Inventory()
+        inventory.books = [
+            Book(title="Book1", author="Author1", category="Fiction", year=2021, copies=5),
+        ]
+
+        with patch("update_files.UpdateFiles.load_available_books", return_value={}):
+            inventory.seed_availability()
+
+        self.assertEqual(inventory.books[0].available_copies, 0)
+
+    @patch("builtins.open", new_callable=mock_open)
+    def test_lend_does_not_read_available_books(self, mock_file):
+        inventory = Inventory()
+        inventory.books = [
+            Book(title="Book1", author="Author1", category="Fiction", year=2021, copies=2),
+        ]
+        mock_file.reset_mock()
+
+        self.assertTrue(inventory.lend_book("Book1", "User1"))
+
+        self.assertNotIn(
+            ((get_csv_path("available_books.csv"),), {"mode": "r", "encoding": "utf-8"}),
+            mock_file.call_args_list
+        )
+        self.assertEqual(inventory.books[0].available_copies, 1)
+
 class TestSyncToFiles(unittest.TestCase):
+    @mock_atomic_rename
     @patch("builtins.open", new_callable=mock_open)
     def test_sync_to_files(self, mock_file):
         inventory = Inventory()
@@ -263,8 +447,1324 @@ class TestSyncToFiles(unittest.TestCase):
 
         inventory.sync_to_files()
 
-        mock_file.assert_any_call(get_csv_path("books.csv"), mode="w", newline="", encoding="utf-8")
-        mock_file.assert_any_call(get_csv_path("available_books.csv"), mode="w", newline="", encoding="utf-8")
+        mock_file.assert_any_call(written("books.csv"), mode="w", newline="", encoding="utf-8")
+        mock_file.assert_any_call(written("available_books.csv"), mode="w", newline="", encoding="utf-8")
+
+    @staticmethod
+    def rewritten(mock_file):
+        return [call.args[0] for call in mock_file.call_args_list if call.kwargs.get("mode") == "w"]
+
+    @mock_atomic_rename
+    @patch("builtins.open", new_callable=mock_open)
+    def test_only_changed_files_are_rewritten(self, mock_file):
+        inventory = Inventory()
+        inventory.books = [Book(title="Book1", author="Author1", category="Fiction", year=2021, copies=5)]
+        inventory.sync_to_files()
+        mock_file.reset_mock()
+
+        inventory.sync_to_files()  # Nothing changed
+        self.assertEqual(self.rewritten(mock_file), [])
+
+        inventory.update_book("Book1", year=2022)
+        self.assertEqual(self.rewritten(mock_file), [written("books.csv")])
+
+    @mock_atomic_rename
+    @patch("builtins.open", new_callable=mock_open)
+    def test_flush_interval_coalesces_writes(self, mock_file):
+        inventory = Inventory(flush_interval=60)
+        inventory.books = [Book(title=f"Book{index}", author="Author", category="Fiction", year=2021, copies=5)
+                           for index in range(3)]
+        mock_file.reset_mock()
+
+        for index in range(3):
+            inventory.update_book(f"Book{index}", copies=6)
+        self.assertEqual(self.rewritten(mock_file), [])
+
+        inventory.close()  # Writes what is pending
+        self.assertEqual(self.rewritten(mock_file), [written("books.csv"), written("available_books.csv"),
+                                                     written("loaned_books.csv")])
+        self.assertIsNone(inventory._flush_timer)
+
+    def test_failed_write_keeps_previous_file(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with open(os.path.join(directory.name, "books.csv"), "w", encoding="utf-8") as file:
+            file.write("title,author,is_loaned,copies,genre,year\nBook1,Author1,No,5,Fiction,2021\n")
+        with open(os.path.join(directory.name, "available_books.csv"), "w", encoding="utf-8") as file:
+            file.write("Title,Available\nBook1,5\n")
+
+        with patch.dict(os.environ, {"LIBRARY_DATA_DIR": directory.name}):
+            inventory = Inventory(logger=ActionLogger(os.devnull))
+            broken = Book(title="Book2", author="Author2", category="Fiction", year=2021, copies=1)
+            inventory.books = inventory.books + [broken]
+            with patch.object(Book, "year", property(lambda book: 1 / 0 if book is broken else 2021)):
+                inventory.sync_to_files()  # Fails half-way through books.csv
+            self.assertEqual(inventory.find_book("Book1").copies, 5)
+
+        with open(os.path.join(directory.name, "books.csv"), encoding="utf-8") as file:
+            self.assertNotIn("Book2", file.read())
+        self.assertEqual(sorted(os.listdir(directory.name)), ["available_books.csv", "books.csv"])
+        self.assertIn("books.csv", inventory._dirty)  # Retried by the next sync
+
+class TestTitleIndex(unittest.TestCase):
+    @patch("builtins.open", new_callable=mock_open)
+    def test_find_book_case_insensitive(self, mock_file):
+        inventory = Inventory()
+        inventory.books = [
+            Book(title="Book1", author="Author1", category="Fiction", year=2021, copies=5),
+        ]
+
+        self.assertIs(inventory.find_book("BOOK1"), inventory.books[0])
+        self.assertIsNone(inventory.find_book("Book2"))
+
+    @patch("builtins.open", new_callable=mock_open)
+    def test_update_book_title_reindexes(self, mock_file):
+        inventory = Inventory()
+        book = Book(title="Book1", author="Author1", category="Fiction", year=2021, copies=5)
+        inventory.books = [book]
+
+        inventory.update_book("book1", title="Renamed")
+
+        self.assertIsNone(inventory.find_book("Book1"))
+        self.assertIs(inventory.find_book("renamed"), book)
+
+    @patch("builtins.open", new_callable=mock_open, read_data="title,author,copies,genre,year\n")
+    def test_remove_book_unindexes(self, mock_file):
+        inventory = Inventory()
+        inventory.books = [
+            Book(title="Book1", author="Author1", category="Fiction", year=2021, copies=5),
+        ]
+
+        inventory.remove_book("Book1")
+
+        self.assertIsNone(inventory.find_book("Book1"))
+
+    @patch("builtins.open", new_callable=mock_open)
+    def test_same_title_books_take_over_in_catalog_order(self, mock_file):
+        inventory = Inventory()
+        first, second, third = [Book(title=title, author="Author1", category="Fiction", year=2021, copies=1)
+                                for title in ("Book1", "BOOK1", "book1")]
+        inventory.books = [first, second, third]
+
+        inventory._apply_update(first, {"year": 2022})  # Same title: the index is left alone
+        self.assertIs(inventory.find_book("book1"), first)
+        inventory._apply_update(second, {"title": "Other"})
+        inventory._remove_from_catalog(first)
+
+        self.assertIs(inventory.find_book("book1"), third)
+        self.assertIs(inventory.find_book("other"), second)
+        inventory._remove_from_catalog(third)
+        self.assertIsNone(inventory.find_book("book1"))
+        self.assertEqual(inventory._title_duplicates, {})
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.books = [
+            Book(title="The Hobbit", author="J.R.R. Tolkien", category="Fantasy", year=1937, copies=4),
+            Book(title="The Lord of the Rings", author="J.R.R. Tolkien", category="Fantasy", year=1954, copies=2),
+            Book(title="Of Mice and Men", author="John Steinbeck", category="Tragedy", year=1937, copies=1),
+            Book(title="Brave New World", author="Aldous Huxley", category="Dystopian", year=1932, copies=5),
+        ]
+        self.index = SearchIndex(self.books)
+
+    def test_strategies_match_linear_scan(self):
+        for strategy in (SearchByTitle(), SearchByAuthor(), SearchByCategory()):
+            for value in ("the", "THE HOB", "o", "of", "n", "tolkien", "  ", "", "zzz", "e r"):
+                self.assertEqual(strategy.search(self.books, value, self.index),
+                                 strategy.search(self.books, value), (strategy, value))
+
+    def test_index_follows_updates(self):
+        self.index.remove(self.books[0])
+        self.books[1].title = "Silmarillion"
+        self.index.reindex(self.books[1])
+
+        self.assertEqual(self.index.search("title", "the"), [])
+        self.assertEqual(self.index.search("title", "silma"), [self.books[1]])
+        self.assertEqual(self.index.search_any("tolkien"), [self.books[1]])
+        self.assertTrue(self.index.has_value("fantasy"))
+
+    def test_fuzzy_search_ranks_misspellings(self):
+        results = FuzzySearch(top_k=2).search(self.books, "hobit", self.index)
+        self.assertEqual(results[0].title, "The Hobbit")
+
+        results = FuzzySearch().search(self.books, "Tolkein", self.index)
+        self.assertEqual([book.title for book in results], ["The Hobbit", "The Lord of the Rings"])
+
+        self.assertEqual(FuzzySearch().search(self.books, "zzzz", self.index), [])
+        # Without an index the strategy builds one on the fly
+        self.assertEqual(FuzzySearch(top_k=1).search(self.books, "brave nwe world")[0].title, "Brave New World")
+
+    def test_similarity_reuses_stored_trigram_counts(self):
+        with patch("search_index.padded_trigrams", wraps=search_index.padded_trigrams) as grams:
+            self.index.similar("the hobit")
+        grams.assert_called_once()  # The query only; candidates use their stored counts
+
+        self.index.remove(self.books[2])
+        self.assertNotIn("of mice and men", self.index._gram_counts["title"])
+
+    @patch("builtins.open", new_callable=mock_open)
+    def test_inventory_keeps_index_in_sync(self, mock_file):
+        inventory = Inventory()
+        inventory.books = self.books
+        inventory.add_book(Book(title="Dune", author="Frank Herbert", category="Science Fiction", year=1965, copies=2))
+        inventory.update_book("Brave New World", category="Classic")
+
+        self.assertEqual([book.title for book in inventory.search_books_with_strategy(SearchByTitle(), "dun")], ["Dune"])
+        self.assertEqual(inventory.search_books(category="classic")[0].title, "Brave New World")
+        self.assertEqual(inventory.search_books(category="dystopian"), [])
+
+class TestBookFootprint(unittest.TestCase):
+    def test_book_is_slotted(self):
+        book = Book(title="Book1", author="Author1", category="Fiction", year=2021, copies=5)
+
+        self.assertFalse(hasattr(book, "__dict__"))
+        self.assertIsNone(book.waiting_list)
+        with self.assertRaises(AttributeError):
+            book.unknown_field = True
+
+    def test_author_and_category_are_interned(self):
+        first = Book(title="Book1", author="".join(["Author", "1"]), category="".join(["Fic", "tion"]), year=2021, copies=5)
+        second = Book(title="Book2", author="".join(["Auth", "or1"]), category="".join(["Fict", "ion"]), year=2020, copies=3)
+
+        self.assertIs(first.author, second.author)
+        self.assertIs(first.category, second.category)
+
+    def test_view_is_smaller_than_book(self):
+        book = Book(title="Book1", author="Author1", category="Fiction", year=2021, copies=5)
+        view = ColumnarStore([book]).views[0]
+
+        self.assertFalse(hasattr(view, "__dict__"))
+        self.assertLess(sys.getsizeof(view), sys.getsizeof(book))
+        self.assertEqual(str(view), str(book))
+
+class TestBulkLoad(unittest.TestCase):
+    def test_create_books_matches_create_book(self):
+        rows = [
+            {"title": "Book1", "author": "Author1", "is_loaned": "No", "copies": 2, "genre": "Fiction", "year": 2021},
+            {"title": "Book2", "author": "Author2", "is_loaned": "Yes", "copies": 1, "genre": "Drama", "year": 2020},
+            {"title": "Book1", "author": "Other", "is_loaned": "Yes", "copies": 3, "genre": "Other", "year": 1999},
+        ]
+
+        expected = []
+        for row in rows:
+            BookFactory.create_book(row["title"], row["author"], row["is_loaned"] == "Yes", row["copies"],
+                                    row["genre"], row["year"], expected)
+        books = BookFactory.create_books(pd.DataFrame(rows))
+
+        self.assertEqual([str(book) for book in books], [str(book) for book in expected])
+        self.assertEqual(books[0].copies, 5)
+        self.assertEqual(books[0].author, "Author1")
+        self.assertTrue(books[1].is_loaned)
+
+class TestPopularityTracker(unittest.TestCase):
+    def setUp(self):
+        self.now = 100 * SECONDS_PER_DAY
+        self.tracker = PopularityTracker(clock=lambda: self.now)
+        self.books = [Book(title=f"Book{index}", author="Author", category="Fiction", year=2020, copies=5)
+                      for index in range(1, 4)]
+        self.tracker.rebuild(self.books)
+
+    def lend(self, book, when=None):
+        book.lend()
+        self.tracker.record_lend(book, when)
+
+    def test_top_follows_lends_and_returns(self):
+        book1, book2, book3 = self.books
+        self.lend(book2)
+        self.lend(book3)
+        self.lend(book3)
+        self.lend(book1)
+        book3.return_copy()
+        book3.return_copy()
+        self.tracker.update(book3)
+
+        self.assertEqual(self.tracker.top(), [(book1, 1), (book2, 1)])
+        self.assertEqual(self.tracker.top(1), [(book1, 1)])
+
+    def test_top_in_window(self):
+        book1, book2, book3 = self.books
+        self.lend(book1, when=self.now - 20 * SECONDS_PER_DAY)
+        self.lend(book1, when=self.now - 20 * SECONDS_PER_DAY)
+        self.lend(book2, when=self.now - 2 * SECONDS_PER_DAY)
+        self.lend(book3)
+
+        self.assertEqual(self.tracker.top_in_window(days=7), [(book2, 1), (book3, 1)])
+        self.assertEqual(self.tracker.top_in_window(days=30), [(book1, 2), (book2, 1), (book3, 1)])
+        with self.assertRaises(ValueError):
+            self.tracker.top_in_window(days=31)
+
+    def test_old_buckets_are_pruned(self):
+        self.lend(self.books[0], when=self.now - 40 * SECONDS_PER_DAY)
+        self.lend(self.books[1])
+
+        self.assertEqual(len(self.tracker._daily), 1)
+
+    def test_books_added_after_a_removal_sort_last(self):
+        book1, book2, book3 = self.books
+        book4 = Book(title="Book4", author="Author", category="Fiction", year=2020, copies=5)
+        self.tracker.discard(book1)
+        self.lend(book4)
+        self.lend(book3)
+
+        self.assertEqual(self.tracker.top(), [(book3, 1), (book4, 1)])
+
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def test_inventory_popular_books_in_window(self, mock_file):
+        inventory = Inventory()
+        inventory.books = self.books
+        inventory.lend_book("Book2", "user1")
+        inventory.lend_book("Book2", "user2")
+        inventory.return_book("Book2")
+        inventory.remove_book("Book3")
+
+        self.assertEqual(inventory.get_popular_books(), [("Book2", 1)])
+        self.assertEqual(inventory.get_popular_books(days=7), [("Book2", 2)])
+
+class TestColumnarStore(unittest.TestCase):
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def setUp(self, mock_file):
+        self.inventory = Inventory(columnar=True)
+        self.inventory.books = [
+            Book(title="Book1", author="Author1", category="Fiction", year=2021, copies=5),
+            Book(title="Book2", author="Author2", category="Drama", year=1999, copies=4),
+            Book(title="Book3", author="Author1", category="Fiction", year=2010, copies=2),
+            Book(title="Book4", author="Author3", category="Fiction", year=2015, copies=3),
+        ]
+        for book, borrowed in zip(self.inventory.books, (2, 3, 2, 0)):
+            book.borrow_count = borrowed
+
+    def test_books_are_views_over_the_columns(self):
+        book = self.inventory.find_book("Book2")
+
+        self.assertIsInstance(book, BookView)
+        self.assertEqual(book.available_copies, 1)
+        book.lend()
+        self.assertEqual(self.inventory.store.borrow_count[book._row], 4)
+
+    def test_get_popular_books(self):
+        self.assertEqual(self.inventory.get_popular_books(2), [("Book2", 3), ("Book1", 2)])
+        self.assertEqual(self.inventory.get_popular_books(), [("Book2", 3), ("Book1", 2), ("Book3", 2)])
+
+    def test_count_books_per_category(self):
+        self.assertEqual(self.inventory.count_books_per_category(), {"Fiction": 3, "Drama": 1})
+
+    @patch("builtins.open", new_callable=mock_open, read_data="title,author,is_loaned,copies,genre,year\n")
+    def test_aggregates_follow_add_remove_and_update(self, mock_file):
+        self.inventory.add_book(Book(title="Book5", author="Author4", category="Poetry", year=2001, copies=1))
+        self.inventory.remove_book("Book4")
+        self.inventory.update_book("Book2", category="Fiction")
+
+        self.assertEqual(self.inventory.count_books_per_category(), {"Fiction": 3, "Poetry": 1})
+        self.assertIsInstance(self.inventory.find_book("Book5"), BookView)
+
+    def test_get_available_books(self):
+        titles = lambda books: [book.title for book in books]
+
+        self.assertEqual(titles(self.inventory.get_available_books(min_available=3)), ["Book1", "Book4"])
+        self.assertEqual(titles(self.inventory.get_available_books(category="Fiction", year_from=2011)), ["Book1", "Book4"])
+        self.assertEqual(titles(self.inventory.get_available_books(author="Author1")), ["Book1"])
+        self.assertEqual(self.inventory.get_available_books(category="Unknown"), [])
+
+    def test_matches_row_store(self):
+        with patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n"):
+            inventory = Inventory()
+        books = [Book(book.title, book.author, book.copies, book.category, book.year) for book in self.inventory.books]
+        for book, view in zip(books, self.inventory.books):
+            book.borrow_count = view.borrow_count
+        inventory.books = books
+
+        self.assertEqual(inventory.get_popular_books(), self.inventory.get_popular_books())
+        self.assertEqual(inventory.count_books_per_category(), self.inventory.count_books_per_category())
+        self.assertEqual([book.title for book in inventory.get_available_books(category="Fiction")],
+                         [book.title for book in self.inventory.get_available_books(category="Fiction")])
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.journal_path = os.path.join(tempfile.mkdtemp(), "journal.jsonl")
+        log_patcher = patch.object(Inventory, "log_action")
+        log_patcher.start()
+        self.addCleanup(log_patcher.stop)
+
+    def make_inventory(self, **kwargs):
+        with patch("builtins.open", new_callable=mock_open):
+            inventory = Inventory()
+        inventory.books = [
+            Book(title="Book1", author="Author1", category="Fiction", year=2021, copies=2),
+        ]
+        inventory.journal = InventoryJournal(self.journal_path, **kwargs)
+        return inventory
+
+    def test_lend_appends_record_without_rewriting_csv(self):
+        inventory = self.make_inventory()
+
+        with patch.object(inventory, "save_availability") as save:
+            self.assertTrue(inventory.lend_book("Book1", "User1"))
+        inventory.close()
+
+        save.assert_not_called()
+        records = list(InventoryJournal(self.journal_path).records())
+        self.assertEqual(records, [{"op": "lend", "title": "Book1", "borrow_count": 1}])
+
+    def test_concurrent_changes_share_a_group_commit(self):
+        inventory = self.make_inventory()
+        inventory.books = [Book(title=f"Book{index}", author="Author", category="Fiction", year=2020, copies=2)
+                           for index in range(4)]
+        append_many = inventory.journal.append_many
+        groups = []
+
+        def slow_append(records):
+            groups.append(len(records))
+            if len(groups) == 1:  # The other lends queue up while the first group is written
+                deadline = time.monotonic() + 5
+                while len(inventory._commit_queue) < 4 - groups[0] and time.monotonic() < deadline:
+                    time.sleep(0.01)
+            append_many(records)
+
+        with patch.object(inventory.journal, "append_many", side_effect=slow_append):
+            threads = [threading.Thread(target=inventory.lend_book, args=(f"Book{index}", "User1"))
+                       for index in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        inventory.close()
+
+        self.assertEqual(sum(groups), 4)
+        self.assertLessEqual(len(groups), 2)  # Every lend queued during the first write shares the second group
+        self.assertEqual(len(list(InventoryJournal(self.journal_path).records())), 4)
+
+    def test_failed_group_commit_reaches_the_caller(self):
+        inventory = self.make_inventory()
+
+        with patch.object(inventory.journal, "append_many", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                inventory._write_change("lend", {"title": "Book1", "borrow_count": 1})
+        inventory.close()
+
+    def test_replay_restores_state(self):
+        inventory = self.make_inventory()
+        inventory.lend_book("Book1", "User1")
+        inventory.lend_book("Book1", "User2")
+        inventory.return_book("Book1")
+        inventory.add_to_waitlist("Book1", "User3", "user3@example.com", "123")
+        inventory.close()
+
+        restored = self.make_inventory()
+        restored.replay_journal()
+        restored.replay_journal()  # Replaying twice must not change the result
+
+        self.assertEqual(restored.find_book("Book1").borrow_count, 1)
+        self.assertEqual(restored.waitlist["Book1"],
+                         [{"username": "User3", "email": "user3@example.com", "phone": "123"}])
+
+    def test_compaction_truncates_journal(self):
+        inventory = self.make_inventory(compact_every=2)
+
+        with patch.object(inventory, "_write_catalog_files") as write, patch.object(inventory.waitlist, "save"):
+            inventory.lend_book("Book1", "User1")
+            inventory.return_book("Book1")
+        inventory.close()
+
+        write.assert_called_once()
+        self.assertEqual(list(inventory.journal.records()), [])
+
+    def test_compaction_writes_snapshots_before_truncating(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with patch.dict(os.environ, {"LIBRARY_DATA_DIR": directory.name}):
+            inventory = Inventory(use_journal=True, compact_every=2, flush_interval=60,
+                                  journal_path=self.journal_path, logger=ActionLogger(os.devnull))
+            inventory.books = [Book(title="Book1", author="Author1", category="Fiction", year=2021, copies=2)]
+            inventory.lend_book("Book1", "User1")
+            inventory.lend_book("Book1", "User2")  # Compacts: the snapshots cannot wait for the flush timer
+
+            self.assertEqual(list(inventory.journal.records()), [])
+            with open(get_csv_path("available_books.csv"), encoding="utf-8") as file:
+                self.assertEqual(file.read().splitlines(), ["Title,Available", "Book1,0"])
+            inventory.close()
+
+    def test_failed_compaction_keeps_journal(self):
+        inventory = self.make_inventory(compact_every=2)
+
+        with patch.object(inventory, "_write_catalog_files", side_effect=OSError("disk full")):
+            inventory.lend_book("Book1", "User1")
+            inventory.lend_book("Book1", "User2")
+        inventory.close()
+
+        self.assertEqual([record["borrow_count"] for record in inventory.journal.records()], [1, 2])
+
+class TestSqliteStorage(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "library.db")
+        storage = SqliteStorage(self.path)
+        storage.save_books([
+            Book(title="Book1", author="Author1", category="Fiction", year=2021, copies=2),
+            Book(title="Book2", author="Author2", category="Drama", year=2020, copies=1),
+        ])
+        storage.close()
+
+    def open_inventory(self):
+        inventory = Inventory(storage=SqliteStorage(self.path))
+        self.addCleanup(inventory.storage.close)
+        return inventory
+
+    @patch("builtins.open", side_effect=AssertionError("CSV files must not be touched"))
+    def test_operations_are_persisted(self, mock_file):
+        inventory = self.open_inventory()
+        inventory.lend_book("Book2", "User1")
+        inventory.add_to_waitlist("Book2", "User2", "user2@example.com", "123")
+        inventory.add_book(Book(title="Book3", author="Author1", category="Poetry", year=1999, copies=4))
+        inventory.update_book("Book1", title="Book1 Revised", copies=3)
+        inventory.lend_book("Book3", "User3")
+        inventory.remove_book("Book3")
+        inventory.storage.close()
+
+        restored = self.open_inventory()
+        self.assertEqual([book.title for book in restored.books], ["Book1 Revised", "Book2"])
+        self.assertEqual(restored.find_book("Book1 Revised").copies, 3)
+        self.assertEqual(restored.find_book("Book2").available_copies, 0)
+        self.assertEqual(restored.waitlist["Book2"], [{"username": "User2", "email": "user2@example.com", "phone": "123"}])
+
+    @patch("builtins.open", side_effect=AssertionError("CSV files must not be touched"))
+    def test_return_serves_waitlist_in_one_transaction(self, mock_file):
+        inventory = self.open_inventory()
+        inventory.lend_book("Book2", "User1")
+        inventory.add_to_waitlist("Book2", "User2", "user2@example.com", "123")
+
+        self.assertTrue(inventory.return_book("Book2"))
+        inventory.storage.close()
+
+        restored = self.open_inventory()
+        self.assertEqual(len(restored.waitlist), 0)
+        self.assertEqual(restored.find_book("Book2").borrow_count, 1)
+
+    @patch("builtins.open", side_effect=AssertionError("CSV files must not be touched"))
+    def test_books_sharing_a_title_are_kept_apart(self, mock_file):
+        inventory = self.open_inventory()
+        inventory.lend_book("Book1", "User1")
+        self.assertTrue(inventory.add_book(Book(title="BOOK1", author="Author3", category="Poetry", year=1999, copies=3)))
+        inventory.lend_book("Book1", "User2")
+        inventory.storage.close()
+
+        restored = self.open_inventory()
+        self.assertEqual([(book.title, book.copies, book.borrow_count) for book in restored.books],
+                         [("Book1", 2, 2), ("Book2", 1, 0), ("BOOK1", 3, 0)])
+        restored.remove_book("Book1")
+        self.assertEqual([(book.title, book.copies) for book in restored.storage.load_books()],
+                         [("Book2", 1), ("BOOK1", 3)])
+
+    @patch("builtins.open", side_effect=AssertionError("CSV files must not be touched"))
+    def test_rename_to_an_existing_title_is_rejected(self, mock_file):
+        inventory = self.open_inventory()
+        inventory.update_book("Book1", title="book2", copies=7)
+
+        self.assertEqual([(book.title, book.copies) for book in inventory.books], [("Book1", 2), ("Book2", 1)])
+        self.assertEqual([(book.title, book.copies) for book in inventory.storage.load_books()],
+                         [("Book1", 2), ("Book2", 1)])
+        inventory.update_book("Book1", title="BOOK1")
+        self.assertEqual(inventory.storage.load_books()[0].title, "BOOK1")
+
+    def test_unique_titles_are_migrated(self):
+        path = os.path.join(os.path.dirname(self.path), "old.db")
+        connection = sqlite3.connect(path)
+        connection.executescript(SCHEMA.replace("title_key TEXT NOT NULL,", "title_key TEXT NOT NULL UNIQUE,"))
+        connection.execute("INSERT INTO books (title, title_key, author, genre, copies, year) "
+                           "VALUES ('Dune', 'dune', 'Herbert', 'Fiction', 2, 1965)")
+        connection.commit()
+        connection.close()
+
+        storage = SqliteStorage(path)
+        self.addCleanup(storage.close)
+        storage.apply("add_book", title="Dune", author="Herbert", copies=3, category="Fiction", year=1965)
+        self.assertEqual([book.copies for book in storage.find_books(title="dune")], [2, 3])
+
+    def test_indexed_lookups(self):
+        storage = SqliteStorage(self.path)
+        self.addCleanup(storage.close)
+
+        self.assertEqual([book.title for book in storage.find_books(author="author1")], ["Book1"])
+        self.assertEqual([book.title for book in storage.find_books(genre="Drama")], ["Book2"])
+        self.assertEqual(storage.find_books(title="BOOK1")[0].author, "Author1")
+        for condition in ("title_key = ?", "author = ? COLLATE NOCASE", "genre = ? COLLATE NOCASE"):
+            plan = storage._query(f"EXPLAIN QUERY PLAN SELECT title FROM books WHERE {condition}", ("x",))
+            self.assertIn("INDEX", str(plan))
+
+class TestConcurrency(unittest.TestCase):
+    THREADS = 8
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        storage = SqliteStorage(os.path.join(directory.name, "library.db"))
+        storage.save_books([Book(title=f"Book{index}", author="Author", category="Fiction", year=2020, copies=5)
+                            for index in range(20)])
+        self.inventory = Inventory(storage=storage)
+        self.addCleanup(storage.close)
+
+    def run_threads(self, target):
+        threads = [threading.Thread(target=target, args=(index,)) for index in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_same_title_is_never_over_lent(self):
+        self.inventory.add_book(Book(title="Bestseller", author="Author", category="Fiction", year=2024, copies=50))
+        lent = []
+
+        def lend(index):
+            for _ in range(10):
+                if self.inventory.lend_book("Bestseller", f"User{index}"):
+                    lent.append(index)
+
+        self.run_threads(lend)
+
+        self.assertEqual(len(lent), 50)
+        self.assertEqual(self.inventory.find_book("Bestseller").borrow_count, 50)
+        self.assertEqual(self.inventory.storage.find_books(title="Bestseller")[0].borrow_count, 50)
+
+    def test_concurrent_lends_and_returns_keep_counts_consistent(self):
+        balance = [[0] * 20 for _ in range(self.THREADS)]  # Per thread: lends minus returns of each title
+
+        def work(index):
+            for step in range(150):
+                title = (index * 7 + step) % 20
+                if step % 3 == 2:
+                    if self.inventory.return_book(f"Book{title}") is True:
+                        balance[index][title] -= 1
+                elif self.inventory.lend_book(f"Book{title}", f"User{index}"):
+                    balance[index][title] += 1
+
+        self.run_threads(work)
+
+        stored = {book.title: book.borrow_count for book in self.inventory.storage.load_books()}
+        for title in range(20):
+            book = self.inventory.find_book(f"Book{title}")
+            self.assertEqual(book.borrow_count, sum(thread[title] for thread in balance))
+            self.assertTrue(0 <= book.borrow_count <= book.copies)
+            self.assertEqual(stored[book.title], book.borrow_count)
+
+    def test_snapshot_is_not_torn_by_concurrent_removals(self):
+        remover = threading.Thread(target=self.inventory.remove_book, args=("Book0",))
+        progress = []
+
+        def on_chunk(copied, total):
+            progress.append((copied, total))
+            if not remover.is_alive() and len(progress) == 1:
+                remover.start()
+                remover.join(0.05)  # Waits for the copy to finish
+                self.assertTrue(remover.is_alive())
+
+        snapshot = self.inventory.snapshot_books(5, on_chunk=on_chunk)
+        remover.join()
+
+        self.assertEqual(progress, [(5, 20), (10, 20), (15, 20), (20, 20)])
+        self.assertEqual([book.title for book in snapshot], [f"Book{index}" for index in range(20)])
+        self.assertIsNone(self.inventory.find_book("Book0"))
+
+    def test_catalog_writer_excludes_readers(self):
+        lock = ReadWriteLock()
+        events = []
+
+        def reader(index):
+            with lock.read():
+                events.append("read")
+
+        with lock.write():
+            with lock.read():  # The writer may read
+                pass
+            thread = threading.Thread(target=reader, args=(0,))
+            thread.start()
+            thread.join(0.05)
+            self.assertEqual(events, [])
+            events.append("write")
+        thread.join()
+        self.assertEqual(events, ["write", "read"])
+
+        with lock.read():
+            with self.assertRaises(RuntimeError):
+                lock.acquire_write()
+
+class TestDeferredWrites(unittest.TestCase):
+    @mock_atomic_rename
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def test_csv_files_are_written_once(self, mock_file):
+        inventory = Inventory()
+        inventory.books = [Book(title=f"Book{index}", author="Author", category="Fiction", year=2020, copies=2)
+                           for index in range(3)]
+        mock_file.reset_mock()
+
+        with inventory.deferred_writes():
+            for index in range(3):
+                inventory.lend_book(f"Book{index}", "User1")
+            inventory.add_to_waitlist("Book0", "User2", "user2@example.com", "123")
+            # Only the CSV files: the background thread of another test's ActionLogger may flush meanwhile
+            self.assertEqual([call for call in mock_file.call_args_list if ".csv" in str(call.args[:1])], [])
+
+        opened = [call.args[0] for call in mock_file.call_args_list if call.kwargs.get("mode") == "w"]
+        self.assertEqual(opened, [written("available_books.csv"), written("loaned_books.csv"),
+                                  written("waiting_list.csv")])
+
+    def test_journal_records_are_appended_together(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n"):
+            inventory = Inventory()
+        inventory.books = [Book(title="Book1", author="Author", category="Fiction", year=2020, copies=2)]
+        inventory.journal = InventoryJournal(os.path.join(directory.name, "journal.jsonl"))
+        self.addCleanup(inventory.journal.close)
+
+        with patch.object(inventory.journal, "append", side_effect=AssertionError("appended one by one")):
+            with inventory.deferred_writes():
+                inventory.lend_book("Book1", "User1")
+                inventory.lend_book("Book1", "User2")
+
+        self.assertEqual([record["borrow_count"] for record in inventory.journal.records()], [1, 2])
+
+    @mock_atomic_rename
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def test_other_threads_are_not_deferred(self, mock_file):
+        inventory = Inventory()
+        inventory.books = [Book(title=f"Book{index}", author="Author", category="Fiction", year=2020, copies=2)
+                           for index in range(2)]
+        mock_file.reset_mock()
+
+        with inventory.deferred_writes():
+            inventory.lend_book("Book0", "User1")
+            mock_file.assert_not_called()
+            other = threading.Thread(target=inventory.lend_book, args=("Book1", "User2"))
+            other.start()
+            other.join()
+            # The other thread's lend is on disk before this thread's batch ends
+            self.assertIn(written("available_books.csv"), [call.args[0] for call in mock_file.call_args_list])
+            self.assertEqual(inventory._deferred_local.records, [("lend", {"title": "Book0", "borrow_count": 1})])
+
+    @mock_atomic_rename
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def test_flush_takes_catalog_lock_before_persist_lock(self, mock_file):
+        inventory = Inventory()
+        inventory.books = [Book(title=f"Book{index}", author="Author", category="Fiction", year=2020, copies=2)
+                           for index in range(2)]
+        inventory.begin_deferred_writes()
+        inventory.lend_book("Book1", "User1")  # Queued for the flush
+        flusher = threading.Thread(target=inventory.end_deferred_writes, daemon=True)
+
+        def write():
+            with inventory._catalog_lock.write():  # A catalog writer already running when the flush starts
+                flusher.start()
+                time.sleep(0.1)  # Let the flush block on the catalog lock
+                inventory.update_book("Book0", year=1999)
+
+        writer = threading.Thread(target=write, daemon=True)
+        writer.start()
+        writer.join(timeout=5)
+        flusher.join(timeout=5)
+
+        self.assertFalse(writer.is_alive() or flusher.is_alive(), "flush_writes deadlocked with update_book")
+        self.assertEqual(inventory.find_book("Book0").year, 1999)
+        self.assertEqual(inventory._deferred_records, [])
+
+class TestBulkOperations(unittest.TestCase):
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def setUp(self, mock_file):
+        self.inventory = Inventory()
+        self.inventory.books = [Book(title=f"Book{index}", author="Author", category="Fiction", year=2020, copies=2)
+                                for index in range(3)]
+        self.observer = MagicMock()
+        self.inventory.attach(self.observer)
+
+    def writes(self, mock_file, name):
+        return [call for call in mock_file.call_args_list if call.args[0] == written(name) and call.kwargs.get("mode") == "w"]
+
+    @mock_atomic_rename
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def test_lend_and_return_many(self, mock_file):
+        self.inventory.add_to_waitlist("Book1", "User9", "user9@example.com", "9")
+        lent = self.inventory.lend_many([("Book0", "User1"), ("Book1", "User2"), ("Book1", "User3"),
+                                         ("Book1", "User4"), ("Missing", "User5")])
+        self.assertEqual([result["ok"] for result in lent], [True, True, True, False, False])
+        event = self.observer.update.call_args.args[1]
+        self.assertEqual(event.changes, {"Book0": {"lent"}, "Book1": {"lent"}})
+        mock_file.reset_mock()
+        self.observer.reset_mock()
+
+        returned = self.inventory.return_many(["Book1", "Book0", "Book2"])
+
+        self.assertEqual(returned, [
+            {"title": "Book1", "ok": True, "lent_to": "User9"},
+            {"title": "Book0", "ok": True, "lent_to": None},
+            {"title": "Book2", "ok": False, "error": "All copies are already available."},
+        ])
+        self.assertEqual(len(self.writes(mock_file, "available_books.csv")), 1)
+        self.assertEqual(len(self.writes(mock_file, "waiting_list.csv")), 1)
+        self.observer.update.assert_called_once()  # One merged event for the whole bulk call
+        event = self.observer.update.call_args.args[1]
+        self.assertEqual(event.changes, {"Book1": {"returned", "lent", "waitlist"}, "Book0": {"returned"}})
+        self.assertEqual(self.inventory.find_book("Book1").available_copies, 0)
+
+    @mock_atomic_rename
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def test_add_books(self, mock_file):
+        results = self.inventory.add_books([
+            Book(title="Book3", author="Author", category="Drama", year=2001, copies=1),
+            "Not a book",
+            Book(title="Book4", author="Author", category="Drama", year=2002, copies=1),
+        ])
+
+        self.assertEqual([result["ok"] for result in results], [True, False, True])
+        self.observer.update.assert_called_once()
+        self.assertEqual(self.observer.update.call_args.args[1].titles, {"Book3", "Book4"})
+        self.assertEqual(len(self.writes(mock_file, "books.csv")), 1)
+        self.assertIsNotNone(self.inventory.find_book("Book4"))
+
+class TestNotifications(unittest.TestCase):
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def setUp(self, mock_file):
+        self.inventory = Inventory()
+        self.inventory.books = [Book(title="Book0", author="Author", category="Fiction", year=2020, copies=2)]
+        self.observer = MagicMock()
+        self.inventory.attach(self.observer)
+
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def test_events_describe_changes(self, mock_file):
+        self.inventory.lend_book("Book0", "User1")
+        self.inventory.update_book("Book0", title="Book1")
+
+        first, second = [call.args[1] for call in self.observer.update.call_args_list]
+        self.assertEqual(first.changes, {"Book0": {"lent"}})
+        self.assertEqual(second.changes, {"Book0": {"removed"}, "Book1": {"added"}})
+
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def test_observers_are_notified_after_the_locks_are_released(self, mock_file):
+        def update(subject, event):
+            if "lent" in event.changes.get("Book0", ()):
+                subject.update_book("Book0", year=2024)  # Needs the exclusive catalog lock
+        self.observer.update.side_effect = update
+
+        self.assertTrue(self.inventory.lend_book("Book0", "User1"))
+
+        self.assertEqual(self.inventory.find_book("Book0").year, 2024)
+        self.assertEqual(self.observer.update.call_count, 2)
+
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def test_observers_without_an_event_argument_are_notified(self, mock_file):
+        class LegacyObserver:
+            def __init__(self):
+                self.subjects = []
+
+            def update(self, subject):
+                self.subjects.append(subject)
+
+        legacy = LegacyObserver()
+        self.inventory.attach(legacy)
+        self.inventory.lend_book("Book0", "User1")
+
+        self.assertEqual(legacy.subjects, [self.inventory])
+        self.observer.update.assert_called_once()
+
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def test_observer_failures_are_logged(self, mock_file):
+        failing = MagicMock()
+        failing.update.side_effect = RuntimeError("boom")
+        self.inventory.detach(self.observer)
+        self.inventory.attach(failing)
+        self.inventory.attach(self.observer)
+
+        with patch.object(self.inventory, "log_action") as log_action:
+            self.assertTrue(self.inventory.lend_book("Book0", "User1"))
+
+        self.observer.update.assert_called_once()  # Still notified after the failing observer
+        failures = [call for call in log_action.call_args_list if call.args[0] == "Notify Observers"]
+        self.assertEqual(len(failures), 1)
+        self.assertFalse(failures[0].kwargs["success"])
+        self.assertIn("boom", failures[0].kwargs["details"])
+
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def test_debounce_coalesces_until_flushed(self, mock_file):
+        self.inventory.configure_notifications(debounce=60)
+        self.inventory.lend_book("Book0", "User1")
+        self.inventory.return_book("Book0")
+
+        self.assertFalse(self.inventory.flush_notifications())  # Window still open
+        self.observer.update.assert_not_called()
+        self.assertTrue(self.inventory.flush_notifications(force=True))
+        self.observer.update.assert_called_once()
+        self.assertEqual(self.observer.update.call_args.args[1].changes, {"Book0": {"lent", "returned"}})
+
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def test_dispatcher_thread(self, mock_file):
+        delivered = threading.Event()
+        threads = []
+
+        def update(subject, event):
+            threads.append(threading.current_thread())
+            delivered.set()
+        self.observer.update.side_effect = update
+        self.inventory.configure_notifications(debounce=0.2, threaded=True)
+        self.addCleanup(self.inventory.close_notifications)
+
+        self.inventory.lend_book("Book0", "User1")
+        self.inventory.lend_book("Book0", "User2")
+
+        self.assertTrue(delivered.wait(5))
+        self.inventory.close_notifications()
+        self.assertEqual(self.observer.update.call_count, 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+
+class TestBookTable(unittest.TestCase):
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def setUp(self, mock_file):
+        self.inventory = Inventory()
+        self.inventory.books = [Book(title=f"Book{index}", author="Author", category="Fiction", year=2020, copies=2)
+                                for index in range(5)]
+        self.rows = {}
+        self.tree = MagicMock()
+        self.tree.insert.side_effect = lambda parent, index, iid, values: self.rows.__setitem__(iid, values)
+        self.tree.item.side_effect = lambda iid, values: self.rows.__setitem__(iid, values)
+        self.tree.delete.side_effect = lambda *iids: [self.rows.pop(iid) for iid in iids]
+        self.tree.exists.side_effect = lambda iid: iid in self.rows
+        self.tree.get_children.side_effect = lambda: tuple(self.rows)
+        self.table = BookTable(self.tree, self.inventory, page_size=2)
+        self.inventory.attach(self.table)
+
+    def titles(self):
+        return [values[0] for values in self.rows.values()]
+
+    def test_rows_materialized_by_page(self):
+        self.table.show_catalog()
+        self.assertEqual(self.titles(), ["Book0", "Book1"])
+
+        self.table.on_scroll("0.0", "0.5")
+        self.assertEqual(self.table.materialized, 2)
+        self.table.on_scroll("0.5", "1.0")
+        self.assertEqual(self.titles(), ["Book0", "Book1", "Book2", "Book3"])
+
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def test_events_update_rows_in_place(self, mock_file):
+        self.table.show_catalog()
+        self.tree.insert.reset_mock()
+
+        self.inventory.lend_book("Book1", "User1")
+        self.inventory.remove_book("Book0")
+        self.inventory.add_book(Book(title="Book5", author="Author", category="Fiction", year=2021, copies=1))
+
+        self.assertEqual(list(self.rows.values()), [("Book1", "Author", "Fiction", 2020, "1/2")])
+        self.tree.insert.assert_not_called()  # Book5 is past the materialized rows
+        self.assertEqual(len(self.table), 5)
+        self.table.on_scroll("0.5", "1.0")
+        self.table.on_scroll("0.5", "1.0")
+        self.assertEqual(self.titles(), ["Book1", "Book2", "Book3", "Book4", "Book5"])
+
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def test_books_sharing_a_title_get_their_own_rows(self, mock_file):
+        self.inventory.books = [Book(title="Book0", author=author, category="Fiction", year=2020, copies=2)
+                                for author in ("First", "Second")]
+        self.table.show_catalog()
+        self.assertEqual([values[1] for values in self.rows.values()], ["First", "Second"])
+
+        self.inventory.lend_book("Book0", "User1")  # Lends the first copy
+        self.inventory.add_book(Book(title="book0", author="Third", category="Fiction", year=2021, copies=1))
+        self.inventory.remove_book("Book0")  # Removes the first book
+
+        self.assertEqual(len(self.table), 2)
+        self.table.on_scroll("0.5", "1.0")
+        self.assertEqual([values[1] for values in self.rows.values()], ["Second", "Third"])
+
+class TestTaskRunner(unittest.TestCase):
+    def setUp(self):
+        self.root = MagicMock()  # Stands in for Tk: after() callbacks are run by drain()
+        self.runner = TaskRunner(self.root, max_workers=2)
+        self.addCleanup(self.runner.shutdown)
+
+    def drain(self, task):
+        task.future.exception(timeout=5)
+        while self.root.after.call_args_list:
+            calls = list(self.root.after.call_args_list)
+            self.root.after.reset_mock()
+            for call in calls:
+                call.args[1]()
+
+    def test_results_delivered_by_poll(self):
+        done, errors, busy = [], [], []
+        self.runner.on_busy = lambda tasks: busy.append(len(tasks))
+        ok = self.runner.submit(lambda a, b: a + b, 1, 2, on_done=done.append)
+        failed = self.runner.submit(lambda: 1 / 0, on_error=errors.append)
+        self.assertEqual(done, [])  # Nothing runs on the caller's thread
+
+        failed.future.exception(timeout=5)
+        self.drain(ok)
+
+        self.assertEqual(done, [3])
+        self.assertIsInstance(errors[0], ZeroDivisionError)
+        self.assertEqual(busy[-1], 0)
+        self.assertEqual(self.runner.running, [])
+
+    def test_progress_and_cancellation(self):
+        started, release = threading.Event(), threading.Event()
+        progress, done = [], []
+
+        def work(task):
+            task.report(1, 4)
+            started.set()
+            release.wait(5)
+            task.check_cancelled()
+            return "finished"
+        task = self.runner.submit(work, on_done=done.append, on_progress=progress.append,
+                                  cancellable=True, with_task=True)
+        started.wait(5)
+        self.assertTrue(task.cancel())
+        release.set()
+        self.drain(task)
+
+        self.assertEqual(done, [])
+        self.assertEqual(self.runner.running, [])
+        self.assertFalse(self.runner.submit(lambda: None).cancel())  # Not cancellable
+
+class TestSyntheticCatalog(unittest.TestCase):
+    def test_inventory_loads_generated_copy(self):
+        with benchmark.library_copy(200, seed=1) as catalog:
+            self.assertEqual(os.path.dirname(get_csv_path("books.csv")), os.environ["LIBRARY_DATA_DIR"])
+            inventory = Inventory(logger=ActionLogger(os.devnull))
+
+            self.assertEqual(len(inventory.books), len(catalog["titles"]))  # Duplicate rows are merged
+            self.assertLess(len(catalog["titles"]), 200)
+            self.assertEqual({book.title for book in inventory.books if book.borrow_count}, set(catalog["borrowed"]))
+            inventory.close()
+        self.assertNotIn("LIBRARY_DATA_DIR", os.environ)
+
+class TestMetrics(unittest.TestCase):
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def setUp(self, mock_file):
+        self.metrics = get_metrics()
+        self.inventory = Inventory(logger=ActionLogger(os.devnull))
+        self.inventory.books = [Book(title="Book0", author="Author", category="Fiction", year=2020, copies=2)]
+        self.metrics.reset()
+        self.addCleanup(self.metrics.disable)
+        self.addCleanup(self.metrics.reset)
+
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def test_disabled_records_nothing(self, mock_file):
+        self.metrics.disable()
+        self.inventory.lend_book("Book0", "User1")
+        self.assertEqual(self.metrics.snapshot(), {})
+
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def test_operations_split_by_phase(self, mock_file):
+        self.metrics.enable()
+        self.inventory.lend_book("Book0", "User1")
+        self.inventory.lend_book("Missing", "User1")
+
+        snapshot = self.metrics.snapshot()
+        lend = snapshot["Inventory.lend_book"]
+        self.assertEqual(lend["calls"], 2)
+        self.assertEqual(set(lend["phases"]), {"total", "lookup", "csv_write", "log_write", "notify"})
+        self.assertEqual(lend["phases"]["total"]["count"], 2)
+        self.assertEqual(lend["phases"]["lookup"]["count"], 3)  # check_book_exists twice, lend_book once
+        self.assertEqual(snapshot["Inventory.save_availability"]["calls"], 1)
+        self.assertNotIn("csv_write", snapshot["Inventory.save_availability"]["phases"])  # Nested phases count once
+        self.assertEqual(lend["phases"]["total"]["buckets"]["+Inf"], 2)
+
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def test_prometheus_text(self, mock_file):
+        self.metrics.enable()
+        self.inventory.return_book("Book0")
+
+        text = self.metrics.prometheus_text()
+        self.assertIn('library_operation_calls_total{operation="Inventory.return_book"} 1', text)
+        self.assertIn('library_operation_seconds_count{operation="Inventory.return_book",phase="total"} 1', text)
+        self.assertIn('library_operation_seconds_bucket{operation="Inventory.return_book",phase="log_write",le="+Inf"} 1', text)
+
+    def test_errors_counted(self):
+        registry = MetricsRegistry(enabled=True)
+
+        class Service:
+            def fail(self):
+                raise RuntimeError("boom")
+        instrument(Service, {"fail": None}, registry)
+
+        with self.assertRaises(RuntimeError):
+            Service().fail()
+        self.assertEqual(registry.snapshot()["Service.fail"]["errors"], 1)
+
+class TestProfilingMode(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    @patch("builtins.open", new_callable=mock_open, read_data="Title,Available\n")
+    def make_inventory(self, profiler, mock_file):
+        inventory = Inventory(logger=ActionLogger(os.devnull), profile=profiler)
+        inventory.books = [Book(title="Book0", author="Author", category="Fiction", year=2020, copies=5)]
+        self.addCleanup(inventory.close)
+        return inventory
+
+    @patch("inventory.Inventory.save_availability")
+    def test_slow_calls_are_captured_and_rotated(self, mock_save):
+        inventory = self.make_inventory(SlowCallProfiler(threshold=0, directory=self.directory, max_dumps=2))
+        for user in ("User1", "User2", "User3"):
+            inventory.lend_book("Book0", user)
+
+        captures = inventory.profiler.captures()
+        self.assertEqual(len(captures), 2)  # The oldest capture was rotated out
+        self.assertTrue(all(capture.endswith("-lend_book") for capture in captures))
+        for extension in (".prof", ".tracemalloc", ".txt"):
+            self.assertTrue(os.path.exists(captures[-1] + extension))
+        profiled_functions = {function for _, _, function in pstats.Stats(captures[-1] + ".prof").stats}
+        self.assertIn("lend_book", profiled_functions)
+
+    @patch("inventory.Inventory.save_availability")
+    def test_fast_calls_are_discarded(self, mock_save):
+        inventory = self.make_inventory(SlowCallProfiler(threshold=60, directory=self.directory))
+        inventory.lend_book("Book0", "User1")
+
+        self.assertEqual(inventory.profiler.captures(), [])
+        self.assertEqual(inventory.find_book("Book0").available_copies, 4)
+
+    def test_captures_report_the_memory_of_the_call(self):
+        profiler = SlowCallProfiler(threshold=0, directory=self.directory)
+        self.addCleanup(profiler.close)
+        kept = [bytearray(4 << 20)]  # Allocated before the calls
+
+        profiler.call("allocate", lambda: kept.append(bytearray(1 << 20)))
+        profiler.call("churn", lambda: len(bytearray(2 << 20)))
+
+        memory = []
+        for capture in profiler.captures():
+            with open(capture + ".txt", encoding="utf-8") as file:
+                net, peak = re.search(r"Memory: ([-+.\d]+) KiB net, peak ([.\d]+) KiB", file.read()).groups()
+            memory.append((float(net), float(peak)))
+        (allocate_net, allocate_peak), (churn_net, churn_peak) = memory
+        self.assertTrue(1024 <= allocate_net < 1536)  # Not the 4 MiB allocated before the call
+        self.assertTrue(2048 <= churn_peak < 2560)
+        self.assertLess(abs(churn_net), 256)
+
+    @patch.dict(os.environ, {"LIBRARY_PROFILE": "1", "LIBRARY_PROFILE_THRESHOLD_MS": "250"})
+    def test_enabled_by_environment(self):
+        inventory = self.make_inventory(None)
+
+        self.assertIsInstance(inventory.profiler, SlowCallProfiler)
+        self.assertEqual(inventory.profiler.threshold, 0.25)
+
+class TestMappedCatalog(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "books.csv")
+        with open(self.path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(["title", "author", "is_loaned", "copies", "genre", "year"])
+            writer.writerow(["Book1", "Author1", "No", 2, "Fiction", 2021])
+            writer.writerow(["Comma, \"Quoted\"\nTitle", "Author2", "No", 1, "Drama", 2020])
+            writer.writerow(["book1", "Author3", "No", 3, "Poetry", 2019])  # Another book, as in load_books
+            writer.writerow(["Book3", "Author1", "Yes", 1, "History", 1999])
+            writer.writerow(["Book1", "Author9", "No", 4, "Drama", 2000])  # Merged into the first Book1
+
+    def open_catalog(self):
+        catalog = MappedCatalog(self.path)
+        self.addCleanup(catalog.close)
+        return catalog
+
+    def test_find_parses_rows_on_access(self):
+        catalog = self.open_catalog()
+
+        book = catalog.find_book("BOOK1")  # The first of the case variants, like Inventory.find_book
+        self.assertEqual((book.title, book.author, book.copies, book.year), ("Book1", "Author1", 6, 2021))
+        self.assertEqual(catalog.find_book('comma, "quoted"\ntitle').category, "Drama")
+        self.assertIsNone(catalog.find_book("Missing"))
+        self.assertEqual(len(catalog), 4)
+        self.assertEqual([book.title for book in catalog], ["Book1", 'Comma, "Quoted"\nTitle', "book1", "Book3"])
+
+    def test_merges_rows_like_load_books(self):
+        with patch.dict(os.environ, {"LIBRARY_DATA_DIR": os.path.dirname(self.path)}):
+            loaded = UpdateFiles.load_books(quiet=True)
+
+        def details(books):
+            return [(book.title, book.author, book.copies, book.category, book.year) for book in books]
+        self.assertEqual(details(self.open_catalog()), details(loaded))
+
+    def test_index_is_reused_until_the_file_changes(self):
+        self.open_catalog().close()
+        self.assertTrue(os.path.exists(self.path + ".idx"))
+
+        with patch.object(MappedCatalog, "_build_index") as build:
+            self.assertEqual(self.open_catalog().find_book("Book3").copies, 1)
+        build.assert_not_called()
+
+        with open(self.path, "a", newline="", encoding="utf-8") as file:
+            csv.writer(file).writerow(["Book4", "Author4", "No", 7, "Fiction", 2000])
+        self.assertEqual(self.open_catalog().find_book("book4").copies, 7)
+
+    def test_search_matches_search_index(self):
+        catalog = self.open_catalog()
+
+        self.assertEqual([book.title for book in catalog.search("author", "author1")], ["Book1", "Book3"])
+        self.assertEqual([book.copies for book in catalog.search("title", "book1")], [6, 3])
+        self.assertEqual([book.title for book in SearchByCategory().search(catalog, "hist", index=catalog)], ["Book3"])
+
+class TestAsyncInventory(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = SqliteStorage(os.path.join(directory.name, "library.db"))
+        self.storage.save_books([Book(title=f"Book{index}", author="Author", category="Fiction", year=2020, copies=3)
+                                 for index in range(10)])
+        self.inventory = Inventory(storage=self.storage)
+
+    def test_concurrent_requests_share_flushes(self):
+        flushes = []
+        flush_writes = self.inventory.flush_writes
+        self.inventory.flush_writes = lambda **kwargs: flushes.append(flush_writes(**kwargs))
+
+        async def scenario():
+            library = AsyncInventory(self.inventory)
+            lent = await asyncio.gather(*(library.lend_book(f"Book{index % 10}", f"User{index}") for index in range(40)))
+            await library.add_to_waitlist("Book0", "User99", "user99@example.com", "123")
+            popular = await library.get_popular_books(3)
+            await library.close()
+            return lent, popular
+
+        lent, popular = asyncio.run(scenario())
+
+        self.assertEqual(lent.count(True), 30)
+        self.assertEqual(popular, [("Book0", 3), ("Book1", 3), ("Book2", 3)])
+        self.assertEqual(sum(flushes), 31)  # 30 lends and one waitlist entry
+        self.assertLess(len(flushes), 31)
+        restored = Inventory(storage=SqliteStorage(self.storage.path))
+        self.addCleanup(restored.storage.close)
+        self.assertTrue(all(book.available_copies == 0 for book in restored.books))
+        self.assertEqual(len(restored.waitlist["Book0"]), 1)
+
+    def test_failed_flush_reaches_the_caller_and_is_retried(self):
+        library = AsyncInventory(self.inventory)
+        apply = self.storage.apply
+
+        async def scenario():
+            with patch.object(self.storage, "apply", side_effect=sqlite3.OperationalError("disk I/O error")):
+                with self.assertRaises(sqlite3.OperationalError):
+                    await library.lend_book("Book1", "User1")
+            self.storage.apply = apply
+            self.assertTrue(await library.lend_book("Book2", "User2"))  # Also writes the failed lend
+            await library.close()
+
+        asyncio.run(scenario())
+
+        restored = SqliteStorage(self.storage.path)
+        self.addCleanup(restored.close)
+        self.assertEqual([book.borrow_count for book in restored.find_books(title="Book1")], [1])
+        self.assertEqual([book.borrow_count for book in restored.find_books(title="Book2")], [1])
+
+    def test_csv_changes_are_written_before_returning(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with patch.dict(os.environ, {"LIBRARY_DATA_DIR": directory.name}):
+            inventory = Inventory(flush_interval=60, logger=ActionLogger(os.devnull))
+            inventory.books = [Book(title="Book1", author="Author1", category="Fiction", year=2021, copies=2)]
+            library = AsyncInventory(inventory)
+
+            async def scenario():
+                with patch.object(inventory, "_write_availability_files", side_effect=OSError("disk full")):
+                    with self.assertRaises(OSError):
+                        await library.lend_book("Book1", "User1")
+                self.assertTrue(await library.lend_book("Book1", "User2"))
+                # Written before returning, not left to the flush timer 60 seconds away
+                with open(get_csv_path("available_books.csv"), encoding="utf-8") as file:
+                    self.assertEqual(file.read().splitlines(), ["Title,Available", "Book1,0"])
+                await library.close()
+
+            asyncio.run(scenario())
+
+class TestHttpServer(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        storage = SqliteStorage(os.path.join(directory.name, "library.db"))
+        storage.save_books([
+            Book(title="Book1", author="Author1", category="Fiction", year=2021, copies=2),
+            Book(title="Book2", author="Author2", category="Drama", year=2020, copies=1),
+        ])
+        self.inventory = Inventory(storage=storage)
+        self.server = LibraryServer(("127.0.0.1", 0), self.inventory)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.inventory.close)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.connection = http.client.HTTPConnection(*self.server.server_address)
+        self.addCleanup(self.connection.close)
+
+    def request(self, method, path, body=None):
+        self.connection.request(method, path, body=json.dumps(body) if body is not None else None,
+                                headers={"Content-Type": "application/json"})
+        response = self.connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_requests_share_one_connection(self):
+        status, result = self.request("POST", "/lend", {"title": "Book2", "username": "User1"})
+        self.assertEqual((status, result["ok"], result["available"]), (200, True, 0))
+        socket = self.connection.sock
+
+        status, result = self.request("POST", "/lend", {"title": "Book2", "username": "User2"})
+        self.assertEqual((status, result["ok"]), (200, False))
+        self.request("POST", "/waitlist", {"title": "Book2", "username": "User2", "email": "u2@example.com", "phone": "1"})
+        status, result = self.request("POST", "/return", {"title": "Book2"})
+        self.assertEqual(result["lent_to"], "User2")
+        status, result = self.request("GET", "/books/search?q=fiction")
+        self.assertEqual([book["title"] for book in result["books"]], ["Book1"])
+        status, result = self.request("GET", "/books/popular?top=1")
+        self.assertEqual(result["books"], [{"title": "Book2", "count": 1}])
+
+        self.assertIs(self.connection.sock, socket)  # Keep-alive
+
+    def test_errors(self):
+        self.assertEqual(self.request("POST", "/lend", {"title": "Missing", "username": "User1"})[0], 404)
+        self.assertEqual(self.request("POST", "/lend", {"title": "Book1"})[0], 400)
+        self.assertEqual(self.request("GET", "/unknown")[0], 404)
+
+    def test_batch_is_flushed_once(self):
+        with patch.object(self.inventory, "flush_writes", wraps=self.inventory.flush_writes) as flush_writes:
+            status, result = self.request("POST", "/batch", {"operations": [
+                {"op": "lend", "title": "Book1", "username": "User1"},
+                {"op": "lend", "title": "Book1", "username": "User2"},
+                {"op": "lend", "title": "Book1", "username": "User3"},
+                {"op": "return", "title": "Book1"},
+                {"op": "lend", "title": "Missing", "username": "User1"},
+                {"op": "delete"},
+            ]})
+
+        self.assertEqual(status, 200)
+        self.assertEqual([item["ok"] for item in result["results"]], [True, True, False, True, False, False])
+        flush_writes.assert_called_once_with()
+        self.assertEqual(self.inventory.storage.find_books(title="Book1")[0].borrow_count, 1)
+
+class TestActionLogger(unittest.TestCase):
+    def setUp(self):
+        self.log_path = os.path.join(tempfile.mkdtemp(), "log.txt")
+
+    def test_entries_are_buffered_until_flush(self):
+        logger = ActionLogger(self.log_path, flush_interval=60)
+        logger.log("Lend Book", success=True, details="Book 'Book1' lent to User1.")
+
+        self.assertFalse(os.path.exists(self.log_path))
+
+        logger.close()
+        with open(self.log_path, encoding="utf-8") as log_file:
+            lines = log_file.readlines()
+        self.assertEqual(len(lines), 1)
+        self.assertIn("ACTION: Lend Book | STATUS: SUCCESS | DETAILS: Book 'Book1' lent to User1.", lines[0])
+
+    def test_rotation(self):
+        logger = ActionLogger(self.log_path, flush_interval=60, max_bytes=200, backup_count=2)
+        for index in range(3):
+            logger.log("Search Books", success=False, details="x" * 100)
+            logger.flush()
+        logger.close()
+
+        self.assertTrue(os.path.exists(self.log_path + ".1"))
+        self.assertTrue(os.path.exists(self.log_path + ".2"))
+        self.assertLessEqual(os.path.getsize(self.log_path), 200)
 
 if __name__ == "__main__":
     unittest.main()
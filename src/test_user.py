@@ -1,7 +1,10 @@
+import os
+import tempfile
 import unittest
 from unittest.mock import mock_open, patch
 from user_manager import UserManager
 from user import User
+from storage import SqliteStorage
 from utils import get_csv_path
 
 
@@ -14,8 +17,9 @@ class TestUserManager(unittest.TestCase):
         """
         manager = UserManager()
         self.assertEqual(len(manager.users), 2)
-        self.assertEqual(manager.users[0].username, "user1")
-        self.assertEqual(manager.users[1].username, "user2")
+        self.assertEqual(manager.users["user1"].username, "user1")
+        self.assertEqual(manager.users["user2"].username, "user2")
+        self.assertFalse(manager.users["user1"].is_hashed)  # Hashing is deferred
 
     @patch("builtins.open", new_callable=mock_open)
     def test_save_users(self, mock_file):
@@ -24,10 +28,10 @@ class TestUserManager(unittest.TestCase):
         """
         manager = UserManager()
 
-        manager.users = [
-            User("user1", "pass1"),
-            User("user2", "pass2")
-        ]
+        manager.users = {
+            "user1": User("user1", "pass1"),
+            "user2": User("user2", "pass2", "hash2")
+        }
 
         manager.save_users()
 
@@ -37,9 +41,9 @@ class TestUserManager(unittest.TestCase):
         written_calls = [call.args[0] for call in handle.write.call_args_list]
 
         expected_calls = [
-            "Username,Password\n",
-            "user1,pass1\n",
-            "user2,pass2\n"
+            "Username,Password,Hash\n",
+            "user1,pass1,\n",
+            "user2,pass2,hash2\n"
         ]
 
         normalized_calls = [line.replace("\r\n", "\n") for line in written_calls]
@@ -53,13 +57,14 @@ class TestUserManager(unittest.TestCase):
         Test adding a new user successfully.
         """
         manager = UserManager()
-        manager.users = []
+        manager.users = {}
         result = manager.add_user("new_user", "new_pass")
 
         self.assertTrue(result)
         self.assertEqual(len(manager.users), 1)
-        self.assertEqual(manager.users[0].username, "new_user")
-        self.assertEqual(manager.users[0].original_password, "new_pass")
+        self.assertEqual(manager.users["new_user"].username, "new_user")
+        self.assertEqual(manager.users["new_user"].original_password, "new_pass")
+        self.assertTrue(manager.users["new_user"].is_hashed)
 
     @patch("builtins.open", new_callable=mock_open)
     def test_add_user_duplicate(self, mock_file):
@@ -67,7 +72,7 @@ class TestUserManager(unittest.TestCase):
         Test adding a user with an existing username.
         """
         manager = UserManager()
-        manager.users = [User(username="existing_user", password="password")]
+        manager.users = {"existing_user": User(username="existing_user", password="password")}
 
         result = manager.add_user("existing_user", "new_pass")
 
@@ -80,7 +85,7 @@ class TestUserManager(unittest.TestCase):
         Test successful user authentication.
         """
         manager = UserManager()
-        manager.users = [User(username="test_user", password="test_pass")]
+        manager.users = {"test_user": User(username="test_user", password="test_pass")}
 
         user = manager.authenticate_user("test_user", "test_pass")
         self.assertIsNotNone(user)
@@ -92,7 +97,7 @@ class TestUserManager(unittest.TestCase):
         Test user authentication failure.
         """
         manager = UserManager()
-        manager.users = [User(username="test_user", password="test_pass")]
+        manager.users = {"test_user": User(username="test_user", password="test_pass")}
 
         user = manager.authenticate_user("wrong_user", "test_pass")
         self.assertIsNone(user)
@@ -100,5 +105,91 @@ class TestUserManager(unittest.TestCase):
         user = manager.authenticate_user("test_user", "wrong_pass")
         self.assertIsNone(user)
 
+    @patch("builtins.open", new_callable=mock_open,
+           read_data="Username,Password,Hash\nuser1,pass1,stored_hash\nuser2,pass2,")
+    def test_load_users_keeps_stored_hashes(self, mock_file):
+        """
+        Test that stored hashes are reused instead of recomputed.
+        """
+        manager = UserManager()
+        self.assertEqual(manager.users["user1"].password, "stored_hash")
+        self.assertFalse(manager.users["user2"].is_hashed)
+
+    @patch("builtins.open", new_callable=mock_open)
+    def test_authenticate_hashes_lazily(self, mock_file):
+        """
+        Test that the first successful authentication computes the hash.
+        """
+        manager = UserManager()
+        manager.users = {"test_user": User(username="test_user", password="test_pass")}
+
+        self.assertIsNone(manager.authenticate_user("test_user", "wrong_pass"))
+        self.assertFalse(manager.users["test_user"].is_hashed)
+        self.assertIsNotNone(manager.authenticate_user("test_user", "test_pass"))
+        self.assertTrue(manager.users["test_user"].is_hashed)
+        mock_file().write.assert_called()  # The new hash is saved
+        self.assertIsNotNone(manager.authenticate_user("test_user", "test_pass"))
+
+    @patch("builtins.open", new_callable=mock_open)
+    def test_hash_pending_users(self, mock_file):
+        """
+        Test the background pass hashes the remaining users and saves once.
+        """
+        manager = UserManager()
+        manager.users = {
+            "user1": User("user1", "pass1"),
+            "user2": User("user2", "pass2")
+        }
+
+        self.assertEqual(manager.hash_pending_users(), 2)
+        self.assertTrue(all(user.is_hashed for user in manager.users.values()))
+        self.assertEqual(manager.hash_pending_users(), 0)
+
+    def test_sqlite_storage(self):
+        """
+        Test that users round-trip through the SQLite storage, hashes included.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "library.db")
+        storage = SqliteStorage(path)
+        manager = UserManager(storage)
+
+        self.assertTrue(manager.add_user("user1", "pass1"))
+        manager.users["user2"] = User("user2", "pass2")
+        manager.save_users()
+        storage.close()
+
+        storage = SqliteStorage(path)
+        self.addCleanup(storage.close)
+        restored = UserManager(storage)
+        self.assertEqual(sorted(restored.users), ["user1", "user2"])
+        self.assertTrue(restored.users["user1"].is_hashed)
+        self.assertFalse(restored.users["user2"].is_hashed)
+        self.assertIsNotNone(restored.authenticate_user("user1", "pass1"))
+
+    def test_first_authentication_saves_the_hash(self):
+        """
+        Test that the hash computed on the first authentication survives a restart,
+        and that a wrong password computes no hash.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "library.db")
+        storage = SqliteStorage(path)
+        manager = UserManager(storage)
+        manager.users["user1"] = User("user1", "pass1")
+        manager.save_users()
+
+        self.assertIsNone(manager.authenticate_user("user1", "wrong"))
+        self.assertFalse(manager.users["user1"].is_hashed)
+        self.assertIsNotNone(manager.authenticate_user("user1", "pass1"))
+        storage.close()
+
+        storage = SqliteStorage(path)
+        self.addCleanup(storage.close)
+        restored = UserManager(storage)
+        self.assertEqual(restored.users["user1"].password, manager.users["user1"].password)
+
 if __name__ == "__main__":
     unittest.main()
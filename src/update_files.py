@@ -3,6 +3,8 @@
 
 import pandas as pd
 from book_factory import BookFactory
+from metrics import instrument
+from utils import get_csv_path
 class UpdateFiles(object):
 
 
@@ -23,7 +25,7 @@ class UpdateFiles(object):
             df = pd.DataFrame([row])
 
             # Append the DataFrame to the CSV file with a proper line terminator
-            with open("../csv_files/books.csv", mode="a", newline='', encoding="utf-8") as file:
+            with open(get_csv_path("books.csv"), mode="a", newline='', encoding="utf-8") as file:
                 df.to_csv(file,index=False,header=False)
 
             print("SUCCESS: Book added to books.csv")
@@ -31,27 +33,32 @@ class UpdateFiles(object):
         except Exception as e:
             print(f"ERROR: Failed to update books file: {e}")
     @staticmethod
-    def load_books():
+    def load_books(quiet=False, storage=None):
+        """
+        Load books.csv and build the Book objects in bulk.
+        Duplicate titles are merged the same way BookFactory.create_book merges them.
+
+        :param quiet: Skip the progress messages (useful for very large catalogs).
+        :param storage: Optional storage backend to load from instead of books.csv.
+        :return: List of Book objects.
+        """
         books = []
         try:
-            books_df = pd.read_csv("../csv_files/books.csv", encoding="utf-8")
-            print("Loaded books.csv columns:", books_df.columns)
-            print("Loaded books.csv data:")
-            print(books_df)
-
-            for index, row in books_df.iterrows():
-                book = BookFactory.create_book(
-                    title=row["title"],
-                    author=row["author"],
-                    is_loaned=row["is_loaned"]=="Yes",
-                    copies=int(row["copies"]),
-                    genre=row["genre"],
-                    year=int(row["year"]),
-                    books=books,
-                    waiting_list=row.get("waiting_list")
-                )
-
-            print("Books created from file:", [book.title for book in books])
+            if storage:
+                books = storage.load_books()
+                if not quiet:
+                    print(f"Books loaded from storage: {len(books)}")
+                return books
+
+            books_df = pd.read_csv(get_csv_path("books.csv"), encoding="utf-8",
+                                   dtype={"title": str, "author": str, "genre": str, "is_loaned": str})
+            if not quiet:
+                print(f"Loaded books.csv: {len(books_df)} rows, columns: {list(books_df.columns)}")
+
+            books = BookFactory.create_books(books_df)
+
+            if not quiet:
+                print(f"Books created from file: {len(books)}")
         except FileNotFoundError:
             print("ERROR: File books.csv not found.")
         except Exception as e:
@@ -60,13 +67,19 @@ class UpdateFiles(object):
         return books
 
     @staticmethod
-    def load_available_books():
+    def load_available_books(storage=None):
+        """
+        Load the number of available copies of each title from available_books.csv (or from a storage backend).
+        """
         available_books = {}
         try:
-            available_books_df = pd.read_csv("../csv_files/available_books.csv", encoding="utf-8")
-            for index, row in available_books_df.iterrows():
-                count = row["count"]
-                available_books[row["title"]] = int(count) if isinstance(count, str) and count.isdigit() else 0
+            if storage:
+                return storage.load_available_books()
+
+            available_books_df = pd.read_csv(get_csv_path("available_books.csv"), encoding="utf-8", dtype=str)
+            for title, count in zip(available_books_df["Title"], available_books_df["Available"]):
+                count = str(count).strip()
+                available_books[title] = int(count) if count.isdigit() else 0
             print("SUCCESS: Loaded books from available_books.csv")
 
         except FileNotFoundError:
@@ -80,7 +93,7 @@ class UpdateFiles(object):
     def load_loaned_books():
         loaned_books = []
         try:
-            loaned_books_df = pd.read_csv("../csv_files/loaned_books.csv", encoding="utf-8")
+            loaned_books_df = pd.read_csv(get_csv_path("loaned_books.csv"), encoding="utf-8")
             loaned_books = loaned_books_df['title'].tolist()
             print("SUCCESS: Loaded loaned books from loaned_books.csv")
         except FileNotFoundError:
@@ -88,4 +101,10 @@ class UpdateFiles(object):
         except Exception as e:
             print(f"ERROR: Error loading loaned books: {e}")
         print(f"len available = {len(loaned_books)}")
-        return loaned_books
\ No newline at end of file
+        return loaned_books
+
+
+instrument(UpdateFiles, {
+    "update_books_file": "csv_write",
+    "load_books": "csv_read", "load_available_books": "csv_read", "load_loaned_books": "csv_read",
+})
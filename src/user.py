@@ -1,18 +1,42 @@
 
 
+import hmac
 from werkzeug.security import generate_password_hash, check_password_hash
 
 class User:
-    def __init__(self,username,password):
+    def __init__(self,username,password,password_hash=None):
         """
-        Initialize a user object with username,password, and role
+        Initialize a user object with username,password, and role.
+        The password hash is taken from users.csv when available; otherwise it is computed
+        lazily (on first authentication or by a background pass) since hashing is deliberately slow.
         """
 
         self.username=username
         self.original_password=password
-        self.password=generate_password_hash(password)
+        self.password=password_hash or None
+
+    @property
+    def is_hashed(self):
+        return self.password is not None
+
+    def hash_password(self):
+        """
+        Compute the password hash if it is still missing.
+        :return: True if a hash was computed, False if it already existed.
+        """
+        if self.is_hashed:
+            return False
+        self.password=generate_password_hash(self.original_password)
+        return True
 
     def verify_password(self,password):
+        if not self.is_hashed:
+            # First authentication: compare against the stored password and hash it for next time,
+            # only on success so that failed attempts do not pay for the slow hash
+            matches=hmac.compare_digest(str(self.original_password).encode(),str(password).encode())
+            if matches:
+                self.hash_password()
+            return matches
 
         return check_password_hash(self.password,password)
 
@@ -1,25 +1,39 @@
 import csv
+import threading
+from metrics import instrument
 from user import User
+from utils import get_csv_path
 
 class UserManager:
-    def __init__(self):
-        self.users = []  # List of user objects
+    def __init__(self, storage=None):
+        """
+        :param storage: Optional storage backend (e.g. SqliteStorage) holding the users instead of users.csv.
+        """
+        self.users = {}  # Username -> User object
+        self.storage = storage
+        self._lock = threading.RLock()  # The GUI registers users and saves hashes from worker threads
         self.load_users()
 
     def load_users(self):
         """
         Load users from the users.csv file.
+        Stored hashes are reused as-is, so loading is a plain CSV read.
         """
         try:
-            with open("../csv_files/users.csv", mode="r") as file:
+            if self.storage:
+                for username, password, password_hash in self.storage.load_users():
+                    self.users[username] = User(username, password, password_hash)
+                print(f"Users loaded successfully: {len(self.users)} users")
+                return
+
+            with open(get_csv_path("users.csv"), mode="r") as file:
                 reader = csv.reader(file)
                 next(reader)  # Skip the title line
                 for row in reader:
-                    username, password = row
-                    user = User(username, password)
-                    user.original_password = password  # Load the plain text password
-                    self.users.append(user)
-            print("Users loaded successfully:", [user.username for user in self.users])
+                    username, password = row[0], row[1]
+                    password_hash = row[2] if len(row) > 2 else None  # Older files have no hash column
+                    self.users[username] = User(username, password, password_hash)
+            print(f"Users loaded successfully: {len(self.users)} users")
 
         except FileNotFoundError:
             print("users.csv not found...starting with an empty user list")
@@ -28,14 +42,20 @@ class UserManager:
 
     def save_users(self):
         """
-        Save users to the users.csv file.
+        Save users to the users.csv file, including the password hashes computed so far.
         """
         try:
-            with open("../csv_files/users.csv", mode="w", newline="") as file:
-                writer = csv.writer(file)
-                writer.writerow(["Username", "Password"])  # Write the header
-                for user in self.users:
-                    writer.writerow([user.username, user.original_password])  # Save plain text password
+            with self._lock:
+                if self.storage:
+                    self.storage.save_users(list(self.users.values()))
+                    print("Users saved successfully!")
+                    return
+
+                with open(get_csv_path("users.csv"), mode="w", newline="") as file:
+                    writer = csv.writer(file)
+                    writer.writerow(["Username", "Password", "Hash"])  # Write the header
+                    for user in list(self.users.values()):
+                        writer.writerow([user.username, user.original_password, user.password or ""])
             print("Users saved successfully!")
         except Exception as e:
             print(f"Error saving users: {e}")
@@ -44,22 +64,68 @@ class UserManager:
         """
         Add a new user to the system.
         """
-        if any(user.username == username for user in self.users):
-            print(f"Username {username} already exists")
-            return False
         new_user = User(username, password)
-        self.users.append(new_user)
-        self.save_users()  # Save the user with the plain text password
+        new_user.hash_password()  # Outside the lock: hashing is deliberately slow
+        with self._lock:
+            if username in self.users:
+                print(f"Username {username} already exists")
+                return False
+            self.users[username] = new_user
+            self.save_user(new_user)  # Save the user with the plain text password and its hash
         print(f"User {username} added successfully")
         return True
 
+    def save_user(self, user):
+        """
+        Save a single user: one upsert with a storage backend, otherwise a rewrite of users.csv.
+        """
+        with self._lock:
+            if self.storage:
+                try:
+                    self.storage.save_user(user)
+                except Exception as e:
+                    print(f"Error saving user {user.username}: {e}")
+            else:
+                self.save_users()
+
     def authenticate_user(self, username, password):
         """
         Authenticate a user by username and password.
+        A password authenticated for the first time is hashed and the hash is saved,
+        so it is not computed again after a restart.
         """
-        for user in self.users:
-            if user.username == username and user.verify_password(password):  # Verify hashed password
+        user = self.users.get(username)
+        if user:
+            was_hashed = user.is_hashed
+            if user.verify_password(password):  # Verify hashed password
+                if not was_hashed and user.is_hashed:
+                    self.save_user(user)
                 print(f"User {username} authenticated successfully!")
                 return user
         print("Authentication failed.")
-        return None
\ No newline at end of file
+        return None
+
+    def hash_pending_users(self):
+        """
+        Hash every password that has no stored hash yet and save them once at the end.
+        :return: The number of users that were hashed.
+        """
+        hashed = sum(1 for user in list(self.users.values()) if user.hash_password())
+        if hashed:
+            self.save_users()
+        return hashed
+
+    def start_background_hashing(self):
+        """
+        Run hash_pending_users on a daemon thread so startup does not wait for it.
+        """
+        thread = threading.Thread(target=self.hash_pending_users, daemon=True)
+        thread.start()
+        return thread
+
+
+instrument(UserManager, {
+    "__init__": None, "add_user": None, "authenticate_user": None, "hash_pending_users": None,
+    "start_background_hashing": None,
+    "load_users": "csv_read", "save_users": "csv_write",
+})
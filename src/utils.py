@@ -1,13 +1,43 @@
+import contextlib
 import os
 
 
 def get_csv_path(filename):
     """
     Get the full path to a CSV file located in the 'csv_files' directory.
+    Setting the LIBRARY_DATA_DIR environment variable points every file at another directory
+    (e.g. a throwaway copy of csv_files for benchmarks).
 
     :param filename: Name of the CSV file (e.g., 'books.csv').
     :return: Full path to the file as a string.
     """
-    base_dir = os.path.dirname(os.path.abspath(__file__))  # Current directory of the running script
-    csv_dir = os.path.join(base_dir, "../csv_files")  # Path to the 'csv_files' folder
-    return os.path.join(csv_dir, filename)
\ No newline at end of file
+    csv_dir = os.environ.get("LIBRARY_DATA_DIR")
+    if not csv_dir:
+        base_dir = os.path.dirname(os.path.abspath(__file__))  # Current directory of the running script
+        csv_dir = os.path.join(base_dir, "../csv_files")  # Path to the 'csv_files' folder
+    return os.path.join(csv_dir, filename)
+
+
+@contextlib.contextmanager
+def atomic_write(path, newline="", encoding="utf-8", binary=False):
+    """
+    Open a file for rewriting through a temporary file next to it, which is fsync'd and renamed
+    over the file once it is complete. A crash mid-write leaves the previous file intact
+    instead of a truncated one.
+
+    :param path: The file to rewrite.
+    :param binary: Open the temporary file in binary mode (newline and encoding are then ignored).
+    :return: The open temporary file.
+    """
+    temp_path = f"{path}.tmp"
+    try:
+        file = open(temp_path, mode="wb") if binary else open(temp_path, mode="w", newline=newline, encoding=encoding)
+        with file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
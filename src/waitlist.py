@@ -0,0 +1,241 @@
+"""
+Per-title waitlists for books with no copies on the shelf.
+
+Each title has a WaitlistQueue: a deque of user entries (O(1) enqueue and dequeue) plus a
+set of the same entries for O(1) duplicate checks. waiting_list.csv is maintained
+incrementally: joining a waitlist appends the entry, and leaving it appends a tombstone row
+(the entry followed by "removed") instead of rewriting the file. Loading replays the rows in
+order. Once the tombstones outnumber the live entries, the file is rewritten from memory.
+"""
+import collections
+import csv
+import threading
+from metrics import instrument
+from utils import atomic_write, get_csv_path
+
+HEADER = ["Book Title", "Username", "Email", "Phone"]
+TOMBSTONE = "removed"
+
+
+def _key(entry):
+    return entry["username"], entry["email"], entry["phone"]
+
+
+class WaitlistQueue:
+    """
+    FIFO queue of the users waiting for one title, with O(1) membership checks.
+    Entries are dictionaries with "username", "email" and "phone" keys.
+    """
+
+    def __init__(self, entries=()):
+        self._entries = collections.deque()
+        self._members = set()
+        for entry in entries:
+            self.append(entry)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __contains__(self, entry):
+        return _key(entry) in self._members
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return f"WaitlistQueue({list(self._entries)!r})"
+
+    def append(self, entry):
+        """
+        Add an entry at the end of the queue.
+        :return: False if the entry is already waiting.
+        """
+        if entry in self:
+            return False
+        self._entries.append(dict(entry))
+        self._members.add(_key(entry))
+        return True
+
+    def popleft(self):
+        """
+        Remove and return the first entry.
+        """
+        entry = self._entries.popleft()
+        self._members.discard(_key(entry))
+        return entry
+
+    def pop(self, index=-1):
+        """
+        Remove and return the entry at the given end (0 for the first entry, -1 for the last).
+        """
+        if index == 0:
+            return self.popleft()
+        if index != -1:
+            raise IndexError("Only the first or last entry can be popped from a waitlist.")
+        entry = self._entries.pop()
+        self._members.discard(_key(entry))
+        return entry
+
+    def remove(self, entry):
+        """
+        Remove a specific entry, wherever it is in the queue.
+        :return: True if the entry was waiting.
+        """
+        if entry not in self:
+            return False
+        self._entries.remove(next(e for e in self._entries if _key(e) == _key(entry)))
+        self._members.discard(_key(entry))
+        return True
+
+
+class Waitlist:
+    """
+    Mapping of book title -> WaitlistQueue, persisted to waiting_list.csv with append and tombstone rows.
+    """
+
+    def __init__(self, path=None, entries=None, min_compaction=100):
+        """
+        :param path: Path of the waitlist file (defaults to csv_files/waiting_list.csv).
+        :param entries: Optional dictionary of title -> list of entries to start from.
+        :param min_compaction: Minimum number of tombstones before the file is rewritten.
+        """
+        self.path = path or get_csv_path("waiting_list.csv")
+        self.min_compaction = min_compaction
+        self._lock = threading.RLock()  # Inventory serializes each title, but different titles share the file
+        self._queues = {}
+        self._tombstones = 0
+        self._live = 0  # Number of entries, to decide on compaction without counting the queues
+        for title, users in (entries or {}).items():
+            self._queues[title] = WaitlistQueue(users)
+            self._live += len(self._queues[title])
+
+    # Read-only mapping interface, so callers can keep treating the waitlist as a dictionary
+    def __contains__(self, title):
+        return title in self._queues
+
+    def __getitem__(self, title):
+        return self._queues[title]
+
+    def __iter__(self):
+        return iter(self._queues)
+
+    def __len__(self):
+        return len(self._queues)
+
+    def get(self, title, default=None):
+        return self._queues.get(title, default)
+
+    def items(self):
+        return self._queues.items()
+
+    def add(self, title, entry):
+        """
+        Put a user at the end of the waitlist of a title (in memory only).
+        :return: False if the user is already waiting for the title.
+        """
+        with self._lock:
+            queue = self._queues.get(title)
+            if queue is None:
+                queue = self._queues[title] = WaitlistQueue()
+            if not queue.append(entry):
+                return False
+            self._live += 1
+            return True
+
+    def pop(self, title):
+        """
+        Remove and return the first user waiting for a title (in memory only).
+        :return: The entry, or None if nobody is waiting.
+        """
+        with self._lock:
+            queue = self._queues.get(title)
+            if not queue:
+                return None
+            entry = queue.popleft()
+            self._live -= 1
+            if not queue:
+                del self._queues[title]
+            return entry
+
+    def remove(self, title, entry):
+        """
+        Remove a specific user from the waitlist of a title (in memory only).
+        :return: True if the user was waiting.
+        """
+        with self._lock:
+            queue = self._queues.get(title)
+            if queue is None or not queue.remove(entry):
+                return False
+            self._live -= 1
+            if not queue:
+                del self._queues[title]
+            return True
+
+    def load(self):
+        """
+        Load the waitlist from the file, replaying tombstones in order.
+        :raises FileNotFoundError: If the file does not exist.
+        """
+        self._queues = {}
+        self._tombstones = 0
+        self._live = 0
+        with open(self.path, mode="r", encoding="utf-8") as file:
+            reader = csv.reader(file)
+            next(reader, None)  # Header
+            for row in reader:
+                if len(row) < 4:
+                    continue
+                entry = {"username": row[1], "email": row[2], "phone": row[3]}
+                if len(row) > 4 and row[4] == TOMBSTONE:
+                    self.remove(row[0], entry)
+                    self._tombstones += 1
+                else:
+                    self.add(row[0], entry)
+
+    def append_added(self, title, entry):
+        """
+        Persist a user joining the waitlist of a title by appending one row.
+        """
+        self._append_row([title, entry["username"], entry["email"], entry["phone"]])
+
+    def append_removed(self, title, entry):
+        """
+        Persist a user leaving the waitlist of a title by appending a tombstone row,
+        rewriting the file once the tombstones outnumber the live entries.
+        """
+        with self._lock:
+            self._append_row([title, entry["username"], entry["email"], entry["phone"], TOMBSTONE])
+            self._tombstones += 1
+            if self.needs_compaction():
+                self.save()
+
+    def _append_row(self, row):
+        with self._lock, open(self.path, mode="a", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            if file.tell() == 0:
+                writer.writerow(HEADER)
+            writer.writerow(row)
+
+    def needs_compaction(self):
+        """
+        Check whether the tombstones in the file outnumber the live entries.
+        """
+        return self._tombstones >= max(self.min_compaction, self._live)
+
+    def save(self):
+        """
+        Rewrite the whole file from memory, dropping the tombstones. The new file replaces the old one atomically.
+        """
+        with self._lock, atomic_write(self.path) as file:
+            writer = csv.writer(file)
+            writer.writerow(HEADER)
+            for title, queue in self._queues.items():
+                for entry in queue:
+                    writer.writerow([title, entry["username"], entry["email"], entry["phone"]])
+        self._tombstones = 0
+
+
+instrument(Waitlist, {"load": "csv_read", "save": "csv_write", "append_added": "csv_write", "append_removed": "csv_write"})